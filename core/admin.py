@@ -1,9 +1,74 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone
+from . import search
 from .models import (
     User, NHSTrust, Hospital, Agency, TrustAgencyAccess,
-    Nurse, NurseDocument, Shift, Booking
+    Nurse, NurseDocument, Shift, Booking, Job
 )
+from .pagination import EstimatedCountPaginator
+
+class IndexedSearchAdmin(admin.ModelAdmin):
+    """
+    Runs the changelist and autocomplete search box through core.search's
+    full-text index instead of icontains over every search_fields column.
+    search_indexes maps a lookup to the indexed model it points at, e.g.
+    {'nurse': Nurse}; 'pk' searches the admin's own model.
+    """
+    search_indexes = {}
+
+    def get_search_results(self, request, queryset, search_term):
+        if not self.search_indexes or not search_term.strip():
+            return super().get_search_results(request, queryset, search_term)
+        condition = Q()
+        for lookup, model in self.search_indexes.items():
+            condition |= Q(**{f'{lookup}__in': search.matching(model, search_term)})
+        return queryset.filter(condition), False
+
+class LargeTableAdmin(IndexedSearchAdmin):
+    """
+    Changelist settings for tables that grow with activity: counts are
+    estimated instead of COUNT(*) over the table, and the "N total" link,
+    which would count the whole table again, is not shown.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+class DistinctValuesFilter(admin.SimpleListFilter):
+    """
+    Offers a free-text column's values, like naming the field in list_filter
+    would, but caches them: SELECT DISTINCT reads the whole table on every
+    changelist load.
+    """
+    field = None
+    cache_timeout = 600
+
+    def lookups(self, request, model_admin):
+        model = model_admin.model
+        key = f'admin-filter:{model._meta.label_lower}:{self.field}'
+        values = cache.get(key)
+        if values is None:
+            values = list(
+                model._default_manager.exclude(**{f'{self.field}__isnull': True}).exclude(**{self.field: ''})
+                .order_by(self.field).values_list(self.field, flat=True).distinct()
+            )
+            cache.set(key, values, self.cache_timeout)
+        return [(value, value) for value in values]
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(**{self.field: self.value()})
+        return queryset
+
+class ShiftSpecialtyFilter(DistinctValuesFilter):
+    title = 'specialty required'
+    parameter_name = field = 'specialty_required'
+
+class NurseSpecialtyFilter(DistinctValuesFilter):
+    title = 'specialty'
+    parameter_name = field = 'specialty'
 
 @admin.register(User)
 class CustomUserAdmin(UserAdmin):
@@ -28,44 +93,97 @@ class CustomUserAdmin(UserAdmin):
 class NHSTrustAdmin(admin.ModelAdmin):
     list_display = ('name', 'website')
     search_fields = ('name',)
+    ordering = ('name',)
 
 @admin.register(Hospital)
 class HospitalAdmin(admin.ModelAdmin):
     list_display = ('name', 'trust', 'user')
+    list_select_related = ('trust', 'user')
     list_filter = ('trust',)
     search_fields = ('name', 'address')
+    ordering = ('name',)
+    autocomplete_fields = ('trust',)
+    raw_id_fields = ('user',)
 
 @admin.register(Agency)
-class AgencyAdmin(admin.ModelAdmin):
+class AgencyAdmin(IndexedSearchAdmin):
     list_display = ('name', 'user', 'contact_email', 'phone')
-    search_fields = ('name', 'contact_email')
+    list_select_related = ('user',)
+    search_fields = ('name', 'contact_email', 'registration_number')
+    search_indexes = {'pk': Agency}
+    ordering = ('name',)
+    raw_id_fields = ('user',)
 
 @admin.register(TrustAgencyAccess)
-class TrustAgencyAccessAdmin(admin.ModelAdmin):
+class TrustAgencyAccessAdmin(LargeTableAdmin):
     list_display = ('trust', 'agency', 'approved', 'created_at')
+    list_select_related = ('trust', 'agency')
     list_filter = ('approved',)
     search_fields = ('trust__name', 'agency__name')
+    autocomplete_fields = ('trust', 'agency')
+    raw_id_fields = ('approved_by',)
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return super().get_search_results(request, queryset, search_term)
+        # Trusts are few enough to match with icontains.
+        trusts = NHSTrust.objects.filter(name__icontains=search_term.strip()).values('pk')
+        return queryset.filter(Q(trust__in=trusts) | Q(agency__in=search.matching(Agency, search_term))), False
 
 @admin.register(Nurse)
-class NurseAdmin(admin.ModelAdmin):
-    list_display = ('full_name', 'agency', 'registration_number', 'specialty', 'is_approved')
-    list_filter = ('is_approved', 'specialty', 'agency')
-    search_fields = ('full_name', 'registration_number')
+class NurseAdmin(LargeTableAdmin):
+    list_display = ('full_name', 'agency', 'registration_number', 'specialty', 'is_approved', 'is_compliant')
+    list_select_related = ('agency',)
+    list_filter = ('is_approved', 'is_compliant', NurseSpecialtyFilter, 'agency')
+    search_fields = ('full_name', 'registration_number', 'specialty')
+    search_indexes = {'pk': Nurse}
+    # Newest first walks the primary key; sorting by name would sort the whole table.
+    ordering = ('-pk',)
+    autocomplete_fields = ('agency',)
+    raw_id_fields = ('approved_by',)
 
 @admin.register(NurseDocument)
-class NurseDocumentAdmin(admin.ModelAdmin):
+class NurseDocumentAdmin(LargeTableAdmin):
     list_display = ('nurse', 'document_type', 'expiry_date', 'uploaded_at')
+    list_select_related = ('nurse',)
     list_filter = ('document_type',)
-    search_fields = ('nurse__full_name', 'document_type')
+    search_fields = ('nurse__full_name', 'nurse__registration_number')
+    search_indexes = {'nurse': Nurse}
+    autocomplete_fields = ('nurse',)
+    raw_id_fields = ('verified_by',)
 
 @admin.register(Shift)
-class ShiftAdmin(admin.ModelAdmin):
+class ShiftAdmin(LargeTableAdmin):
     list_display = ('hospital', 'ward', 'specialty_required', 'shift_date', 'shift_time', 'status')
-    list_filter = ('status', 'specialty_required', 'hospital')
-    search_fields = ('ward', 'po_number')
+    list_select_related = ('hospital',)
+    list_filter = ('status', ShiftSpecialtyFilter, 'hospital')
+    search_fields = ('po_number', 'ward', 'specialty_required', 'hospital__name')
+    search_indexes = {'pk': Shift}
+    autocomplete_fields = ('hospital',)
 
 @admin.register(Booking)
-class BookingAdmin(admin.ModelAdmin):
+class BookingAdmin(LargeTableAdmin):
     list_display = ('shift', 'nurse', 'agency', 'booked_at')
+    # The shift's name includes its hospital's.
+    list_select_related = ('shift__hospital', 'nurse', 'agency')
     list_filter = ('agency',)
-    search_fields = ('nurse__full_name', 'shift__po_number')
+    search_fields = ('nurse__full_name', 'nurse__registration_number', 'shift__po_number')
+    search_indexes = {'nurse': Nurse, 'shift': Shift}
+    autocomplete_fields = ('nurse', 'agency')
+    raw_id_fields = ('shift',)
+
+@admin.register(Job)
+class JobAdmin(LargeTableAdmin):
+    list_display = ('task', 'status', 'attempts', 'max_attempts', 'run_at', 'created_at', 'finished_at')
+    list_filter = ('status',)
+    search_fields = ('task',)
+    ordering = ('-id',)
+    readonly_fields = ('claim', 'claimed_at', 'last_error', 'created_at', 'finished_at')
+    actions = ['retry']
+
+    @admin.action(description='Retry selected jobs now')
+    def retry(self, request, queryset):
+        count = queryset.exclude(status=Job.Status.RUNNING).update(
+            status=Job.Status.QUEUED, attempts=0, run_at=timezone.now(), finished_at=None
+        )
+        self.message_user(request, f'{count} jobs queued again.')
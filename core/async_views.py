@@ -0,0 +1,149 @@
+"""
+Coroutine versions of the pages agencies and hospitals poll hardest.
+
+``core.urls`` routes to these instead of their namesakes in ``core.views``
+when ``settings.ASYNC_VIEWS`` is on, as it is under ``medicare.asgi``. A
+request waiting on the database then no longer holds a worker thread, so one
+ASGI worker can keep many polls in flight.
+
+Every query runs through the async ORM before rendering starts: a template
+that touched a lazy relation would query synchronously on the event loop,
+which Django refuses to do. The querysets themselves are shared with the sync
+views, so both serve the same rows.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.decorators import login_required, user_passes_test
+from django.http import StreamingHttpResponse
+from django.shortcuts import aget_object_or_404, redirect, render
+
+from . import fragments, search, shift_events, stats
+from .forms import AvailableShiftFilterForm
+from .models import Agency, Hospital, NHSTrust, Nurse, TrustAgencyAccess
+from .replicas import replica_reads
+from .views import (
+    agency_nurses, approved_trust_access, available_shifts_context, available_shifts_paginator,
+    hospital_shifts, is_agency, is_hospital
+)
+
+
+async def _user(request):
+    # The auth context processor reads request.user, whose lazy loader would
+    # query synchronously; replace it with the user already loaded here.
+    request.user = await request.auser()
+    return request.user
+
+
+async def _agency_id(user):
+    return await Agency.objects.filter(user=user).values_list('id', flat=True).aget()
+
+
+async def _list(queryset):
+    return [obj async for obj in queryset]
+
+
+@login_required
+@replica_reads
+async def dashboard(request):
+    user = await _user(request)
+    if user.role == 'admin':
+        platform_stats, fragment_stats = await asyncio.gather(
+            stats.aplatform_stats(),
+            sync_to_async(fragments.stats)(),
+        )
+        return render(request, 'core/admin_dashboard.html', {
+            'stats': platform_stats,
+            'fragment_stats': fragment_stats,
+        })
+    elif user.role == 'agency':
+        agency_id = await _agency_id(user)
+        agency_stats, approved_access = await asyncio.gather(
+            stats.aagency_stats(agency_id),
+            _list(approved_trust_access(agency_id)),
+        )
+        return render(request, 'core/agency_dashboard.html', {
+            'stats': agency_stats,
+            'approved_access': approved_access,
+        })
+    elif user.role == 'hospital':
+        hospital = await Hospital.objects.select_related('trust').aget(user=user)
+        # The template shows user.hospital; prime the relation it would load.
+        user.hospital = hospital
+        return render(request, 'core/hospital_dashboard.html', {'stats': await stats.ahospital_stats(hospital.id)})
+    return redirect('login')
+
+
+@login_required
+@user_passes_test(is_agency)
+@replica_reads
+async def nurse_list(request):
+    query = request.GET.get('q', '')
+    # A ranked search runs its FTS query when the queryset is built.
+    nurses = await sync_to_async(search.search_queryset)(agency_nurses(await _user(request)), query, ranked=True)
+    return render(request, 'core/nurse_list.html', {'nurses': await _list(nurses), 'query': query})
+
+
+@login_required
+@user_passes_test(is_agency)
+@replica_reads
+async def nurse_documents(request, nurse_id):
+    nurse = await aget_object_or_404(Nurse, id=nurse_id, agency__user=await _user(request))
+    documents = await _list(nurse.documents.all().order_by('-uploaded_at'))
+    return render(request, 'core/nurse_documents.html', {
+        'nurse': nurse,
+        'documents': documents
+    })
+
+
+@login_required
+@user_passes_test(is_hospital)
+@replica_reads
+async def shift_list(request):
+    query = request.GET.get('q', '')
+    shifts = await sync_to_async(search.search_queryset)(hospital_shifts(await _user(request)), query, ranked=True)
+    return render(request, 'core/shift_list.html', {'shifts': await _list(shifts), 'query': query})
+
+
+@login_required
+@user_passes_test(is_agency)
+@replica_reads
+async def available_shifts(request):
+    agency_id = await _agency_id(await _user(request))
+    trusts = NHSTrust.objects.filter(
+        trustagencyaccess__agency_id=agency_id,
+        trustagencyaccess__approved=True
+    ).order_by('name')
+
+    form = AvailableShiftFilterForm(request.GET or None, trusts=trusts)
+    if form.is_bound:
+        # Validating the trust choice looks it up with a sync query.
+        await sync_to_async(form.is_valid)()
+    paginator = available_shifts_paginator(agency_id, form)
+    trust_list, page = await asyncio.gather(
+        _list(trusts),
+        paginator.aget_page(request.GET.get('cursor')),
+    )
+    # Render the select from the trusts fetched above, not a fresh query.
+    field = form.fields['trust']
+    field.choices = [('', field.empty_label)] + [(trust.pk, field.label_from_instance(trust)) for trust in trust_list]
+    return render(request, 'core/available_shifts.html', available_shifts_context(request, form, page))
+
+
+# Always served from here, whatever ASYNC_VIEWS says: a stream that held a
+# thread for each idle agency would defeat the point of it.
+@login_required
+@user_passes_test(is_agency)
+async def shift_stream(request):
+    agency_id = await _agency_id(await _user(request))
+    trusts = await _list(
+        TrustAgencyAccess.objects.filter(agency_id=agency_id, approved=True).values_list('trust_id', flat=True)
+    )
+    response = StreamingHttpResponse(
+        shift_events.stream(trusts, request.headers.get('Last-Event-ID')),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    # Tell nginx not to buffer the events.
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,66 @@
+"""
+Shared plumbing for the ``bench_*`` management commands.
+
+Benchmarks never touch the configured database: they run against a throwaway
+copy of the schema created the same way the test runner does it. SQLite test
+databases default to in-memory, which cannot be shared by the worker threads
+a contention benchmark needs, so a temporary file is used instead.
+"""
+import importlib
+import math
+import os
+import shutil
+import sys
+import tempfile
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection, connections
+from django.test import override_settings
+from django.urls import clear_url_caches
+
+
+@contextmanager
+def benchmark_database():
+    tmpdir = None
+    if connection.vendor == 'sqlite':
+        tmpdir = tempfile.mkdtemp(prefix='medicare-bench-')
+        connection.settings_dict.setdefault('TEST', {})['NAME'] = os.path.join(tmpdir, 'bench.sqlite3')
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connections.close_all()
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        if tmpdir:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+@contextmanager
+def read_views(async_views):
+    """Route the polled pages to core.async_views or core.views for the duration."""
+    def reload_urls():
+        for name in ('core.urls', settings.ROOT_URLCONF):
+            if name in sys.modules:
+                importlib.reload(sys.modules[name])
+        clear_url_caches()
+
+    try:
+        with override_settings(ASYNC_VIEWS=async_views):
+            reload_urls()
+            yield
+    finally:
+        reload_urls()
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of ``values`` (which need not be sorted)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(int(math.ceil(pct / 100 * len(ordered))) - 1, 0)
+    return ordered[rank]
+
+
+def format_latency(seconds):
+    return f'{seconds * 1000:.2f}ms'
@@ -0,0 +1,197 @@
+"""
+Billing rollups: what each agency has billed each trust, per month and specialty.
+
+A shift is billable once it is completed and its booking is not cancelled;
+it bills ``duration_hours * rate_per_hour`` to the booking's agency. Each
+BillingRollup row holds the totals for one (trust, agency, month, specialty)
+cell, so an invoice run reads one month's rows instead of joining every
+booking in it.
+
+Cells are kept up to date incrementally. ``keys`` names the cells a set of
+shifts currently bill to, and ``refresh`` recomputes those cells from the
+source tables: callers capture the keys before a change and refresh them
+together with the keys after it, so a shift that moves month, agency or
+specialty, or stops being billable, leaves its old cell as well. A cell is
+a small indexed read, and recomputing it rather than applying a delta means
+a refresh also repairs any drift in that cell.
+
+Sums are taken in Python with ``Decimal`` rather than by the database:
+SQLite adds decimals as floats, and invoice totals have to be exact.
+
+Signal handlers in ``core.signals`` cover ordinary ``save()``/``delete()``
+calls. Code that completes or cancels shifts with ``QuerySet.update()`` or
+``bulk_create()`` must call ``refresh`` itself, or ``rebuild``.
+"""
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Q
+
+from .models import Agency, BillingRollup, NHSTrust, Shift
+
+CHUNK_SIZE = 2000
+KEY = ('hospital__trust_id', 'booking__agency_id', 'shift_date', 'specialty_required')
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def next_month(month):
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def billable(shifts=None):
+    if shifts is None:
+        shifts = Shift.objects.all()
+    return shifts.filter(status=Shift.Status.COMPLETED, booking__cancelled=False)
+
+
+def _key(trust_id, agency_id, shift_date, specialty):
+    return trust_id, agency_id, month_start(shift_date), specialty or ''
+
+
+def keys(shift_ids):
+    """The (trust, agency, month, specialty) cells these shifts currently bill to."""
+    return {
+        _key(*row)
+        for row in billable(Shift.objects.filter(pk__in=shift_ids)).values_list(*KEY).order_by()
+    }
+
+
+def _add(totals, duration, rate):
+    shifts, hours, amount = totals
+    return shifts + 1, hours + duration, amount + duration * rate
+
+
+def _zero():
+    return 0, Decimal('0.00'), Decimal('0.0000')
+
+
+def expected_totals(shifts=None):
+    """{(trust, agency, month, specialty): (shifts, hours, amount)}, recomputed from the source tables."""
+    totals = defaultdict(_zero)
+    rows = billable(shifts).values_list(*KEY, 'duration_hours', 'rate_per_hour').order_by()
+    for *key, duration, rate in rows.iterator(chunk_size=CHUNK_SIZE):
+        key = _key(*key)
+        totals[key] = _add(totals[key], duration, rate)
+    return dict(totals)
+
+
+def _cell(trust_id, agency_id, month, specialty):
+    specialty_filter = Q(specialty_required=specialty)
+    if not specialty:
+        specialty_filter |= Q(specialty_required__isnull=True)
+    return billable().filter(
+        specialty_filter,
+        hospital__trust_id=trust_id,
+        booking__agency_id=agency_id,
+        shift_date__gte=month,
+        shift_date__lt=next_month(month),
+    )
+
+
+def refresh(cells):
+    """Recompute these (trust, agency, month, specialty) cells."""
+    with transaction.atomic():
+        for cell in cells:
+            trust_id, agency_id, month, specialty = cell
+            totals = _zero()
+            for duration, rate in _cell(*cell).values_list('duration_hours', 'rate_per_hour').order_by():
+                totals = _add(totals, duration, rate)
+            rollup = BillingRollup.objects.filter(
+                trust_id=trust_id, agency_id=agency_id, month=month, specialty=specialty
+            )
+            if not totals[0]:
+                rollup.delete()
+            elif not rollup.update(shifts=totals[0], hours=totals[1], amount=totals[2]):
+                BillingRollup.objects.create(
+                    trust_id=trust_id, agency_id=agency_id, month=month, specialty=specialty,
+                    shifts=totals[0], hours=totals[1], amount=totals[2],
+                )
+
+
+def refresh_shifts(shift_ids, before=()):
+    """Refresh the cells ``shift_ids`` bill to now and the ``before`` cells they billed to."""
+    refresh(set(before) | keys(shift_ids))
+
+
+def _rows(totals):
+    return (
+        BillingRollup(
+            trust_id=trust_id, agency_id=agency_id, month=month, specialty=specialty,
+            shifts=shifts, hours=hours, amount=amount,
+        )
+        for (trust_id, agency_id, month, specialty), (shifts, hours, amount) in totals.items()
+    )
+
+
+def rebuild():
+    totals = expected_totals()
+    with transaction.atomic():
+        BillingRollup.objects.all().delete()
+        BillingRollup.objects.bulk_create(_rows(totals), batch_size=1000)
+    return len(totals)
+
+
+def verify():
+    """
+    Compare the rollups with a full recomputation. Returns a list of
+    (cell, expected, actual) for every cell that differs, where a missing
+    side is None.
+    """
+    expected = expected_totals()
+    actual = {
+        (trust_id, agency_id, month, specialty): (shifts, hours, amount)
+        for trust_id, agency_id, month, specialty, shifts, hours, amount in BillingRollup.objects.values_list(
+            'trust_id', 'agency_id', 'month', 'specialty', 'shifts', 'hours', 'amount'
+        ).iterator(chunk_size=CHUNK_SIZE)
+    }
+    return [
+        (cell, expected.get(cell), actual.get(cell))
+        for cell in sorted(expected.keys() | actual.keys(), key=str)
+        if expected.get(cell) != actual.get(cell)
+    ]
+
+
+class Invoice:
+    """One agency's bill for a month: a line per trust and specialty."""
+
+    def __init__(self, agency, month):
+        self.agency = agency
+        self.month = month
+        self.lines = []
+
+    @property
+    def shifts(self):
+        return sum(line['shifts'] for line in self.lines)
+
+    @property
+    def hours(self):
+        return sum((line['hours'] for line in self.lines), Decimal('0.00'))
+
+    @property
+    def amount(self):
+        return sum((line['amount'] for line in self.lines), Decimal('0.0000'))
+
+
+def invoices(month, agency=None):
+    """The invoices for ``month`` in agency name order, read from the rollups alone."""
+    month = month_start(month)
+    rollups = BillingRollup.objects.filter(month=month)
+    if agency is not None:
+        rollups = rollups.filter(agency_id=agency)
+    rows = list(rollups.values('agency_id', 'trust_id', 'specialty', 'shifts', 'hours', 'amount').order_by())
+    agencies = Agency.objects.in_bulk({row['agency_id'] for row in rows})
+    trusts = dict(NHSTrust.objects.filter(pk__in={row['trust_id'] for row in rows}).values_list('id', 'name'))
+    by_agency = {}
+    for row in rows:
+        invoice = by_agency.get(row['agency_id'])
+        if invoice is None:
+            invoice = by_agency[row['agency_id']] = Invoice(agencies[row['agency_id']], month)
+        invoice.lines.append({**row, 'trust': trusts[row['trust_id']]})
+    for invoice in by_agency.values():
+        invoice.lines.sort(key=lambda line: (line['trust'], line['specialty']))
+    return sorted(by_agency.values(), key=lambda invoice: (invoice.agency.name, invoice.agency.pk))
@@ -0,0 +1,112 @@
+"""
+Booking a nurse onto an open shift.
+
+The shift is claimed with a single conditional ``UPDATE ... WHERE status =
+'open'``, so when several agencies race for the same shift exactly one update
+matches a row and everybody else gets a clean "already taken" result instead
+of an IntegrityError from ``Booking.shift``. The claim, the booking row and
+the eligibility index change commit or roll back together.
+
+Each booking carries its shift's ``starts_at``/``ends_at``. A nurse's
+bookings that could overlap a new shift all start within
+``Shift.MAX_DURATION`` before its end, so the overlap check is a bounded range
+scan of ``booking_nurse_window_idx`` however long the nurse's history grows.
+"""
+from django.db import IntegrityError, transaction
+
+from .models import AgencyShiftEligibility, Booking, Nurse, Shift
+
+
+class BookingResult:
+    BOOKED = 'booked'
+    TAKEN = 'taken'
+    NOT_PERMITTED = 'not_permitted'
+    INVALID_NURSE = 'invalid_nurse'
+    OVERLAP = 'overlap'
+
+    MESSAGES = {
+        BOOKED: 'Shift booked successfully.',
+        TAKEN: 'Sorry, this shift has already been taken.',
+        NOT_PERMITTED: 'Your agency is not approved to book this shift.',
+        INVALID_NURSE: 'Only approved nurses from your agency can be booked.',
+        OVERLAP: 'This nurse is already booked on a shift that overlaps this one.',
+    }
+
+    def __init__(self, status, booking=None):
+        self.status = status
+        self.booking = booking
+
+    def __bool__(self):
+        return self.status == self.BOOKED
+
+    def __repr__(self):
+        return f'<BookingResult {self.status}>'
+
+    @property
+    def message(self):
+        return self.MESSAGES[self.status]
+
+
+def book_shift(shift_id, nurse_id, agency):
+    if not Nurse.objects.filter(pk=nurse_id, agency=agency, is_approved=True, is_active=True).exists():
+        return BookingResult(BookingResult.INVALID_NURSE)
+
+    if not AgencyShiftEligibility.objects.filter(agency=agency, shift_id=shift_id).exists():
+        # Either the shift has gone already or this agency never had access to it.
+        if Shift.objects.filter(pk=shift_id).exclude(status=Shift.Status.OPEN).exists():
+            return BookingResult(BookingResult.TAKEN)
+        return BookingResult(BookingResult.NOT_PERMITTED)
+
+    try:
+        with transaction.atomic():
+            # Claim first: on SQLite a transaction that reads before it writes
+            # cannot wait for the write lock and fails with "database is locked".
+            claimed = Shift.objects.filter(pk=shift_id, status=Shift.Status.OPEN).update(status=Shift.Status.BOOKED)
+            if not claimed:
+                return BookingResult(BookingResult.TAKEN)
+            # Lock the nurse so two overlapping shifts cannot both pass the check.
+            list(Nurse.objects.select_for_update().filter(pk=nurse_id).values_list('pk'))
+            window = Shift.objects.values_list('starts_at', 'ends_at').get(pk=shift_id)
+            if overlapping_bookings(nurse_id, *window).exists():
+                transaction.set_rollback(True)
+                return BookingResult(BookingResult.OVERLAP)
+            booking = Booking.objects.create(
+                shift_id=shift_id, nurse_id=nurse_id, agency=agency, starts_at=window[0], ends_at=window[1]
+            )
+            # update() bypasses the Shift post_save signal, so drop the shift from the feed here.
+            AgencyShiftEligibility.objects.filter(shift_id=shift_id).delete()
+    except IntegrityError:
+        # A stale booking row for this shift (e.g. left over from a cancellation).
+        return BookingResult(BookingResult.TAKEN)
+    return BookingResult(BookingResult.BOOKED, booking)
+
+
+def overlapping_bookings(nurse_id, starts_at, ends_at):
+    """The nurse's live bookings whose shifts overlap [starts_at, ends_at)."""
+    return Booking.objects.filter(
+        nurse_id=nurse_id,
+        cancelled=False,
+        starts_at__gt=starts_at - Shift.MAX_DURATION,
+        starts_at__lt=ends_at,
+        ends_at__gt=starts_at,
+    )
+
+
+def find_overlaps():
+    """
+    Yield ``(earlier, later)`` booking id pairs where a nurse works two
+    overlapping shifts, in one ordered pass over the whole table. Each
+    booking is compared with the longest-running earlier booking of the same
+    nurse, so every overlapping booking is reported at least once.
+    """
+    bookings = Booking.objects.filter(cancelled=False).order_by('nurse_id', 'starts_at', 'id').values_list(
+        'id', 'nurse_id', 'starts_at', 'ends_at'
+    )
+    nurse, latest = None, None
+    for booking_id, nurse_id, starts_at, ends_at in bookings.iterator(chunk_size=2000):
+        if nurse_id != nurse:
+            nurse, latest = nurse_id, None
+        elif starts_at < latest[1]:
+            yield latest[0], booking_id
+        if latest is None or ends_at > latest[1]:
+            latest = (booking_id, ends_at)
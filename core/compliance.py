@@ -0,0 +1,88 @@
+"""
+Stored compliance state for nurses.
+
+A nurse is compliant while they hold a verified, unexpired document of every
+type in ``NurseDocument.REQUIRED_TYPES``. ``Nurse.compliant_until`` is the
+last day that stays true given the documents on file (the earliest of the
+latest expiry per required type) and ``Nurse.is_compliant`` says whether that
+day is still ahead. Document changes refresh the owning nurse through the
+signal handlers in ``core.signals``; ``roll_over`` runs nightly to clear
+``is_compliant`` for everyone whose documents lapsed, with one UPDATE.
+"""
+from collections import defaultdict
+
+from django.db.models import F, Max
+from django.utils import timezone
+
+from . import stats
+from .models import Nurse, NurseDocument
+
+REBUILD_BATCH_SIZE = 1000
+
+
+def documents_valid_until(nurses):
+    """
+    {nurse_id: last day every required document is valid} for ``nurses``,
+    counting only verified documents. Nurses missing a type are left out.
+    """
+    latest = defaultdict(dict)
+    documents = NurseDocument.objects.filter(
+        nurse__in=nurses.values('pk'),
+        verified=True,
+        document_type__in=NurseDocument.REQUIRED_TYPES,
+    ).values('nurse_id', 'document_type').annotate(expiry=Max('expiry_date')).order_by()
+    for row in documents:
+        latest[row['nurse_id']][row['document_type']] = row['expiry']
+    return {
+        nurse_id: min(expiries.values())
+        for nurse_id, expiries in latest.items()
+        if len(expiries) == len(NurseDocument.REQUIRED_TYPES)
+    }
+
+
+def refresh(nurses, today=None):
+    """Recompute the stored state of ``nurses``; returns how many changed."""
+    today = today or timezone.now().date()
+    valid_until = documents_valid_until(nurses)
+    changed = []
+    for nurse in nurses.only('id', 'agency_id', 'is_compliant', 'compliant_until'):
+        compliant_until = valid_until.get(nurse.pk)
+        is_compliant = compliant_until is not None and compliant_until >= today
+        if (nurse.compliant_until, nurse.is_compliant) != (compliant_until, is_compliant):
+            nurse.compliant_until, nurse.is_compliant = compliant_until, is_compliant
+            # The nurse table shows compliance; see core.fragments.
+            nurse.cache_version = F('cache_version') + 1
+            changed.append(nurse)
+    # bulk_update sends no post_save, so there is no Nurse signal to loop back here.
+    Nurse.objects.bulk_update(
+        changed, ['compliant_until', 'is_compliant', 'cache_version'], batch_size=REBUILD_BATCH_SIZE
+    )
+    stats.invalidate(agencies={nurse.agency_id for nurse in changed})
+    return len(changed)
+
+
+def refresh_nurse(nurse_id):
+    return refresh(Nurse.objects.filter(pk=nurse_id))
+
+
+def roll_over(today=None):
+    """Clear is_compliant for every nurse whose documents ran out before ``today``."""
+    today = today or timezone.now().date()
+    lapsed = Nurse.objects.filter(is_compliant=True, compliant_until__lt=today)
+    agencies = set(lapsed.values_list('agency_id', flat=True).distinct())
+    flipped = lapsed.update(is_compliant=False, cache_version=F('cache_version') + 1)
+    stats.invalidate(agencies=agencies)
+    return flipped
+
+
+def rebuild(today=None):
+    """Recompute every nurse from their documents, in batches; returns how many changed."""
+    changed, last_id = 0, 0
+    while True:
+        ids = list(
+            Nurse.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:REBUILD_BATCH_SIZE]
+        )
+        if not ids:
+            return changed
+        changed += refresh(Nurse.objects.filter(pk__in=ids), today)
+        last_id = ids[-1]
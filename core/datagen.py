@@ -0,0 +1,277 @@
+"""
+Deterministic synthetic data at production scale, for load testing.
+
+``DataGenerator(seed)`` always produces the same rows for the same seed, day
+and options on an empty database. Rows are built in memory a batch at a time
+and inserted with ``bulk_create``; shifts are streamed, so a million of them
+never sit in memory at once. ``bulk_create`` sends no signals, so the
+generator does what the handlers in ``core.signals`` would: shift and booking
+windows are filled in, nurse compliance is refreshed from the documents, and
+the agency shift feed, search index and billing rollups are synced once at
+the end.
+
+The shape of the data follows what the platform sees:
+
+* specialties are weighted towards general nursing;
+* most documents are in date, some expire within the month, a few have lapsed;
+* shifts are spread over the past six months and the next three, on the
+  usual day, long-day and night patterns;
+* past shifts are completed when booked and cancelled when not; a nurse
+  works at most one shift in any two consecutive days, so no bookings overlap.
+"""
+import random
+from datetime import time, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+
+from . import billing, compliance, eligibility, search, stats
+from .models import (
+    User, NHSTrust, Hospital, Agency, TrustAgencyAccess, Nurse, NurseDocument, Shift, Booking
+)
+
+SPECIALTIES = {
+    'General Nursing': 40,
+    'A&E': 14,
+    'ICU': 12,
+    'Mental Health': 10,
+    'Paediatrics': 9,
+    'Theatre': 8,
+    'Midwifery': 7,
+}
+BASE_RATES = {
+    'General Nursing': 24, 'A&E': 30, 'ICU': 34, 'Mental Health': 27,
+    'Paediatrics': 29, 'Theatre': 31, 'Midwifery': 30,
+}
+# (start, hours, weight): early, long day, late and night shifts.
+SHIFT_PATTERNS = [
+    (time(7, 0), 12, 35),
+    (time(8, 0), 8, 20),
+    (time(14, 0), 8, 15),
+    (time(19, 0), 12, 20),
+    (time(20, 0), 12, 10),
+]
+REGIONS = ['London', 'South East', 'South West', 'Midlands', 'East of England', 'North West', 'North East', 'Yorkshire']
+WARDS = ['Ward A', 'Ward B', 'Ward C', 'Ward D', 'Acute Medical Unit', 'Surgical', 'Day Surgery', 'Respiratory']
+FIRST_NAMES = ['Amelia', 'Olivia', 'Isla', 'Ava', 'Mia', 'Grace', 'Sophie', 'Priya', 'Aisha', 'Chloe',
+               'James', 'Oliver', 'Mohammed', 'Daniel', 'Thomas', 'Kwame', 'Samuel', 'Joseph', 'Adam', 'Luca']
+LAST_NAMES = ['Smith', 'Jones', 'Williams', 'Taylor', 'Brown', 'Davies', 'Evans', 'Wilson', 'Patel', 'Khan',
+              'Thomas', 'Roberts', 'Johnson', 'Walker', 'Wright', 'Okafor', 'Nowak', 'Singh', 'Murphy', 'Hughes']
+PAST_DAYS = 180
+FUTURE_DAYS = 90
+BOOKING_ATTEMPTS = 5
+
+
+def _weighted(options):
+    return list(options), list(options.values())
+
+
+class DataGenerator:
+    def __init__(self, seed=0, today=None, batch_size=5000, log=None):
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.today = today or timezone.now().date()
+        self.batch_size = batch_size
+        self.log = log or (lambda message: None)
+        self.prefix = f'gen{seed}'
+        self.password = make_password(None)
+        self.specialties, self.specialty_weights = _weighted(SPECIALTIES)
+        self.patterns = [(start, hours) for start, hours, _ in SHIFT_PATTERNS]
+        self.pattern_weights = [weight for _, _, weight in SHIFT_PATTERNS]
+
+    def run(self, trusts, hospitals, agencies, nurses, shifts, booking_ratio=0.6):
+        trust_ids = self.make_trusts(trusts)
+        hospitals = self.make_hospitals(hospitals, trust_ids)
+        agency_ids = self.make_agencies(agencies)
+        access = self.make_access(agency_ids, trust_ids)
+        candidates = self.make_nurses(nurses, agency_ids, access)
+        self.make_shifts(shifts, hospitals, candidates, booking_ratio)
+        self.log('Syncing the agency shift feed, search index and billing rollups')
+        generated = Shift.objects.filter(hospital_id__in=[pk for pk, _ in hospitals])
+        eligibility.sync_shifts(generated)
+        search.index_queryset(generated)
+        search.index_queryset(Nurse.objects.filter(agency_id__in=agency_ids))
+        search.index_queryset(Agency.objects.filter(pk__in=agency_ids))
+        billing.rebuild()
+        stats.invalidate(platform=True)
+
+    def _users(self, role, count):
+        users = User.objects.bulk_create([
+            User(
+                username=f'{self.prefix}_{role}{i}',
+                email=f'{self.prefix}_{role}{i}@example.com',
+                role=role,
+                password=self.password,
+            )
+            for i in range(count)
+        ], batch_size=self.batch_size)
+        return [user.pk for user in users]
+
+    def make_trusts(self, count):
+        self.log(f'Creating {count} trusts')
+        trusts = NHSTrust.objects.bulk_create([
+            NHSTrust(
+                name=f'{self.rng.choice(REGIONS)} NHS Trust {i + 1}',
+                region=self.rng.choice(REGIONS),
+                contact_email=f'{self.prefix}_trust{i}@nhs.example.com',
+            )
+            for i in range(count)
+        ], batch_size=self.batch_size)
+        return [trust.pk for trust in trusts]
+
+    def make_hospitals(self, count, trust_ids):
+        """[(hospital_id, trust_id)]; every trust gets at least one hospital."""
+        self.log(f'Creating {count} hospitals')
+        user_ids = self._users(User.Role.HOSPITAL, count)
+        hospitals = Hospital.objects.bulk_create([
+            Hospital(
+                trust_id=trust_ids[i] if i < len(trust_ids) else self.rng.choice(trust_ids),
+                user_id=user_id,
+                name=f'{self.rng.choice(LAST_NAMES)} General Hospital {i + 1}',
+            )
+            for i, user_id in enumerate(user_ids)
+        ], batch_size=self.batch_size)
+        return [(hospital.pk, hospital.trust_id) for hospital in hospitals]
+
+    def make_agencies(self, count):
+        self.log(f'Creating {count} agencies')
+        user_ids = self._users(User.Role.AGENCY, count)
+        agencies = Agency.objects.bulk_create([
+            Agency(
+                user_id=user_id,
+                name=f'{self.rng.choice(LAST_NAMES)} Nursing {i + 1}',
+                contact_email=f'{self.prefix}_agency{i}@example.com',
+            )
+            for i, user_id in enumerate(user_ids)
+        ], batch_size=self.batch_size)
+        return [agency.pk for agency in agencies]
+
+    def make_access(self, agency_ids, trust_ids):
+        """{agency_id: [trust_id]} of approved access; most agencies supply a few trusts."""
+        approved, rows = {}, []
+        for agency_id in agency_ids:
+            trusts = self.rng.sample(trust_ids, min(len(trust_ids), self.rng.choice([1, 1, 2, 2, 3, 5])))
+            approved[agency_id] = []
+            for trust_id in trusts:
+                is_approved = self.rng.random() < 0.9
+                rows.append(TrustAgencyAccess(agency_id=agency_id, trust_id=trust_id, approved=is_approved))
+                if is_approved:
+                    approved[agency_id].append(trust_id)
+        TrustAgencyAccess.objects.bulk_create(rows, batch_size=self.batch_size)
+        return approved
+
+    def make_nurses(self, count, agency_ids, access):
+        """{(trust_id, specialty): [(nurse_id, agency_id)]} of nurses who can be booked there."""
+        self.log(f'Creating {count} nurses')
+        candidates = {}
+        for start in range(0, count, self.batch_size):
+            with transaction.atomic():
+                nurses = Nurse.objects.bulk_create([
+                    self.nurse(start + i, self.rng.choice(agency_ids))
+                    for i in range(min(self.batch_size, count - start))
+                ])
+                NurseDocument.objects.bulk_create([
+                    document for nurse in nurses for document in self.documents(nurse)
+                ])
+                compliance.refresh(Nurse.objects.filter(pk__in=[nurse.pk for nurse in nurses]), self.today)
+            for nurse in nurses:
+                if not (nurse.is_approved and nurse.is_active):
+                    continue
+                for trust_id in access[nurse.agency_id]:
+                    candidates.setdefault((trust_id, nurse.specialty), []).append((nurse.pk, nurse.agency_id))
+        return candidates
+
+    def nurse(self, i, agency_id):
+        rng = self.rng
+        return Nurse(
+            agency_id=agency_id,
+            full_name=f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+            dob=self.today - timedelta(days=rng.randint(22 * 365, 64 * 365)),
+            registration_number=f'{self.prefix.upper()}-{i:07d}',
+            specialty=rng.choices(self.specialties, self.specialty_weights)[0],
+            is_approved=rng.random() < 0.92,
+            is_active=rng.random() < 0.97,
+        )
+
+    def documents(self, nurse):
+        for document_type in NurseDocument.REQUIRED_TYPES:
+            roll = self.rng.random()
+            if roll < 0.05:
+                expires_in = -self.rng.randint(1, 365)
+            elif roll < 0.15:
+                expires_in = self.rng.randint(0, 30)
+            else:
+                expires_in = self.rng.randint(31, 3 * 365)
+            yield NurseDocument(
+                nurse=nurse,
+                document_type=document_type,
+                file_url=f'nurse_documents/{document_type}.pdf',
+                expiry_date=self.today + timedelta(days=expires_in),
+                verified=self.rng.random() < 0.95,
+            )
+
+    def make_shifts(self, count, hospitals, candidates, booking_ratio):
+        self.log(f'Creating {count} shifts')
+        busy = {}
+        made = 0
+        while made < count:
+            size = min(self.batch_size, count - made)
+            shifts, nurses = [], []
+            for i in range(size):
+                shift, nurse = self.shift(made + i, *self.rng.choice(hospitals), candidates, busy, booking_ratio)
+                shifts.append(shift)
+                nurses.append(nurse)
+            with transaction.atomic():
+                Shift.objects.bulk_create(shifts)
+                Booking.objects.bulk_create([
+                    Booking(
+                        shift=shift, nurse_id=nurse[0], agency_id=nurse[1],
+                        starts_at=shift.starts_at, ends_at=shift.ends_at,
+                        confirmed=True, confirmed_at=shift.starts_at - timedelta(days=2),
+                    )
+                    for shift, nurse in zip(shifts, nurses) if nurse
+                ])
+            made += size
+            self.log(f'  {made}/{count} shifts')
+
+    def shift(self, i, hospital_id, trust_id, candidates, busy, booking_ratio):
+        rng = self.rng
+        day = self.today + timedelta(days=rng.randint(-PAST_DAYS, FUTURE_DAYS))
+        start, hours = rng.choices(self.patterns, self.pattern_weights)[0]
+        specialty = rng.choices(self.specialties, self.specialty_weights)[0]
+        nurse = None
+        if rng.random() < booking_ratio:
+            nurse = self.free_nurse(candidates.get((trust_id, specialty)), day, busy)
+        past = day < self.today
+        if nurse:
+            status = Shift.Status.COMPLETED if past else Shift.Status.BOOKED
+        else:
+            status = Shift.Status.CANCELLED if past else Shift.Status.OPEN
+        shift = Shift(
+            hospital_id=hospital_id,
+            ward=rng.choice(WARDS),
+            specialty_required=specialty,
+            po_number=f'{self.prefix.upper()}-PO{i:08d}',
+            shift_date=day,
+            shift_time=start,
+            duration_hours=Decimal(hours),
+            rate_per_hour=Decimal(BASE_RATES[specialty] + rng.randint(-2, 6)),
+            status=status,
+        )
+        shift.set_window()
+        return shift, nurse
+
+    def free_nurse(self, pool, day, busy):
+        """A nurse from ``pool`` with nothing booked the day before, on, or after ``day``."""
+        if not pool:
+            return None
+        ordinal = day.toordinal()
+        for _ in range(BOOKING_ATTEMPTS):
+            nurse = self.rng.choice(pool)
+            days = busy.setdefault(nurse[0], set())
+            if not days.intersection((ordinal - 1, ordinal, ordinal + 1)):
+                days.add(ordinal)
+                return nurse
+        return None
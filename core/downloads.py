@@ -0,0 +1,133 @@
+"""
+Serving stored files to users who are allowed to see them.
+
+Permission checks happen in the view; ``serve`` then answers conditional
+requests with 304 before touching the file and either hands the transfer to
+the web server or streams it itself:
+
+* ``DOCUMENT_SENDFILE = 'x-accel-redirect'`` (nginx) returns an empty response
+  whose ``X-Accel-Redirect`` header points into ``DOCUMENT_ACCEL_REDIRECT_PREFIX``,
+  an ``internal`` location aliased to MEDIA_ROOT;
+* ``DOCUMENT_SENDFILE = 'x-sendfile'`` (Apache mod_xsendfile, lighttpd) returns
+  the absolute path in ``X-Sendfile``;
+* otherwise Django answers with a FileResponse, which the WSGI server's
+  ``wsgi.file_wrapper`` can send with sendfile(2), or with just the requested
+  byte range.
+
+Either way the worker is done as soon as the headers are written, and a
+client that already holds the file gets a 304 instead of the bytes again.
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+RANGE_CHUNK_SIZE = 64 * 1024
+SINGLE_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangeFile:
+    """File-like view of ``length`` bytes of ``fileobj`` from ``start``."""
+
+    def __init__(self, fileobj, start, length):
+        self.fileobj = fileobj
+        self.remaining = length
+        fileobj.seek(start)
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.fileobj.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.fileobj.close()
+
+
+def parse_range(header, size):
+    """
+    ``(start, end)`` inclusive for a single satisfiable ``bytes=`` range,
+    ``None`` when the whole file should be sent instead (no header, several
+    ranges, or a malformed one), and ``False`` when it cannot be satisfied.
+    """
+    match = SINGLE_RANGE.match(header or '')
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+        if last and int(last) < start:
+            return None
+    else:
+        start, end = max(size - int(last), 0), size - 1
+    if start >= size or (not first and int(last) == 0):
+        return False
+    return start, end
+
+
+def _sendfile_response(name, path, content_type):
+    backend = getattr(settings, 'DOCUMENT_SENDFILE', None)
+    if backend == 'x-accel-redirect':
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = quote(settings.DOCUMENT_ACCEL_REDIRECT_PREFIX.rstrip('/') + '/' + name)
+        return response
+    if backend == 'x-sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = path
+        return response
+    return None
+
+
+def serve(request, fieldfile, filename, etag=None, as_attachment=False):
+    path = fieldfile.path
+    stat = os.stat(path)
+    etag = quote_etag(etag) if etag else f'W/"{stat.st_size:x}-{int(stat.st_mtime):x}"'
+    last_modified = int(stat.st_mtime)
+
+    content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = _sendfile_response(fieldfile.name, path, content_type)
+    if response is None:
+        response = _file_response(request, path, stat.st_size, etag, content_type)
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    if response.status_code != 304:
+        disposition = 'attachment' if as_attachment else 'inline'
+        response['Content-Disposition'] = f"{disposition}; filename*=UTF-8''{quote(filename)}"
+    # Documents are personal data: browsers may keep them but must revalidate.
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def _file_response(request, path, size, etag, content_type):
+    byte_range = parse_range(request.headers.get('Range'), size)
+    if_range = request.headers.get('If-Range')
+    # A range only applies to the representation the client already has part of.
+    if byte_range is not None and if_range and (if_range != etag or etag.startswith('W/')):
+        byte_range = None
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    fileobj = open(path, 'rb')
+    if byte_range is None:
+        response = FileResponse(fileobj, content_type=content_type)
+    else:
+        start, end = byte_range
+        length = end - start + 1
+        response = FileResponse(RangeFile(fileobj, start, length), status=206, content_type=content_type)
+        response.block_size = RANGE_CHUNK_SIZE
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(length)
+    response['Accept-Ranges'] = 'bytes'
+    return response
@@ -0,0 +1,114 @@
+"""
+Maintenance of the AgencyShiftEligibility index.
+
+A row exists for every open shift at a hospital whose trust has approved the
+agency. Every entry point replaces the rows for the scope it is given in one
+transaction (delete, then a set-based ``INSERT ... SELECT``), so the same code
+path serves single-shift updates, trust approvals and full rebuilds.
+
+Signal handlers in ``core.signals`` cover ordinary ``save()``/``delete()``
+calls. Code that changes shifts with ``QuerySet.update()`` or ``bulk_create()``
+must call ``sync_shifts()`` itself.
+"""
+from django.db import connection, transaction
+
+from .models import AgencyShiftEligibility, Shift, TrustAgencyAccess
+
+COLUMNS = ('agency_id', 'shift_id', 'trust_id', 'shift_date', 'shift_time')
+
+
+def expected_rows(shifts=None, agency_id=None):
+    """The (agency, shift, trust, date, time) rows that ought to exist for ``shifts``."""
+    if shifts is None:
+        shifts = Shift.objects.all()
+    conditions = {
+        'status': Shift.Status.OPEN,
+        'hospital__trust__trustagencyaccess__approved': True,
+    }
+    if agency_id is not None:
+        conditions['hospital__trust__trustagencyaccess__agency'] = agency_id
+    # A single filter() call so every condition applies to the same access row.
+    return shifts.filter(**conditions).values_list(
+        'hospital__trust__trustagencyaccess__agency',
+        'id',
+        'hospital__trust',
+        'shift_date',
+        'shift_time',
+    ).order_by()
+
+
+def _insert(rows):
+    sql, params = rows.query.sql_with_params()
+    table = connection.ops.quote_name(AgencyShiftEligibility._meta.db_table)
+    columns = ', '.join(connection.ops.quote_name(c) for c in COLUMNS)
+    with connection.cursor() as cursor:
+        cursor.execute(f'INSERT INTO {table} ({columns}) {sql}', params)
+        return cursor.rowcount
+
+
+def _count_difference(left, right):
+    left_sql, left_params = left.query.sql_with_params()
+    right_sql, right_params = right.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT COUNT(*) FROM ({left_sql} EXCEPT {right_sql}) difference',
+            left_params + right_params,
+        )
+        return cursor.fetchone()[0]
+
+
+def sync_shifts(shifts):
+    """Recompute the index for a queryset of shifts."""
+    with transaction.atomic():
+        AgencyShiftEligibility.objects.filter(shift__in=shifts.values('id')).delete()
+        return _insert(expected_rows(shifts))
+
+
+def sync_shift(shift):
+    if shift.status != Shift.Status.OPEN:
+        AgencyShiftEligibility.objects.filter(shift=shift).delete()
+        return 0
+    return sync_shifts(Shift.objects.filter(pk=shift.pk))
+
+
+def sync_hospital(hospital):
+    """Re-point a hospital's shifts at its (possibly new) trust."""
+    return sync_shifts(Shift.objects.filter(hospital=hospital))
+
+
+def sync_access(access):
+    """Grant or revoke an agency's view of one trust's open shifts."""
+    with transaction.atomic():
+        AgencyShiftEligibility.objects.filter(agency_id=access.agency_id, trust_id=access.trust_id).delete()
+        # Drop rows for any trust this agency has lost since, e.g. if the
+        # access row was edited to point at a different trust.
+        AgencyShiftEligibility.objects.filter(agency_id=access.agency_id).exclude(
+            trust__in=TrustAgencyAccess.objects.filter(
+                agency_id=access.agency_id, approved=True
+            ).values('trust'),
+        ).delete()
+        if not access.approved:
+            return 0
+        return _insert(expected_rows(
+            Shift.objects.filter(hospital__trust_id=access.trust_id),
+            agency_id=access.agency_id,
+        ))
+
+
+def revoke_access(access):
+    return AgencyShiftEligibility.objects.filter(
+        agency_id=access.agency_id, trust_id=access.trust_id
+    ).delete()[0]
+
+
+def rebuild():
+    with transaction.atomic():
+        AgencyShiftEligibility.objects.all().delete()
+        return _insert(expected_rows())
+
+
+def verify():
+    """Return (missing, stale) row counts between the index and a full recomputation."""
+    expected = expected_rows()
+    actual = AgencyShiftEligibility.objects.values_list(*COLUMNS).order_by()
+    return _count_difference(expected, actual), _count_difference(actual, expected)
@@ -0,0 +1,128 @@
+"""
+Streaming finance exports of shifts and bookings.
+
+Rows are read with ``values_list(...).iterator()`` so every joined name comes
+back in the same query and no model instances are built, and are encoded one
+line at a time into a generator that can feed either a StreamingHttpResponse
+or a file. Memory use stays flat regardless of how many rows match.
+"""
+import csv
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Booking, Shift
+
+CHUNK_SIZE = 2000
+FORMATS = ('csv', 'ndjson')
+
+SHIFT_COLUMNS = [
+    ('shift_id', 'id'),
+    ('shift_date', 'shift_date'),
+    ('shift_time', 'shift_time'),
+    ('trust', 'hospital__trust__name'),
+    ('hospital', 'hospital__name'),
+    ('ward', 'ward'),
+    ('specialty', 'specialty_required'),
+    ('po_number', 'po_number'),
+    ('status', 'status'),
+    ('duration_hours', 'duration_hours'),
+    ('rate_per_hour', 'rate_per_hour'),
+    ('agency', 'booking__agency__name'),
+    ('nurse', 'booking__nurse__full_name'),
+]
+
+BOOKING_COLUMNS = [
+    ('booking_id', 'id'),
+    ('booked_at', 'booked_at'),
+    ('confirmed', 'confirmed'),
+    ('cancelled', 'cancelled'),
+    ('shift_id', 'shift_id'),
+    ('shift_date', 'shift__shift_date'),
+    ('shift_time', 'shift__shift_time'),
+    ('trust', 'shift__hospital__trust__name'),
+    ('hospital', 'shift__hospital__name'),
+    ('ward', 'shift__ward'),
+    ('po_number', 'shift__po_number'),
+    ('agency', 'agency__name'),
+    ('nurse', 'nurse__full_name'),
+    ('nurse_registration', 'nurse__registration_number'),
+    ('duration_hours', 'shift__duration_hours'),
+    ('rate_per_hour', 'shift__rate_per_hour'),
+]
+
+
+class Export:
+    """
+    A queryset of one kind of row plus the columns to write for it. Each row
+    gets a trailing ``amount``: the product of the duration and rate lookups.
+    """
+
+    def __init__(self, queryset, columns, duration, rate):
+        self.queryset = queryset
+        self.columns = columns
+        self.duration = duration
+        self.rate = rate
+
+    @property
+    def headers(self):
+        return [header for header, _ in self.columns] + ['amount']
+
+    def rows(self):
+        lookups = [lookup for _, lookup in self.columns]
+        duration = lookups.index(self.duration)
+        rate = lookups.index(self.rate)
+        for row in self.queryset.values_list(*lookups).iterator(chunk_size=CHUNK_SIZE):
+            yield row + (row[duration] * row[rate],)
+
+
+def shift_export(date_from=None, date_to=None, trust=None, agency=None, hospital=None):
+    shifts = Shift.objects.order_by('id')
+    if date_from:
+        shifts = shifts.filter(shift_date__gte=date_from)
+    if date_to:
+        shifts = shifts.filter(shift_date__lte=date_to)
+    if trust:
+        shifts = shifts.filter(hospital__trust=trust)
+    if agency:
+        shifts = shifts.filter(booking__agency=agency)
+    if hospital:
+        shifts = shifts.filter(hospital=hospital)
+    return Export(shifts, SHIFT_COLUMNS, 'duration_hours', 'rate_per_hour')
+
+
+def booking_export(date_from=None, date_to=None, trust=None, agency=None, hospital=None):
+    bookings = Booking.objects.order_by('id')
+    if date_from:
+        bookings = bookings.filter(shift__shift_date__gte=date_from)
+    if date_to:
+        bookings = bookings.filter(shift__shift_date__lte=date_to)
+    if trust:
+        bookings = bookings.filter(shift__hospital__trust=trust)
+    if agency:
+        bookings = bookings.filter(agency=agency)
+    if hospital:
+        bookings = bookings.filter(shift__hospital=hospital)
+    return Export(bookings, BOOKING_COLUMNS, 'shift__duration_hours', 'shift__rate_per_hour')
+
+
+class _LineBuffer:
+    """File-like object whose write() hands back the line instead of storing it."""
+
+    def write(self, value):
+        return value
+
+
+def encode(export, fmt):
+    """Yield the export as ``fmt`` text, one line per row."""
+    if fmt == 'csv':
+        writer = csv.writer(_LineBuffer())
+        yield writer.writerow(export.headers)
+        for row in export.rows():
+            yield writer.writerow(row)
+    elif fmt == 'ndjson':
+        headers = export.headers
+        encoder = DjangoJSONEncoder()
+        for row in export.rows():
+            yield encoder.encode(dict(zip(headers, row))) + '\n'
+    else:
+        raise ValueError(f'Unknown export format: {fmt}')
@@ -1,5 +1,22 @@
 from django import forms
-from .models import Nurse, NurseDocument, Shift, Booking
+from django.contrib.auth.forms import AuthenticationForm
+from django.utils import timezone
+from . import search, shift_calendar
+from .models import NHSTrust, Nurse, NurseDocument, Shift, Booking
+from .throttle import client_ip, is_locked
+
+class ThrottledAuthenticationForm(AuthenticationForm):
+    error_messages = {
+        **AuthenticationForm.error_messages,
+        'throttled': 'Too many failed sign-in attempts. Please try again later.',
+    }
+    throttled = False
+
+    def get_invalid_login_error(self):
+        if is_locked(self.cleaned_data.get('username'), client_ip(self.request)):
+            self.throttled = True
+            return forms.ValidationError(self.error_messages['throttled'], code='throttled')
+        return super().get_invalid_login_error()
 
 class NurseForm(forms.ModelForm):
     class Meta:
@@ -26,7 +43,99 @@ class ShiftForm(forms.ModelForm):
             'shift_time': forms.TimeInput(attrs={'type': 'time'}),
         }
 
+class ShiftImportRowForm(forms.ModelForm):
+    """
+    Field definitions for one row of a bulk rota import. ShiftForm leaves
+    duration and rate at the model default, so rotas may omit them too.
+    """
+    duration_hours = forms.DecimalField(max_digits=4, decimal_places=2, required=False)
+    rate_per_hour = forms.DecimalField(max_digits=6, decimal_places=2, required=False)
+
+    class Meta:
+        model = Shift
+        fields = [
+            'ward', 'specialty_required', 'po_number', 'shift_date', 'shift_time',
+            'duration_hours', 'rate_per_hour', 'notes',
+        ]
+
+class RotaImportForm(forms.Form):
+    FORMAT_CHOICES = [
+        ('', 'Detect from file name'),
+        ('csv', 'CSV'),
+        ('json', 'JSON / NDJSON'),
+    ]
+
+    file = forms.FileField()
+    format = forms.ChoiceField(choices=FORMAT_CHOICES, required=False)
+
+class ExportFilterForm(forms.Form):
+    format = forms.ChoiceField(choices=[('csv', 'CSV'), ('ndjson', 'NDJSON')], required=False)
+    date_from = forms.DateField(required=False)
+    date_to = forms.DateField(required=False)
+    trust = forms.IntegerField(required=False, min_value=1)
+    agency = forms.IntegerField(required=False, min_value=1)
+
+class ShiftCalendarForm(forms.Form):
+    start = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+    weeks = forms.IntegerField(required=False, min_value=1, max_value=shift_calendar.MAX_WEEKS)
+
+    def window(self):
+        return shift_calendar.window(self.cleaned_data['start'], self.cleaned_data['weeks'])
+
 class BookingForm(forms.ModelForm):
     class Meta:
         model = Booking
-        fields = ['nurse'] 
\ No newline at end of file
+        fields = ['nurse']
+
+    def __init__(self, *args, matches=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Ranked core.matching results; when given, only those nurses are offered.
+        self.matches = matches
+        if matches is not None:
+            self.fields['nurse'].choices = [('', '---------')] + [(m.nurse_id, str(m)) for m in matches]
+
+    def clean_nurse(self):
+        nurse = self.cleaned_data['nurse']
+        if self.matches is not None and nurse.pk not in {m.nurse_id for m in self.matches}:
+            raise forms.ValidationError(
+                'This nurse does not have the specialty, valid documents or free time this shift needs.'
+            )
+        return nurse
+
+class AvailableShiftFilterForm(forms.Form):
+    q = forms.CharField(required=False, label='Search')
+    specialty = forms.CharField(required=False)
+    trust = forms.ModelChoiceField(queryset=NHSTrust.objects.none(), required=False, empty_label='All trusts')
+    ward = forms.CharField(required=False)
+    date_from = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+    date_to = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+
+    def __init__(self, *args, trusts=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if trusts is not None:
+            self.fields['trust'].queryset = trusts
+
+    def clean(self):
+        cleaned_data = super().clean()
+        date_from = cleaned_data.get('date_from')
+        date_to = cleaned_data.get('date_to')
+        if date_from and date_to and date_to < date_from:
+            raise forms.ValidationError('The end date must not be before the start date.')
+        return cleaned_data
+
+    def filter_queryset(self, eligible):
+        """Narrow a queryset of AgencyShiftEligibility rows to the submitted filters."""
+        data = self.cleaned_data if self.is_bound and self.is_valid() else {}
+        # Past shifts can never be booked, so the window starts today by default.
+        eligible = eligible.filter(shift_date__gte=data.get('date_from') or timezone.now().date())
+        if data.get('date_to'):
+            eligible = eligible.filter(shift_date__lte=data['date_to'])
+        if data.get('trust'):
+            eligible = eligible.filter(trust=data['trust'])
+        if data.get('specialty'):
+            eligible = eligible.filter(shift__specialty_required__iexact=data['specialty'])
+        if data.get('ward'):
+            eligible = eligible.filter(shift__ward__iexact=data['ward'])
+        if data.get('q', '').strip():
+            eligible = eligible.filter(shift__in=search.matching(Shift, data['q']))
+        return eligible
@@ -0,0 +1,155 @@
+"""
+Versioned fragment caching for the shift and nurse tables.
+
+Shifts and nurses carry a ``cache_version`` that the signal handlers in
+``core.signals`` bump whenever anything shown in their table rows changes:
+the row itself, its booking, its hospital or trust, or the nurse's
+documents. A rendered row is cached under the object's id, version and
+creation time (ids can come round again after a database restore), so a
+cached row is never stale, only unused; nothing has to be deleted.
+
+A whole table is cached under a digest of every row's key plus whatever
+else the table shows (the viewer's role, the search query). Serving an
+unchanged table therefore costs one cache lookup. When a row has changed,
+the table misses and the other rows come from one ``get_many``; only the
+changed rows are rendered. Templates use the ``{% cachedtable %}`` and
+``{% cachedrow %}`` tags in ``core.templatetags.fragments``.
+
+Code that changes shifts or nurses with ``QuerySet.update()`` or
+``bulk_update()`` must bump their versions itself (``bump``).
+
+Hits and misses are counted per table in each process and added to shared
+counters in the cache every few seconds, for ``fragment_stats`` and the
+admin dashboard.
+"""
+import hashlib
+import threading
+import time
+from collections import Counter
+
+from django.core.cache import caches
+from django.db.models import F
+
+CACHE_ALIAS = 'fragments'
+FLUSH_SECONDS = 5
+STATS_KEY = 'fragment-stats'
+OUTCOMES = ('table_hits', 'table_misses', 'row_hits', 'row_misses')
+
+_counts = Counter()
+_lock = threading.Lock()
+_flushed_at = time.monotonic()
+
+
+def cache():
+    return caches[CACHE_ALIAS]
+
+
+def bump(queryset):
+    """Invalidate the cached rows of every object in ``queryset``."""
+    return queryset.update(cache_version=F('cache_version') + 1)
+
+
+def _digest(parts):
+    return hashlib.md5('\x1f'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+def version(obj):
+    return f'{obj.pk}.{obj.cache_version}.{obj.created_at.timestamp():.6f}'
+
+
+def row_key(name, obj, vary):
+    return f'fragment:{name}:row:{version(obj)}:{_digest(vary)}'
+
+
+def table_key(name, rows, vary):
+    return f'fragment:{name}:table:{_digest([*vary, *(version(obj) for obj in rows)])}'
+
+
+class Table:
+    """One render of a cached table: the row fragments found and those rendered."""
+
+    def __init__(self, name, rows, vary):
+        self.name = name
+        self.rows = rows
+        self.vary = vary
+        self.key = table_key(name, rows, vary)
+        self.found = {}
+        self.rendered = {}
+
+    def lookup(self):
+        """The cached table, or None after fetching the cached rows in one ``get_many``."""
+        html = cache().get(self.key)
+        if html is not None:
+            record(self.name, table_hits=1)
+            return html
+        self.found = cache().get_many([row_key(self.name, obj, self.vary) for obj in self.rows])
+        return None
+
+    def row(self, obj, render):
+        key = row_key(self.name, obj, self.vary)
+        html = self.found.get(key)
+        if html is None:
+            html = self.rendered[key] = render()
+        return html
+
+    def store(self, html):
+        cache().set_many({**self.rendered, self.key: html})
+        record(
+            self.name,
+            table_misses=1,
+            row_hits=len(self.rows) - len(self.rendered),
+            row_misses=len(self.rendered),
+        )
+
+
+def record(name, **counts):
+    global _flushed_at
+    with _lock:
+        for outcome, count in counts.items():
+            _counts[name, outcome] += count
+        due = time.monotonic() - _flushed_at >= FLUSH_SECONDS
+    if due:
+        flush_stats()
+
+
+def flush_stats():
+    """Add this process's counts to the shared counters."""
+    global _flushed_at
+    with _lock:
+        counts = dict(_counts)
+        _counts.clear()
+        _flushed_at = time.monotonic()
+    if not counts:
+        return
+    names = cache().get(STATS_KEY, set())
+    if not names.issuperset(name for name, _ in counts):
+        cache().set(STATS_KEY, names | {name for name, _ in counts}, None)
+    for (name, outcome), count in counts.items():
+        key = f'{STATS_KEY}:{name}:{outcome}'
+        try:
+            cache().incr(key, count)
+        except ValueError:
+            cache().set(key, count, None)
+
+
+def stats():
+    """{table name: {outcome: count}} across every process, in name order."""
+    flush_stats()
+    names = sorted(cache().get(STATS_KEY, set()))
+    values = cache().get_many([f'{STATS_KEY}:{name}:{outcome}' for name in names for outcome in OUTCOMES])
+    report = {}
+    for name in names:
+        counts = {outcome: values.get(f'{STATS_KEY}:{name}:{outcome}', 0) for outcome in OUTCOMES}
+        tables = counts['table_hits'] + counts['table_misses']
+        rows = counts['row_hits'] + counts['row_misses']
+        counts['table_hit_rate'] = counts['table_hits'] / tables if tables else None
+        counts['row_hit_rate'] = counts['row_hits'] / rows if rows else None
+        report[name] = counts
+    return report
+
+
+def reset_stats():
+    with _lock:
+        _counts.clear()
+    names = cache().get(STATS_KEY, set())
+    cache().delete_many([STATS_KEY, *(f'{STATS_KEY}:{name}:{outcome}' for name in names for outcome in OUTCOMES)])
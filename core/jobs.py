@@ -0,0 +1,211 @@
+"""
+A background job queue kept in the application database.
+
+Work that does not need to finish before a response is sent, such as
+document previews and expiry emails, is queued with ``enqueue`` and run by
+``run_worker``. There is no broker to operate: a job is a ``Job`` row,
+written in the same transaction as the change that called for it, so a job
+is never queued for a change that rolled back and never lost for one that
+committed.
+
+Workers claim jobs with a conditional ``UPDATE ... WHERE status = 'queued'``
+stamped with a token of their own, and then read back the rows carrying
+that token; two workers racing for a job cannot both win it. A job that
+raises is retried with exponential backoff until it has used its
+``max_attempts``, then left ``dead`` for someone to look at in the admin.
+A worker that dies mid-job leaves it ``running``; once its lease has
+expired another worker puts it back in the queue, which uses up one of its
+attempts, so a job that keeps killing its worker still ends up ``dead``.
+Tasks must therefore finish within ``LEASE`` or be safe to run twice: a job
+still running when its lease expires is started again alongside it.
+
+Only functions registered with ``@task`` can be run, and their arguments
+must be JSON-serialisable.
+"""
+import importlib
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta
+
+from django.db import close_old_connections
+from django.db.models import Count, F, Min
+from django.utils import timezone
+
+from .models import Job
+
+DEFAULT_MAX_ATTEMPTS = 5
+BACKOFF_SECONDS = 30
+MAX_BACKOFF_SECONDS = 3600
+# A running job whose worker has not finished it in this long is requeued.
+LEASE = timedelta(minutes=15)
+RETENTION = timedelta(days=7)
+
+_tasks = {}
+
+
+def task(func=None, *, max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """Register ``func`` to be run by the worker; it can still be called directly."""
+    def register(func):
+        name = f'{func.__module__}.{func.__name__}'
+        _tasks[name] = (func, max_attempts)
+        func.task_name = name
+        return func
+    return register(func) if func is not None else register
+
+
+def _resolve(name):
+    if name not in _tasks:
+        # Importing the module registers its tasks.
+        importlib.import_module(name.rpartition('.')[0])
+    return _tasks[name]
+
+
+def enqueue(func, *args, delay=None):
+    """Queue a call of the registered task ``func``; it runs after the current transaction commits."""
+    name = func.task_name
+    return Job.objects.create(
+        task=name,
+        args=list(args),
+        max_attempts=_tasks[name][1],
+        run_at=timezone.now() + (delay or timedelta()),
+    )
+
+
+def backoff(attempts):
+    return timedelta(seconds=min(BACKOFF_SECONDS * 2 ** (attempts - 1), MAX_BACKOFF_SECONDS))
+
+
+def claim(limit):
+    """Claim up to ``limit`` due jobs for this worker, oldest first."""
+    now = timezone.now()
+    candidates = list(
+        Job.objects.filter(status=Job.Status.QUEUED, run_at__lte=now).order_by('run_at', 'id').values_list(
+            'id', flat=True
+        )[:limit]
+    )
+    if not candidates:
+        return []
+    token = uuid.uuid4().hex
+    Job.objects.filter(pk__in=candidates, status=Job.Status.QUEUED).update(
+        status=Job.Status.RUNNING, claim=token, claimed_at=now
+    )
+    return list(Job.objects.filter(pk__in=candidates, claim=token).order_by('run_at', 'id'))
+
+
+def execute(job):
+    """Run a claimed job and record how it went; returns its new status."""
+    attempts = job.attempts + 1
+    try:
+        func, _ = _resolve(job.task)
+        func(*job.args)
+    except Exception:
+        error = traceback.format_exc()
+        if attempts >= job.max_attempts:
+            changes = {'status': Job.Status.DEAD, 'finished_at': timezone.now()}
+        else:
+            changes = {'status': Job.Status.QUEUED, 'run_at': timezone.now() + backoff(attempts)}
+        changes['last_error'] = error
+    else:
+        changes = {'status': Job.Status.DONE, 'finished_at': timezone.now()}
+    # Only while the claim is still ours: an expired lease may have passed it on.
+    Job.objects.filter(pk=job.pk, claim=job.claim).update(attempts=attempts, claim='', **changes)
+    return changes['status']
+
+
+def requeue_expired():
+    """Put back the jobs of workers that stopped without finishing them, counting it as an attempt."""
+    now = timezone.now()
+    expired = Job.objects.filter(status=Job.Status.RUNNING, claimed_at__lt=now - LEASE)
+    changes = {'attempts': F('attempts') + 1, 'claim': '', 'last_error': 'Lease expired before the job finished.'}
+    dead = expired.filter(attempts__gte=F('max_attempts') - 1).update(
+        status=Job.Status.DEAD, finished_at=now, **changes
+    )
+    return dead + expired.update(status=Job.Status.QUEUED, **changes)
+
+
+def prune():
+    return Job.objects.filter(status=Job.Status.DONE, finished_at__lt=timezone.now() - RETENTION).delete()[0]
+
+
+def queue_stats():
+    """Jobs per status, and how long the oldest due job has been waiting."""
+    counts = dict(Job.objects.values_list('status').annotate(count=Count('id')).order_by())
+    oldest = Job.objects.filter(status=Job.Status.QUEUED, run_at__lte=timezone.now()).aggregate(
+        oldest=Min('run_at')
+    )['oldest']
+    return {
+        **{status: counts.get(status, 0) for status in Job.Status.values},
+        'oldest_wait': (timezone.now() - oldest).total_seconds() if oldest else 0.0,
+    }
+
+
+class Worker:
+    """
+    Claims and runs jobs. With ``concurrency`` above one, jobs run on a pool
+    of that many threads while this one keeps claiming; with one they run
+    inline.
+    """
+
+    def __init__(self, concurrency=1, poll=1.0):
+        self.concurrency = concurrency
+        self.poll = poll
+        self.counts = {status: 0 for status in (Job.Status.DONE, Job.Status.QUEUED, Job.Status.DEAD)}
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+
+    def stop(self):
+        self._stopping.set()
+
+    def _execute(self, job):
+        status = execute(job)
+        with self._lock:
+            self.counts[status] += 1
+
+    def _execute_in_thread(self, job):
+        close_old_connections()
+        try:
+            self._execute(job)
+        finally:
+            close_old_connections()
+
+    def run(self, burst=False, on_tick=None, tick=60):
+        """
+        Run jobs until stopped or, with ``burst``, until none are due.
+        ``on_tick`` is called every ``tick`` seconds, for reporting.
+        """
+        requeue_expired()
+        next_tick = time.monotonic() + tick
+        if self.concurrency == 1:
+            pool, running = None, set()
+        else:
+            pool, running = ThreadPoolExecutor(self.concurrency, thread_name_prefix='job'), set()
+        try:
+            while not self._stopping.is_set():
+                free = self.concurrency - len(running)
+                jobs = claim(free) if free else []
+                for job in jobs:
+                    if pool is None:
+                        self._execute(job)
+                    else:
+                        running.add(pool.submit(self._execute_in_thread, job))
+                if not jobs and not running:
+                    if burst:
+                        break
+                    self._stopping.wait(self.poll)
+                elif running:
+                    timeout = 0 if jobs else self.poll
+                    done, running = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        future.result()
+                if time.monotonic() >= next_tick:
+                    next_tick = time.monotonic() + tick
+                    requeue_expired()
+                    prune()
+                    if on_tick:
+                        on_tick(self)
+        finally:
+            if pool is not None:
+                pool.shutdown(wait=True)
@@ -0,0 +1,155 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import time as dtime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient, Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core import eligibility
+from core.benchmarks import benchmark_database, format_latency, percentile, read_views
+from core.models import User, NHSTrust, Hospital, Agency, TrustAgencyAccess, Nurse, NurseDocument, Shift
+
+
+class Command(BaseCommand):
+    help = ('Polls the agency pages on a throwaway database, first through the WSGI handler with the sync views, '
+            'then through the ASGI handler with the async views, and reports throughput')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=100, help='Requests in flight at once')
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per run')
+        parser.add_argument('--threads', type=int, default=8, help='Threads in the WSGI worker')
+        parser.add_argument('--nurses', type=int, default=200, help='Nurses in the polling agency')
+        parser.add_argument('--shifts', type=int, default=500, help='Open shifts the agency can see')
+
+    def handle(self, *args, **options):
+        concurrency, total = options['concurrency'], options['requests']
+        if min(concurrency, total, options['threads'], options['nurses'], options['shifts']) < 1:
+            raise CommandError('All options must be positive')
+
+        # The in-process clients send Host: testserver.
+        with benchmark_database(), override_settings(ALLOWED_HOSTS=['testserver']):
+            user, nurse = self.setup(options['nurses'], options['shifts'])
+            client = Client()
+            client.force_login(user)
+            cookies = client.cookies
+            urls = [
+                reverse('dashboard'),
+                reverse('available_shifts'),
+                reverse('nurse_list'),
+                reverse('nurse_documents', args=[nurse.id]),
+            ]
+            with read_views(async_views=False):
+                wsgi = self.run_wsgi(cookies, urls, total, concurrency, options['threads'])
+            with read_views(async_views=True):
+                asgi = asyncio.run(self.run_asgi(cookies, urls, total, concurrency))
+
+        self.stdout.write(f'{total} requests over {len(urls)} agency pages, {concurrency} in flight')
+        self.report(f'WSGI, sync views, {options["threads"]} threads', wsgi)
+        self.report('ASGI, async views, one event loop', asgi)
+
+    def setup(self, nurse_count, shift_count):
+        today = timezone.now().date()
+        trust = NHSTrust.objects.create(name='Benchmark Trust')
+        hospital = Hospital.objects.create(
+            trust=trust,
+            user=User.objects.create(username='bench_hospital', role=User.Role.HOSPITAL),
+            name='Benchmark Hospital',
+        )
+        user = User.objects.create(username='bench_agency', role=User.Role.AGENCY)
+        agency = Agency.objects.create(user=user, name='Benchmark Agency')
+        TrustAgencyAccess.objects.create(trust=trust, agency=agency, approved=True)
+        nurses = Nurse.objects.bulk_create([
+            Nurse(
+                agency=agency,
+                full_name=f'Benchmark Nurse {i}',
+                registration_number=f'BENCH{i:06d}',
+                dob=today - timedelta(days=365 * 30),
+                specialty='General Nursing',
+                is_approved=i % 4 != 0,
+            )
+            for i in range(nurse_count)
+        ], batch_size=1000)
+        NurseDocument.objects.bulk_create([
+            NurseDocument(
+                nurse=nurse,
+                document_type=document_type,
+                file_url=f'nurse_documents/{document_type}.pdf',
+                expiry_date=today + timedelta(days=365),
+            )
+            for nurse in nurses[::2]
+            for document_type in NurseDocument.REQUIRED_TYPES
+        ], batch_size=1000)
+        shifts = []
+        for i in range(shift_count):
+            shift = Shift(
+                hospital=hospital,
+                ward=f'Ward {i % 10}',
+                shift_date=today + timedelta(days=1 + i % 28),
+                shift_time=dtime(8, 0),
+            )
+            shift.set_window()
+            shifts.append(shift)
+        # bulk_create skips the signal that keeps the agency shift feed current.
+        Shift.objects.bulk_create(shifts, batch_size=1000)
+        eligibility.sync_shifts(Shift.objects.filter(hospital=hospital))
+        return user, nurses[1]
+
+    def run_wsgi(self, cookies, urls, total, concurrency, threads):
+        # Clients keep `concurrency` requests queued on a pool of `threads`, as
+        # a threaded WSGI worker's listen backlog would; latency includes the wait.
+        local = threading.local()
+
+        def get(url, queued):
+            if not hasattr(local, 'client'):
+                local.client = Client()
+                local.client.cookies = cookies
+            response = local.client.get(url)
+            return response.status_code, time.perf_counter() - queued
+
+        latencies, errors = [], []
+
+        def collect(done):
+            for future in done:
+                status, latency = future.result()
+                (latencies if status == 200 else errors).append(latency)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            pending = set()
+            for i in range(total):
+                if len(pending) >= concurrency:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(done)
+                pending.add(pool.submit(get, urls[i % len(urls)], time.perf_counter()))
+            collect(wait(pending)[0])
+        return latencies, errors, time.perf_counter() - started
+
+    async def run_asgi(self, cookies, urls, total, concurrency):
+        latencies, errors = [], []
+        remaining = iter(range(total))
+
+        async def worker():
+            client = AsyncClient()
+            client.cookies = cookies
+            for i in remaining:
+                started = time.perf_counter()
+                response = await client.get(urls[i % len(urls)])
+                latency = time.perf_counter() - started
+                (latencies if response.status_code == 200 else errors).append(latency)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return latencies, errors, time.perf_counter() - started
+
+    def report(self, label, result):
+        latencies, errors, elapsed = result
+        self.stdout.write(f'  {label}: {len(latencies) / elapsed:.1f} requests/s, {len(errors)} errors')
+        self.stdout.write(
+            f'    latency p50={format_latency(percentile(latencies, 50))} '
+            f'p95={format_latency(percentile(latencies, 95))} '
+            f'p99={format_latency(percentile(latencies, 99))}'
+        )
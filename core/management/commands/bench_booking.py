@@ -0,0 +1,124 @@
+import threading
+import time
+from datetime import time as dtime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+from django.utils import timezone
+
+from core import bookings
+from core.benchmarks import benchmark_database, format_latency, percentile
+from core.models import (
+    User, NHSTrust, Hospital, Agency, TrustAgencyAccess, Nurse, Shift, Booking
+)
+
+
+class Command(BaseCommand):
+    help = 'Races agencies for the same shifts on a throwaway database and reports booking throughput'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8, help='Agencies racing for each shift')
+        parser.add_argument('--shifts', type=int, default=200, help='Number of shifts to race for')
+
+    def handle(self, *args, **options):
+        threads, shift_count = options['threads'], options['shifts']
+        if threads < 1 or shift_count < 1:
+            raise CommandError('--threads and --shifts must be positive')
+
+        with benchmark_database():
+            agencies, nurse_ids, shift_ids = self.setup(threads, shift_count)
+            results = self.race(agencies, nurse_ids, shift_ids)
+            self.check_invariants(shift_ids)
+        self.report(results, threads, shift_count)
+
+    def setup(self, threads, shift_count):
+        trust = NHSTrust.objects.create(name='Benchmark Trust')
+        hospital = Hospital.objects.create(
+            trust=trust,
+            user=User.objects.create(username='bench_hospital', role=User.Role.HOSPITAL),
+            name='Benchmark Hospital',
+        )
+        agencies, nurse_ids = [], []
+        for i in range(threads):
+            agency = Agency.objects.create(
+                user=User.objects.create(username=f'bench_agency{i}', role=User.Role.AGENCY),
+                name=f'Benchmark Agency {i}',
+            )
+            TrustAgencyAccess.objects.create(trust=trust, agency=agency, approved=True)
+            nurse = Nurse.objects.create(
+                agency=agency,
+                full_name=f'Benchmark Nurse {i}',
+                registration_number=f'BENCH{i:04d}',
+                dob=timezone.now().date() - timedelta(days=365 * 30),
+                specialty='General Nursing',
+                is_approved=True,
+            )
+            agencies.append(agency)
+            nurse_ids.append(nurse.id)
+        shift_ids = [
+            Shift.objects.create(
+                hospital=hospital,
+                ward='Ward 1',
+                shift_date=timezone.now().date() + timedelta(days=1 + i % 28),
+                shift_time=dtime(8, 0),
+            ).id
+            for i in range(shift_count)
+        ]
+        return agencies, nurse_ids, shift_ids
+
+    def race(self, agencies, nurse_ids, shift_ids):
+        barrier = threading.Barrier(len(agencies))
+        lock = threading.Lock()
+        results = {'booked': [], 'conflict': [], 'error': 0, 'elapsed': 0.0}
+
+        def worker(agency, nurse_id):
+            try:
+                for shift_id in shift_ids:
+                    barrier.wait()
+                    started = time.perf_counter()
+                    try:
+                        result = bookings.book_shift(shift_id, nurse_id, agency)
+                    except OperationalError:
+                        with lock:
+                            results['error'] += 1
+                        continue
+                    latency = time.perf_counter() - started
+                    with lock:
+                        results['booked' if result else 'conflict'].append(latency)
+            finally:
+                connection.close()
+
+        workers = [
+            threading.Thread(target=worker, args=(agency, nurse_id))
+            for agency, nurse_id in zip(agencies, nurse_ids)
+        ]
+        started = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        results['elapsed'] = time.perf_counter() - started
+        return results
+
+    def check_invariants(self, shift_ids):
+        booked = Shift.objects.filter(id__in=shift_ids, status=Shift.Status.BOOKED).count()
+        rows = Booking.objects.filter(shift_id__in=shift_ids).count()
+        if booked != rows:
+            raise CommandError(f'{booked} shifts marked booked but {rows} booking rows exist')
+
+    def report(self, results, threads, shift_count):
+        booked, conflicts = results['booked'], results['conflict']
+        elapsed = results['elapsed']
+        self.stdout.write(f'{threads} agencies racing for {shift_count} shifts in {elapsed:.2f}s')
+        self.stdout.write(f'  bookings:  {len(booked)} ({len(booked) / elapsed:.1f}/s)')
+        self.stdout.write(f'  conflicts: {len(conflicts)}, errors: {results["error"]}')
+        for label, latencies in (('booking', booked), ('conflict', conflicts)):
+            self.stdout.write(
+                f'  {label} latency p50={format_latency(percentile(latencies, 50))} '
+                f'p95={format_latency(percentile(latencies, 95))} '
+                f'p99={format_latency(percentile(latencies, 99))}'
+            )
+        if len(booked) == shift_count and not results['error']:
+            self.stdout.write(self.style.SUCCESS('Every shift was booked exactly once'))
+        else:
+            self.stdout.write(self.style.WARNING('Some shifts were not booked'))
@@ -0,0 +1,119 @@
+import threading
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from core.benchmarks import benchmark_database, format_latency, percentile
+from core.models import User
+
+PASSWORD = 'bench-password'
+THROTTLED = b'Too many failed sign-in attempts'
+
+
+class Command(BaseCommand):
+    help = ('Sends a credential-stuffing burst at the login page while other users sign in, '
+            'on a throwaway database, and reports throughput and writes to the users table')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--attackers', type=int, default=8, help='Threads guessing passwords')
+        parser.add_argument('--attempts', type=int, default=50, help='Guesses per attacker')
+        parser.add_argument('--targets', type=int, default=10, help='Accounts under attack')
+        parser.add_argument('--logins', type=int, default=20, help='Genuine sign-ins made during the attack')
+        parser.add_argument('--no-throttle', action='store_true', help='Count failures but never lock anyone out')
+
+    def handle(self, *args, **options):
+        if min(options['attackers'], options['attempts'], options['targets'], options['logins']) < 1:
+            raise CommandError('All options must be positive')
+        limits = {}
+        if options['no_throttle']:
+            limits = {'LOGIN_FAILURE_LIMIT': float('inf'), 'LOGIN_IP_FAILURE_LIMIT': float('inf')}
+
+        cache.clear()
+        # The in-process client sends Host: testserver.
+        with benchmark_database(), override_settings(ALLOWED_HOSTS=['testserver'], **limits):
+            password = make_password(PASSWORD)
+            User.objects.bulk_create(
+                [User(username=f'target{i}', password=password) for i in range(options['targets'])]
+                + [User(username=f'staff{i}', password=password) for i in range(options['logins'])]
+            )
+            results = self.attack(options)
+        cache.clear()
+        self.report(results, options)
+
+    def attack(self, options):
+        lock = threading.Lock()
+        results = {'throttled': [], 'rejected': [], 'logins': [], 'failed_logins': 0, 'writes': 0, 'elapsed': 0.0}
+        url = reverse('login')
+
+        def count_writes(execute, sql, params, many, context):
+            if sql.startswith('UPDATE "core_user"'):
+                with lock:
+                    results['writes'] += 1
+            return execute(sql, params, many, context)
+
+        def attacker(n):
+            client = Client()
+            with connection.execute_wrapper(count_writes):
+                for i in range(options['attempts']):
+                    # A botnet: every guess comes from a different address.
+                    ip = f'10.{n}.{i // 256}.{i % 256}'
+                    started = time.perf_counter()
+                    response = client.post(url, {
+                        'username': f'target{i % options["targets"]}',
+                        'password': f'guess{i}',
+                    }, REMOTE_ADDR=ip)
+                    latency = time.perf_counter() - started
+                    throttled = THROTTLED in response.content
+                    with lock:
+                        results['throttled' if throttled else 'rejected'].append(latency)
+            connection.close()
+
+        def staff():
+            with connection.execute_wrapper(count_writes):
+                for i in range(options['logins']):
+                    client = Client()
+                    started = time.perf_counter()
+                    response = client.post(url, {'username': f'staff{i}', 'password': PASSWORD},
+                                           REMOTE_ADDR=f'192.0.2.{i % 256}')
+                    latency = time.perf_counter() - started
+                    with lock:
+                        if response.status_code == 302:
+                            results['logins'].append(latency)
+                        else:
+                            results['failed_logins'] += 1
+            connection.close()
+
+        threads = [threading.Thread(target=attacker, args=(n,)) for n in range(options['attackers'])]
+        threads.append(threading.Thread(target=staff))
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        results['elapsed'] = time.perf_counter() - started
+        return results
+
+    def report(self, results, options):
+        elapsed = results['elapsed']
+        guesses = len(results['throttled']) + len(results['rejected'])
+        mode = 'without lockouts' if options['no_throttle'] else 'with throttling'
+        self.stdout.write(
+            f'{options["attackers"]} attackers, {guesses} guesses at {options["targets"]} accounts '
+            f'in {elapsed:.2f}s {mode} ({guesses / elapsed:.1f} guesses/s)'
+        )
+        self.stdout.write(f'  throttled: {len(results["throttled"])}, '
+                          f'password checked and rejected: {len(results["rejected"])}')
+        self.stdout.write(f'  UPDATEs on core_user: {results["writes"]}')
+        for label, latencies in (('throttled', results['throttled']), ('rejected', results['rejected']),
+                                 ('genuine login', results['logins'])):
+            self.stdout.write(
+                f'  {label} latency p50={format_latency(percentile(latencies, 50))} '
+                f'p95={format_latency(percentile(latencies, 95))} '
+                f'p99={format_latency(percentile(latencies, 99))}'
+            )
+        self.stdout.write(f'  genuine logins: {len(results["logins"])} succeeded, {results["failed_logins"]} failed')
@@ -0,0 +1,111 @@
+import random
+import time
+from datetime import time as dtime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core import compliance
+from core.benchmarks import benchmark_database, format_latency, percentile
+from core.matching import NursePool
+from core.models import (
+    User, NHSTrust, Hospital, Agency, Nurse, NurseDocument, Shift, Booking
+)
+
+SPECIALTIES = ['General Nursing', 'ICU', 'A&E', 'Paediatrics', 'Theatre', 'Mental Health']
+
+
+class Command(BaseCommand):
+    help = 'Ranks one agency\'s nurses against many shifts on a throwaway database and reports latency'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--nurses', type=int, default=10000, help='Nurses in the agency')
+        parser.add_argument('--shifts', type=int, default=200, help='Shifts to rank the nurses for')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        nurse_count, shift_count = options['nurses'], options['shifts']
+        if nurse_count < 1 or shift_count < 1:
+            raise CommandError('--nurses and --shifts must be positive')
+
+        with benchmark_database():
+            agency, shifts = self.setup(nurse_count, shift_count, random.Random(options['seed']))
+            started = time.perf_counter()
+            pool = NursePool.for_agency(agency.id)
+            load = time.perf_counter() - started
+
+            latencies, matched = [], 0
+            for shift in shifts:
+                started = time.perf_counter()
+                matched += len(pool.match(shift))
+                latencies.append(time.perf_counter() - started)
+
+        self.stdout.write(f'{len(pool)} nurses loaded in {format_latency(load)}')
+        self.stdout.write(f'  {shift_count} shifts ranked, {matched / shift_count:.0f} eligible nurses each on average')
+        self.stdout.write(
+            f'  match latency p50={format_latency(percentile(latencies, 50))} '
+            f'p95={format_latency(percentile(latencies, 95))} '
+            f'p99={format_latency(percentile(latencies, 99))}'
+        )
+
+    def setup(self, nurse_count, shift_count, rng):
+        today = timezone.now().date()
+        trust = NHSTrust.objects.create(name='Benchmark Trust')
+        hospital = Hospital.objects.create(
+            trust=trust,
+            user=User.objects.create(username='bench_hospital', role=User.Role.HOSPITAL),
+            name='Benchmark Hospital',
+        )
+        agency = Agency.objects.create(
+            user=User.objects.create(username='bench_agency', role=User.Role.AGENCY),
+            name='Benchmark Agency',
+        )
+        nurses = Nurse.objects.bulk_create([
+            Nurse(
+                agency=agency,
+                full_name=f'Benchmark Nurse {i}',
+                registration_number=f'BENCH{i:06d}',
+                dob=today - timedelta(days=365 * 30),
+                specialty=rng.choice(SPECIALTIES),
+                is_approved=True,
+            )
+            for i in range(nurse_count)
+        ], batch_size=1000)
+        NurseDocument.objects.bulk_create([
+            NurseDocument(
+                nurse=nurse,
+                document_type=document_type,
+                file_url=f'nurse_documents/{document_type}.pdf',
+                expiry_date=today + timedelta(days=rng.randint(1, 400)),
+                verified=rng.random() < 0.9,
+            )
+            for nurse in nurses
+            for document_type in NurseDocument.REQUIRED_TYPES
+        ], batch_size=1000)
+        # bulk_create skips the document signals that keep compliance current.
+        compliance.refresh(Nurse.objects.filter(agency=agency))
+
+        # A quarter of the nurses already work a shift somewhere in the next month.
+        booked = Shift.objects.bulk_create([
+            self.shift(hospital, rng, status=Shift.Status.BOOKED) for _ in range(nurse_count // 4)
+        ], batch_size=1000)
+        Booking.objects.bulk_create([
+            Booking(shift=shift, nurse=nurse, agency=agency, starts_at=shift.starts_at, ends_at=shift.ends_at)
+            for shift, nurse in zip(booked, rng.sample(nurses, len(booked)))
+        ], batch_size=1000)
+
+        shifts = [
+            self.shift(hospital, rng, specialty_required=rng.choice(SPECIALTIES)) for _ in range(shift_count)
+        ]
+        return agency, Shift.objects.bulk_create(shifts)
+
+    def shift(self, hospital, rng, **kwargs):
+        shift = Shift(
+            hospital=hospital,
+            shift_date=timezone.now().date() + timedelta(days=rng.randint(1, 28)),
+            shift_time=dtime(rng.choice([7, 8, 19, 20]), 0),
+            duration_hours=12,
+            **kwargs
+        )
+        shift.set_window()
+        return shift
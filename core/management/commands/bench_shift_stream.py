@@ -0,0 +1,134 @@
+import asyncio
+import json
+import threading
+import time
+import tracemalloc
+from datetime import time as dtime, timedelta
+
+from asgiref.sync import sync_to_async
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient, Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core import shift_events
+from core.benchmarks import benchmark_database, format_latency, percentile
+from core.models import User, NHSTrust, Hospital, Agency, TrustAgencyAccess, Shift
+
+
+class Command(BaseCommand):
+    help = ('Holds many agency shift streams open in one process on a throwaway database, opens shifts, '
+            'and reports the memory per idle connection and how long events take to reach every stream')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', type=int, default=2000, help='Streams held open at once')
+        parser.add_argument('--agencies', type=int, default=50, help='Agencies the streams are spread over')
+        parser.add_argument('--trusts', type=int, default=10, help='Trusts; each agency is approved for two')
+        parser.add_argument('--events', type=int, default=20, help='Shifts opened while the streams are held')
+        parser.add_argument('--broker', choices=sorted(shift_events.BROKERS), default='database')
+
+    def handle(self, *args, **options):
+        if min(options['connections'], options['agencies'], options['trusts'], options['events']) < 1:
+            raise CommandError('All counts must be positive')
+
+        # The in-process clients send Host: testserver.
+        with benchmark_database(), override_settings(
+            ALLOWED_HOSTS=['testserver'], SHIFT_EVENTS_BROKER=options['broker']
+        ):
+            agencies, hospitals = self.setup(options['agencies'], options['trusts'])
+            sessions = []
+            for user, trusts in agencies:
+                client = Client()
+                client.force_login(user)
+                sessions.append((client.cookies, trusts))
+            result = asyncio.run(self.run(sessions, hospitals, options['connections'], options['events']))
+
+        opened, memory, threads, latencies, expected = result
+        self.stdout.write(
+            f'{options["connections"]} streams over {options["agencies"]} agencies, {options["broker"]} broker'
+        )
+        self.stdout.write(
+            f'  opened in {opened:.2f}s under tracemalloc, {memory / options["connections"] / 1024:.1f}KB each, '
+            f'{threads} threads in the process'
+        )
+        self.stdout.write(f'  {options["events"]} shifts opened: {len(latencies)}/{expected} events delivered')
+        self.stdout.write(
+            f'    latency p50={format_latency(percentile(latencies, 50))} '
+            f'p95={format_latency(percentile(latencies, 95))} '
+            f'p99={format_latency(percentile(latencies, 99))}'
+        )
+
+    def setup(self, agency_count, trust_count):
+        trusts = [NHSTrust.objects.create(name=f'Benchmark Trust {i}') for i in range(trust_count)]
+        hospitals = [
+            Hospital.objects.create(
+                trust=trust,
+                user=User.objects.create(username=f'bench_hospital{i}', role=User.Role.HOSPITAL),
+                name=f'Benchmark Hospital {i}',
+            )
+            for i, trust in enumerate(trusts)
+        ]
+        agencies = []
+        for i in range(agency_count):
+            user = User.objects.create(username=f'bench_agency{i}', role=User.Role.AGENCY)
+            agency = Agency.objects.create(user=user, name=f'Benchmark Agency {i}')
+            approved = {trusts[i % trust_count].id, trusts[(i + 1) % trust_count].id}
+            for trust_id in approved:
+                TrustAgencyAccess.objects.create(trust_id=trust_id, agency=agency, approved=True)
+            agencies.append((user, approved))
+        return agencies, hospitals
+
+    async def run(self, sessions, hospitals, connections, events):
+        url = reverse('shift_stream')
+        received = []
+
+        async def connect(cookies):
+            client = AsyncClient()
+            client.cookies = cookies
+            response = await client.get(url)
+            messages = aiter(response.streaming_content)
+            await anext(messages)
+            return messages
+
+        async def listen(messages):
+            async for message in messages:
+                if message.startswith(b'id:'):
+                    data = json.loads(message.decode().split('data: ', 1)[1])
+                    received.append((data['shift'], time.perf_counter()))
+
+        tracemalloc.start()
+        try:
+            started = time.perf_counter()
+            streams = await asyncio.gather(*(
+                connect(sessions[i % len(sessions)][0]) for i in range(connections)
+            ))
+            opened = time.perf_counter() - started
+            memory = tracemalloc.get_traced_memory()[0]
+        finally:
+            tracemalloc.stop()
+        threads = threading.active_count()
+        listeners = [asyncio.create_task(listen(messages)) for messages in streams]
+
+        today = timezone.now().date()
+        published, expected = {}, 0
+        for i in range(events):
+            hospital = hospitals[i % len(hospitals)]
+            expected += sum(
+                1 for n in range(connections) if hospital.trust_id in sessions[n % len(sessions)][1]
+            )
+            shift = await sync_to_async(Shift.objects.create)(
+                hospital=hospital, ward='Ward 1', shift_date=today + timedelta(days=1), shift_time=dtime(8, 0)
+            )
+            published[shift.id] = time.perf_counter()
+            await asyncio.sleep(0.05)
+        # Give the last events time to arrive (the database broker polls once a second).
+        deadline = time.perf_counter() + shift_events.POLL_SECONDS * 5
+        while len(received) < expected and time.perf_counter() < deadline:
+            await asyncio.sleep(0.05)
+
+        for task in listeners:
+            task.cancel()
+        await asyncio.gather(*listeners, return_exceptions=True)
+        await asyncio.gather(*(messages.aclose() for messages in streams), return_exceptions=True)
+        latencies = [at - published[shift_id] for shift_id, at in received if shift_id in published]
+        return opened, memory, threads, latencies, expected
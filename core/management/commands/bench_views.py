@@ -0,0 +1,83 @@
+import math
+import shutil
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+
+from core import viewbench
+from core.benchmarks import benchmark_database
+from core.datagen import DataGenerator
+
+
+class Command(BaseCommand):
+    help = ('Requests every page as the role that uses it on a generated throwaway database, reports '
+            'p50/p95/p99 latency, warm and cold-cache queries and peak memory per view, and fails if any '
+            'is over its budget')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=20, help='Timed requests per view')
+        parser.add_argument('--trusts', type=int, default=10)
+        parser.add_argument('--hospitals', type=int, default=30)
+        parser.add_argument('--agencies', type=int, default=20)
+        parser.add_argument('--nurses', type=int, default=4000)
+        parser.add_argument('--shifts', type=int, default=50000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--view', action='append', default=[], help='Only benchmark this budget name (repeatable)')
+        parser.add_argument('--update-budgets', action='store_true',
+                            help='Write the measurements, plus --headroom, to the budget file instead of checking')
+        parser.add_argument('--headroom', type=float, default=1.5,
+                            help='Multiplier applied to latency and memory when updating budgets')
+
+    def handle(self, *args, **options):
+        if min(options['runs'], options['trusts'], options['hospitals'], options['agencies'],
+               options['nurses'], options['shifts']) < 1:
+            raise CommandError('--runs and the dataset sizes must be positive')
+        cases = [case for case in viewbench.CASES if not options['view'] or case[0] in options['view']]
+        if not cases:
+            raise CommandError(f'No views match {", ".join(options["view"])}')
+        budgets = {} if options['update_budgets'] and not viewbench.BUDGETS_PATH.exists() else viewbench.load_budgets()
+
+        media_root = tempfile.mkdtemp(prefix='medicare-bench-media-')
+        try:
+            # The in-process client sends Host: testserver.
+            with benchmark_database(), override_settings(MEDIA_ROOT=media_root, ALLOWED_HOSTS=['testserver']):
+                self.stdout.write('Generating data...')
+                DataGenerator(seed=options['seed']).run(
+                    trusts=options['trusts'], hospitals=options['hospitals'], agencies=options['agencies'],
+                    nurses=options['nurses'], shifts=options['shifts'],
+                )
+                results = list(viewbench.measure(cases, viewbench.fixtures(), runs=options['runs']))
+        finally:
+            shutil.rmtree(media_root, ignore_errors=True)
+
+        failures = []
+        self.stdout.write(
+            f'{"view":<24} {"status":>6} {"p50":>9} {"p95":>9} {"p99":>9} {"queries":>7} {"cold":>5} {"peak":>9}'
+        )
+        for name, path, result in results:
+            measured = viewbench.summary(result)
+            self.stdout.write(
+                f'{name:<24} {result["status"]:>6} {measured["p50_ms"]:>7.2f}ms {measured["p95_ms"]:>7.2f}ms '
+                f'{measured["p99_ms"]:>7.2f}ms {measured["queries"]:>7} {measured["cold_queries"]:>5} '
+                f'{measured["peak_kb"]:>7}KB'
+            )
+            if result['status'] >= 400:
+                failures.append(f'{name}: {path} returned {result["status"]}')
+            if options['update_budgets']:
+                budgets[name] = {
+                    'queries': measured['queries'],
+                    'cold_queries': measured['cold_queries'],
+                    'p95_ms': math.ceil(measured['p95_ms'] * options['headroom']),
+                    'peak_kb': math.ceil(measured['peak_kb'] * options['headroom']),
+                }
+            else:
+                failures.extend(viewbench.over_budget(name, result, budgets.get(name)))
+
+        if failures:
+            raise CommandError('\n'.join(['Over budget:'] + failures))
+        if options['update_budgets']:
+            viewbench.save_budgets(budgets)
+            self.stdout.write(self.style.SUCCESS(f'Budgets written to {viewbench.BUDGETS_PATH}'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'All {len(results)} views within budget'))
@@ -1,12 +1,13 @@
+import time
+
 from django.core.management.base import BaseCommand
-from django.utils import timezone
-from datetime import timedelta
-from core.models import NurseDocument
-from django.core.mail import send_mail
-from django.conf import settings
+
+from core import notifications
+
 
 class Command(BaseCommand):
-    help = 'Checks for documents that are expiring soon and sends notifications'
+    help = ('Checks for documents that are expiring soon and queues one digest per agency for run_worker '
+            'to send, or with --now sends them itself')
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -15,38 +16,54 @@ class Command(BaseCommand):
             default=30,
             help='Number of days before expiry to send notification'
         )
+        parser.add_argument(
+            '--now',
+            action='store_true',
+            help='Send the digests from this process instead of queueing them'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=notifications.DEFAULT_WORKERS,
+            help='With --now, mail connections to send digests over in parallel'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report what would be sent without sending or recording anything'
+        )
 
     def handle(self, *args, **options):
-        days = options['days']
-        expiry_date = timezone.now().date() + timedelta(days=days)
-        
-        expiring_documents = NurseDocument.objects.filter(
-            expiry_date__lte=expiry_date,
-            expiry_date__gt=timezone.now().date()
-        ).select_related('nurse', 'nurse__agency')
-
-        for document in expiring_documents:
-            # Send email to agency
-            subject = f'Document Expiring Soon: {document.nurse.full_name}'
-            message = f"""
-            The following document for {document.nurse.full_name} is expiring soon:
-            
-            Document Type: {document.get_document_type_display()}
-            Expiry Date: {document.expiry_date}
-            
-            Please ensure to upload a new document before the expiry date.
-            """
-            
-            send_mail(
-                subject,
-                message,
-                settings.DEFAULT_FROM_EMAIL,
-                [document.nurse.agency.contact_email],
-                fail_silently=True,
-            )
-            
+        started = time.perf_counter()
+        digests = notifications.build_digests(notifications.pending_documents(options['days']))
+        documents = sum(len(digest.documents) for digest in digests)
+        query_time = time.perf_counter() - started
+
+        if options['dry_run']:
             self.stdout.write(
-                self.style.WARNING(
-                    f'Notification sent for expiring document: {document}'
-                )
-            ) 
\ No newline at end of file
+                f'Dry run: {documents} expiring documents across {len(digests)} agencies '
+                f'(found in {query_time:.2f}s); nothing sent'
+            )
+            return
+
+        if not options['now']:
+            queued, skipped = notifications.queue_digests(digests)
+            for digest in skipped:
+                self.stdout.write(self.style.WARNING(f'No contact email for {digest.agency}; digest not sent'))
+            self.stdout.write(self.style.SUCCESS(
+                f'Queued {len(queued)} digests covering '
+                f'{sum(len(digest.documents) for digest in queued)} documents '
+                f'in {time.perf_counter() - started:.2f}s'
+            ))
+            return
+
+        report = notifications.send_digests(digests, workers=options['workers'])
+        for digest in report.skipped:
+            self.stdout.write(self.style.WARNING(f'No contact email for {digest.agency}; digest not sent'))
+        for digest in report.failed:
+            self.stdout.write(self.style.ERROR(f'Failed to send digest to {digest.agency}'))
+        self.stdout.write(self.style.SUCCESS(
+            f'Sent {len(report.sent)} digests covering '
+            f'{sum(len(digest.documents) for digest in report.sent)} documents '
+            f'in {query_time + report.elapsed:.2f}s'
+        ))
@@ -0,0 +1,43 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import exports
+
+
+class Command(BaseCommand):
+    help = 'Streams shifts or bookings with their trust, hospital, agency and nurse names for finance'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=['shifts', 'bookings'])
+        parser.add_argument('--format', choices=exports.FORMATS, default='csv')
+        parser.add_argument('--output', help='File to write (default: stdout)')
+        parser.add_argument('--date-from', type=date.fromisoformat, help='First shift date (YYYY-MM-DD)')
+        parser.add_argument('--date-to', type=date.fromisoformat, help='Last shift date (YYYY-MM-DD)')
+        parser.add_argument('--trust', type=int, help='Only this NHS trust ID')
+        parser.add_argument('--agency', type=int, help='Only this agency ID')
+
+    def handle(self, *args, **options):
+        if options['date_from'] and options['date_to'] and options['date_to'] < options['date_from']:
+            raise CommandError('--date-to must not be before --date-from')
+        build = exports.shift_export if options['kind'] == 'shifts' else exports.booking_export
+        export = build(
+            date_from=options['date_from'],
+            date_to=options['date_to'],
+            trust=options['trust'],
+            agency=options['agency'],
+        )
+
+        output = open(options['output'], 'w', newline='') if options['output'] else self.stdout
+        try:
+            rows = 0
+            for line in exports.encode(export, options['format']):
+                output.write(line)
+                rows += 1
+        finally:
+            if options['output']:
+                output.close()
+        if options['output']:
+            if options['format'] == 'csv':
+                rows -= 1
+            self.stderr.write(self.style.SUCCESS(f'Wrote {rows} {options["kind"]} to {options["output"]}'))
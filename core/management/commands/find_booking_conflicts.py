@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+from core.bookings import find_overlaps
+from core.models import Booking
+
+
+class Command(BaseCommand):
+    help = 'Scans every live booking for nurses booked onto overlapping shifts'
+
+    def handle(self, *args, **options):
+        pairs = list(find_overlaps())
+        bookings = Booking.objects.select_related('nurse', 'shift__hospital').in_bulk(
+            {booking_id for pair in pairs for booking_id in pair}
+        )
+        for earlier, later in pairs:
+            first, second = bookings[earlier], bookings[later]
+            self.stdout.write(
+                f'{first.nurse.full_name}: booking {first.id} ({first.shift}) '
+                f'overlaps booking {second.id} ({second.shift})'
+            )
+        if pairs:
+            raise CommandError(f'{len(pairs)} overlapping bookings found')
+        self.stdout.write(self.style.SUCCESS('No nurse is booked onto overlapping shifts'))
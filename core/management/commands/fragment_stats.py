@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from core import fragments
+
+
+def rate(value):
+    return '-' if value is None else f'{value:.0%}'
+
+
+class Command(BaseCommand):
+    help = ('Reports how often the shift and nurse tables were served from the fragment cache, '
+            'and how many of their rows had to be rendered')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Zero the counters after reporting')
+
+    def handle(self, *args, **options):
+        report = fragments.stats()
+        if not report:
+            self.stdout.write('No cached tables have been served since the counters were reset')
+        for name, counts in report.items():
+            self.stdout.write(
+                f'{name}: tables {counts["table_hits"]} hits, {counts["table_misses"]} misses '
+                f'({rate(counts["table_hit_rate"])}); rows {counts["row_hits"]} reused, '
+                f'{counts["row_misses"]} rendered ({rate(counts["row_hit_rate"])})'
+            )
+        if options['reset']:
+            fragments.reset_stats()
+            self.stdout.write('Counters reset')
@@ -0,0 +1,61 @@
+import csv
+import os
+import time
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core import billing
+
+HEADERS = ['agency', 'month', 'trust', 'specialty', 'shifts', 'hours', 'amount']
+
+
+def month(value):
+    return datetime.strptime(value, '%Y-%m').date()
+
+
+class Command(BaseCommand):
+    help = ('Writes each agency\'s invoice for a month, a line per trust and specialty, '
+            'from the billing rollups')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--month', type=month, help='Month to invoice (YYYY-MM, default: last month)')
+        parser.add_argument('--agency', type=int, help='Only this agency ID')
+        parser.add_argument('--output', help='Directory to write one CSV per agency to (default: a summary only)')
+
+    def handle(self, *args, **options):
+        invoice_month = options['month'] or billing.month_start(
+            billing.month_start(timezone.localdate()) - date.resolution
+        )
+        if options['output'] and not os.path.isdir(options['output']):
+            raise CommandError(f'{options["output"]} is not a directory')
+
+        started = time.perf_counter()
+        invoices = billing.invoices(invoice_month, agency=options['agency'])
+        for invoice in invoices:
+            if options['output']:
+                self.write(invoice, options['output'])
+            else:
+                self.stdout.write(
+                    f'{invoice.agency.name}: {invoice.shifts} shifts, {invoice.hours} hours, {invoice.amount:.2f}'
+                )
+        total = sum((invoice.amount for invoice in invoices), Decimal('0'))
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(invoices)} invoices for {invoice_month:%Y-%m} totalling {total:.2f} '
+            f'in {time.perf_counter() - started:.2f}s'
+        ))
+
+    def write(self, invoice, directory):
+        path = os.path.join(directory, f'invoice-{invoice.month:%Y-%m}-agency-{invoice.agency.pk}.csv')
+        with open(path, 'w', newline='') as output:
+            writer = csv.writer(output)
+            writer.writerow(HEADERS)
+            for line in invoice.lines:
+                writer.writerow([
+                    invoice.agency.name, f'{invoice.month:%Y-%m}', line['trust'], line['specialty'],
+                    line['shifts'], line['hours'], line['amount'],
+                ])
+            writer.writerow([invoice.agency.name, f'{invoice.month:%Y-%m}', 'Total', '',
+                             invoice.shifts, invoice.hours, invoice.amount])
@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import rota_import
+from core.models import Hospital
+
+
+class Command(BaseCommand):
+    help = 'Bulk imports shifts for a hospital from a CSV, JSON or NDJSON rota file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Rota file to import')
+        parser.add_argument('--hospital', type=int, required=True, help='ID of the hospital the shifts belong to')
+        parser.add_argument('--format', choices=['csv', 'json'], help='File format (default: from the file name)')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=rota_import.BATCH_SIZE,
+            help='Rows validated and inserted per transaction'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            hospital = Hospital.objects.get(pk=options['hospital'])
+        except Hospital.DoesNotExist:
+            raise CommandError(f'Hospital {options["hospital"]} does not exist')
+
+        try:
+            fmt = options['format'] or rota_import.detect_format(options['path'])
+        except rota_import.RotaFormatError as exc:
+            raise CommandError(str(exc))
+
+        started = time.perf_counter()
+        with open(options['path'], 'rb') as fileobj:
+            report = rota_import.import_rota(
+                hospital,
+                rota_import.iter_rows(fileobj, fmt),
+                batch_size=options['batch_size'],
+            )
+        elapsed = time.perf_counter() - started
+
+        for row_number, errors in report.errors:
+            for field, messages in errors.items():
+                self.stderr.write(f'Row {row_number}: {field}: {" ".join(messages)}')
+        if report.format_error:
+            self.stderr.write(self.style.ERROR(f'Import stopped early: {report.format_error}'))
+        self.stdout.write(self.style.SUCCESS(
+            f'Read {report.rows} rows in {elapsed:.2f}s: '
+            f'{report.created} shifts created, {len(report.errors)} rejected'
+        ))
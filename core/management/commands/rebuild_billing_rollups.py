@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core import billing
+
+# Differences listed before the rest are summarised.
+SHOW = 20
+
+
+class Command(BaseCommand):
+    help = ('Rebuilds the per trust, agency, month and specialty billing rollups and checks them '
+            'against a full recomputation in exact decimal arithmetic')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify-only',
+            action='store_true',
+            help='Report drift without rebuilding; exits with an error if any is found'
+        )
+
+    def handle(self, *args, **options):
+        if not options['verify_only']:
+            rows = billing.rebuild()
+            self.stdout.write(f'Rebuilt billing rollups with {rows} rows')
+
+        differences = billing.verify()
+        for (trust_id, agency_id, month, specialty), expected, actual in differences[:SHOW]:
+            self.stdout.write(
+                f'  trust {trust_id}, agency {agency_id}, {month:%Y-%m}, {specialty or "no specialty"}: '
+                f'expected {self.totals(expected)}, found {self.totals(actual)}'
+            )
+        if differences:
+            raise CommandError(f'Billing rollups are out of date: {len(differences)} cells differ')
+        self.stdout.write(self.style.SUCCESS('Billing rollups match the completed shifts'))
+
+    def totals(self, totals):
+        if totals is None:
+            return 'nothing'
+        shifts, hours, amount = totals
+        return f'{shifts} shifts, {hours} hours, {amount}'
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import router, transaction
+from core import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the full-text search tables for nurses, shifts and agencies from the source tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--model',
+            action='append',
+            choices=[model._meta.model_name for model in search.INDEXES],
+            help='Only rebuild this index (repeatable)'
+        )
+
+    def handle(self, *args, **options):
+        models = [model for model in search.INDEXES if not options['model'] or model._meta.model_name in options['model']]
+        if not any(search.is_available(router.db_for_write(model)) for model in models):
+            raise CommandError('Full-text search needs SQLite; this database searches with icontains instead')
+        with transaction.atomic():
+            counts = search.rebuild(models)
+        for model, rows in counts.items():
+            self.stdout.write(f'Indexed {rows} {model._meta.verbose_name_plural}')
+        self.stdout.write(self.style.SUCCESS('Search index rebuilt'))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+from core import eligibility
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the agency-to-open-shift eligibility index and checks it against the source tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify-only',
+            action='store_true',
+            help='Report drift without rebuilding; exits with an error if any is found'
+        )
+
+    def handle(self, *args, **options):
+        if not options['verify_only']:
+            rows = eligibility.rebuild()
+            self.stdout.write(f'Rebuilt eligibility index with {rows} rows')
+
+        missing, stale = eligibility.verify()
+        if missing or stale:
+            raise CommandError(f'Eligibility index is out of date: {missing} missing rows, {stale} stale rows')
+        self.stdout.write(self.style.SUCCESS('Eligibility index matches the source tables'))
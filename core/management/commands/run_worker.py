@@ -0,0 +1,64 @@
+import signal
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import jobs
+from core.models import Job
+
+STOP_SIGNALS = (signal.SIGTERM, signal.SIGINT)
+
+
+class Command(BaseCommand):
+    help = ('Runs queued background jobs (document previews, expiry digests), retrying failures with backoff, '
+            'and reports throughput and queue depth')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=4, help='Jobs to run at once, each on its own thread')
+        parser.add_argument('--poll', type=float, default=1.0, help='Seconds to wait between checks of an empty queue')
+        parser.add_argument('--report-interval', type=float, default=60,
+                            help='Seconds between throughput and queue depth reports')
+        parser.add_argument('--burst', action='store_true', help='Exit once no jobs are due instead of waiting')
+        parser.add_argument('--stats', action='store_true', help='Print the queue depth and exit')
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            self.report_queue()
+            return
+        if options['concurrency'] < 1 or options['poll'] <= 0 or options['report_interval'] <= 0:
+            raise CommandError('--concurrency, --poll and --report-interval must be positive')
+
+        worker = jobs.Worker(concurrency=options['concurrency'], poll=options['poll'])
+        # Finish the jobs in hand on SIGTERM or Ctrl-C, then exit.
+        handlers = {signum: signal.signal(signum, lambda *args: worker.stop()) for signum in STOP_SIGNALS}
+        self.started = self.last = time.monotonic()
+        self.last_counts = dict(worker.counts)
+        self.stdout.write(f'Worker running {options["concurrency"]} jobs at a time')
+        try:
+            worker.run(burst=options['burst'], on_tick=self.report, tick=options['report_interval'])
+        finally:
+            for signum, handler in handlers.items():
+                signal.signal(signum, handler)
+        self.last, self.last_counts = self.started, {status: 0 for status in worker.counts}
+        self.report(worker, label='In total')
+
+    def report(self, worker, label=None):
+        now = time.monotonic()
+        elapsed = now - self.last
+        counts = dict(worker.counts)
+        done, retried, dead = (
+            counts[status] - self.last_counts[status] for status in (Job.Status.DONE, Job.Status.QUEUED, Job.Status.DEAD)
+        )
+        self.last, self.last_counts = now, counts
+        self.stdout.write(
+            f'{label or f"Last {elapsed:.0f}s"}: {done} done ({done / elapsed if elapsed else 0:.1f}/s), '
+            f'{retried} retried, {dead} dead'
+        )
+        self.report_queue()
+
+    def report_queue(self):
+        stats = jobs.queue_stats()
+        self.stdout.write(
+            f'Queue: {stats[Job.Status.QUEUED]} queued, {stats[Job.Status.RUNNING]} running, '
+            f'{stats[Job.Status.DEAD]} dead; oldest due job waiting {stats["oldest_wait"]:.1f}s'
+        )
@@ -1,15 +1,31 @@
-from django.core.management.base import BaseCommand
+import time
+
+from django.core.management.base import BaseCommand, CommandError
 from django.contrib.auth import get_user_model
+from core.datagen import DataGenerator
 from core.models import NHSTrust, Hospital, Agency, TrustAgencyAccess, Nurse, NurseDocument, Shift, Booking
 from django.utils import timezone
 from datetime import timedelta
 
 User = get_user_model()
 
+SCALE_OPTIONS = ('trusts', 'hospitals', 'agencies', 'nurses', 'shifts')
+
 class Command(BaseCommand):
-    help = 'Seeds the database with initial test data'
+    help = ('Seeds the database with initial test data, or with any of the scale options, '
+            'generates that much deterministic synthetic data instead')
+
+    def add_arguments(self, parser):
+        for name in SCALE_OPTIONS:
+            parser.add_argument(f'--{name}', type=int, default=0, help=f'Number of synthetic {name} to generate')
+        parser.add_argument('--booking-ratio', type=float, default=0.6,
+                            help='Share of shifts given a booking when a free nurse can be found')
+        parser.add_argument('--seed', type=int, default=0, help='Seed; the same seed gives the same data')
+        parser.add_argument('--batch-size', type=int, default=5000)
 
     def handle(self, *args, **kwargs):
+        if any(kwargs[name] for name in SCALE_OPTIONS):
+            return self.generate(kwargs)
         self.stdout.write('Creating seed data...')
 
         # Create NHS Trust
@@ -94,14 +110,15 @@ class Command(BaseCommand):
         )
 
         # Create Nurse Documents
-        NurseDocument.objects.create(
-            nurse=nurse,
-            document_type='registration',
-            file_url='nurse_documents/registration.pdf',
-            expiry_date=timezone.now().date() + timedelta(days=365),
-            verified=True,
-            verified_by=admin_user
-        )
+        for document_type in NurseDocument.REQUIRED_TYPES:
+            NurseDocument.objects.create(
+                nurse=nurse,
+                document_type=document_type,
+                file_url=f'nurse_documents/{document_type}.pdf',
+                expiry_date=timezone.now().date() + timedelta(days=365),
+                verified=True,
+                verified_by=admin_user
+            )
 
         # Create Shifts
         for i in range(5):
@@ -125,4 +142,32 @@ class Command(BaseCommand):
                     confirmed=True
                 )
 
-        self.stdout.write(self.style.SUCCESS('Successfully created seed data')) 
\ No newline at end of file
+        self.stdout.write(self.style.SUCCESS('Successfully created seed data'))
+
+    def generate(self, options):
+        counts = {name: options[name] for name in SCALE_OPTIONS}
+        if any(count < 0 for count in counts.values()) or options['batch_size'] < 1:
+            raise CommandError('Counts must not be negative and --batch-size must be positive')
+        if not 0 <= options['booking_ratio'] <= 1:
+            raise CommandError('--booking-ratio must be between 0 and 1')
+        if counts['hospitals'] and not counts['trusts']:
+            raise CommandError('--hospitals needs --trusts')
+        if counts['shifts'] and not counts['hospitals']:
+            raise CommandError('--shifts needs --hospitals')
+        if counts['nurses'] and not counts['agencies']:
+            raise CommandError('--nurses needs --agencies')
+        if User.objects.filter(username__startswith=f'gen{options["seed"]}_').exists():
+            raise CommandError(f'Data for seed {options["seed"]} already exists; pick another --seed')
+
+        started = time.perf_counter()
+        generator = DataGenerator(
+            seed=options['seed'],
+            batch_size=options['batch_size'],
+            log=self.stdout.write if options['verbosity'] > 1 else None,
+        )
+        generator.run(booking_ratio=options['booking_ratio'], **counts)
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {Shift.objects.filter(hospital__user__username__startswith=generator.prefix + "_").count()} '
+            f'shifts and {Booking.objects.filter(agency__user__username__startswith=generator.prefix + "_").count()} '
+            f'bookings in {time.perf_counter() - started:.1f}s'
+        ))
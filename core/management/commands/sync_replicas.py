@@ -0,0 +1,47 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from core import replicas
+
+
+class Command(BaseCommand):
+    help = ('Stamps the replica heartbeat on the primary and, for SQLite replicas, '
+            'copies the primary database over each replica file')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Repeat every N seconds until interrupted (default: once)')
+        parser.add_argument('--heartbeat-only', action='store_true',
+                            help='Only stamp the heartbeat, for replicas the database server replicates itself')
+
+    def handle(self, *args, **options):
+        aliases = settings.DATABASE_REPLICAS
+        if not options['heartbeat_only']:
+            for alias in [DEFAULT_DB_ALIAS] + list(aliases):
+                if connections[alias].vendor != 'sqlite':
+                    raise CommandError(f'{alias} is not SQLite; use --heartbeat-only and let the server replicate')
+        while True:
+            replicas.beat()
+            copied = [] if options['heartbeat_only'] else aliases
+            for alias in copied:
+                self.copy(alias)
+            if options['verbosity']:
+                self.stdout.write(f'Heartbeat written, {len(copied)} replicas copied')
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
+
+    def copy(self, alias):
+        primary = connections[DEFAULT_DB_ALIAS]
+        primary.ensure_connection()
+        # The backup API copies a consistent snapshot of the primary, holding
+        # the replica file's write lock only while it does.
+        target = sqlite3.connect(connections[alias].settings_dict['NAME'])
+        try:
+            primary.connection.backup(target)
+        finally:
+            target.close()
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from core import compliance
+
+
+class Command(BaseCommand):
+    help = 'Marks nurses whose required documents have expired as non-compliant (run nightly)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Recompute every nurse from their documents instead of only rolling over expiries'
+        )
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            changed = compliance.rebuild()
+            self.stdout.write(f'Recomputed compliance; {changed} nurses changed')
+        flipped = compliance.roll_over()
+        self.stdout.write(self.style.SUCCESS(f'{flipped} nurses are no longer compliant'))
@@ -0,0 +1,193 @@
+"""
+Ranking an agency's nurses against a shift, and shifts against a nurse.
+
+A NursePool loads a set of nurses once and precomputes the features that
+decide eligibility as integer bitsets, one bit per nurse:
+
+* nurses are ordered by ``Nurse.compliant_until``, the date their required
+  documents stay valid until, so "valid on the shift date" is a prefix of the
+  pool and becomes a mask found with one bisect;
+* one bitset per specialty;
+* one bitset per calendar day marking nurses who already work that day.
+
+Matching a shift is then a couple of big-integer ANDs, an exact overlap check
+for the few nurses who work around the shift, and a sort of the survivors.
+Ranking ten thousand nurses takes a few milliseconds; loading the pool is the
+expensive part, so build one and reuse it for every shift it is asked about.
+"""
+import heapq
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .models import AgencyShiftEligibility, Booking, Nurse, Shift
+
+BEST_SHIFTS_LIMIT = 20
+
+
+def _days(start, end):
+    # Every local calendar day [start, end) touches, give or take the last one;
+    # the exact overlap check weeds out the extra candidates that brings in.
+    day, last = timezone.localtime(start).date(), timezone.localtime(end).date()
+    while day <= last:
+        yield day
+        day += timedelta(days=1)
+
+
+def _normalize(specialty):
+    return (specialty or '').strip().lower()
+
+
+def _positions(mask):
+    # bin() is far quicker than peeling bits off a 10k-bit integer one at a time.
+    return [i for i, bit in enumerate(reversed(bin(mask)[2:])) if bit == '1']
+
+
+class Match:
+    def __init__(self, nurse_id, full_name, shifts_at_hospital, booked_hours):
+        self.nurse_id = nurse_id
+        self.full_name = full_name
+        self.shifts_at_hospital = shifts_at_hospital
+        self.booked_hours = booked_hours
+
+    def __repr__(self):
+        return f'<Match {self.full_name}>'
+
+    def __str__(self):
+        if self.shifts_at_hospital:
+            return f'{self.full_name} (worked here {self.shifts_at_hospital}x)'
+        return self.full_name
+
+
+class NursePool:
+    def __init__(self, nurses, today=None):
+        today = today or timezone.now().date()
+        nurses = nurses.order_by()
+        rows = sorted(
+            nurses.values_list('id', 'full_name', 'specialty', 'compliant_until'),
+            key=lambda row: (-(row[3] or date.min).toordinal(), row[0])
+        )
+        self.ids = [row[0] for row in rows]
+        self.names = [row[1] for row in rows]
+        self.valid_until = [row[3] or date.min for row in rows]
+        self._expiry_keys = [-day.toordinal() for day in self.valid_until]
+        position = {nurse_id: i for i, nurse_id in enumerate(self.ids)}
+
+        self._specialties = defaultdict(int)
+        for i, row in enumerate(rows):
+            self._specialties[_normalize(row[2])] |= 1 << i
+
+        self._busy_days = defaultdict(int)
+        self._bookings = defaultdict(list)
+        self.booked_hours = [Decimal(0)] * len(rows)
+        midnight = timezone.make_aware(datetime.combine(today, time.min))
+        bookings = Booking.objects.filter(
+            nurse__in=nurses.values('pk'),
+            cancelled=False,
+            starts_at__gt=midnight - Shift.MAX_DURATION,
+        ).values_list('nurse_id', 'shift_id', 'starts_at', 'ends_at', 'shift__duration_hours')
+        for nurse_id, shift_id, start, end, duration in bookings:
+            i = position[nurse_id]
+            self._bookings[i].append((start, end, shift_id))
+            for day in _days(start, end):
+                self._busy_days[day] |= 1 << i
+            if start >= midnight:
+                self.booked_hours[i] += duration
+
+        # Completed shifts per hospital: nurses who know the ward rank first.
+        self._history = defaultdict(dict)
+        completed = Booking.objects.filter(
+            nurse__in=nurses.values('pk'),
+            cancelled=False,
+            shift__status=Shift.Status.COMPLETED,
+        ).values('nurse_id', 'shift__hospital_id').annotate(shifts=Count('id')).order_by()
+        for row in completed:
+            self._history[row['shift__hospital_id']][position[row['nurse_id']]] = row['shifts']
+
+    @classmethod
+    def for_agency(cls, agency_id, **kwargs):
+        return cls(
+            Nurse.objects.filter(agency_id=agency_id, is_compliant=True, is_approved=True, is_active=True), **kwargs
+        )
+
+    def __len__(self):
+        return len(self.ids)
+
+    def shifts_at_hospital(self, i, hospital_id):
+        return self._history.get(hospital_id, {}).get(i, 0)
+
+    def is_free(self, i, start, end, shift_id=None):
+        return not any(
+            booked_start < end and start < booked_end and booked_shift != shift_id
+            for booked_start, booked_end, booked_shift in self._bookings.get(i, ())
+        )
+
+    def eligible(self, shift):
+        """Bitset of the nurses who may work ``shift``."""
+        start, end = shift.starts_at, shift.ends_at
+        mask = (1 << bisect_right(self._expiry_keys, -shift.shift_date.toordinal())) - 1
+        specialty = _normalize(shift.specialty_required)
+        if specialty:
+            mask &= self._specialties.get(specialty, 0)
+        busy = 0
+        for day in _days(start, end):
+            busy |= self._busy_days.get(day, 0)
+        for i in _positions(mask & busy):
+            if not self.is_free(i, start, end, shift.pk):
+                mask &= ~(1 << i)
+        return mask
+
+    def match(self, shift, limit=None):
+        """Eligible nurses for ``shift``, best first."""
+        history = self._history.get(shift.hospital_id, {})
+        candidates = _positions(self.eligible(shift))
+
+        def rank(i):
+            return (-history.get(i, 0), self.booked_hours[i], self.names[i], self.ids[i])
+
+        ordered = heapq.nsmallest(limit, candidates, key=rank) if limit else sorted(candidates, key=rank)
+        return [Match(self.ids[i], self.names[i], history.get(i, 0), self.booked_hours[i]) for i in ordered]
+
+
+class ShiftMatch:
+    def __init__(self, shift, shifts_at_hospital):
+        self.shift = shift
+        self.shifts_at_hospital = shifts_at_hospital
+
+
+def best_shifts(nurse, limit=BEST_SHIFTS_LIMIT, today=None):
+    """The open shifts ``nurse`` could work, best first."""
+    today = today or timezone.now().date()
+    pool = NursePool(Nurse.objects.filter(pk=nurse.pk, is_approved=True, is_active=True), today=today)
+    if not pool or pool.valid_until[0] < today:
+        return []
+
+    eligible = AgencyShiftEligibility.objects.filter(
+        agency_id=nurse.agency_id,
+        shift_date__gte=today,
+        shift_date__lte=pool.valid_until[0],
+    ).select_related('shift__hospital')
+    specialty = _normalize(nurse.specialty)
+    if specialty:
+        eligible = eligible.filter(
+            Q(shift__specialty_required__iexact=specialty)
+            | Q(shift__specialty_required='')
+            | Q(shift__specialty_required__isnull=True)
+        )
+
+    matches = []
+    for row in eligible.iterator():
+        shift = row.shift
+        if _normalize(shift.specialty_required) not in ('', specialty):
+            continue
+        if pool.is_free(0, shift.starts_at, shift.ends_at, shift.pk):
+            matches.append(ShiftMatch(shift, pool.shifts_at_hospital(0, shift.hospital_id)))
+    return heapq.nsmallest(
+        limit,
+        matches,
+        key=lambda m: (-m.shifts_at_hospital, -m.shift.rate_per_hour, m.shift.shift_date, m.shift.shift_time, m.shift.pk)
+    )
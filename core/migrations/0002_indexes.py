@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='nurse',
+            index=models.Index(fields=['agency', 'is_approved'], name='nurse_agency_approved_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='nurse',
+            index=models.Index(condition=models.Q(('is_active', True), ('is_approved', True)), fields=['agency'], name='nurse_bookable_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='nursedocument',
+            index=models.Index(fields=['expiry_date'], name='document_expiry_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shift',
+            index=models.Index(fields=['status', 'hospital'], name='shift_status_hospital_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shift',
+            index=models.Index(fields=['status', 'shift_date', 'shift_time'], name='shift_status_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shift',
+            index=models.Index(fields=['hospital', 'shift_date'], name='shift_hospital_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trustagencyaccess',
+            index=models.Index(fields=['agency', 'approved', 'trust'], name='access_agency_approved_idx'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def populate_eligibility(apps, schema_editor):
+    Shift = apps.get_model('core', 'Shift')
+    AgencyShiftEligibility = apps.get_model('core', 'AgencyShiftEligibility')
+    rows = Shift.objects.filter(
+        status='open',
+        hospital__trust__trustagencyaccess__approved=True,
+    ).values_list(
+        'hospital__trust__trustagencyaccess__agency', 'id', 'hospital__trust', 'shift_date', 'shift_time',
+    )
+    AgencyShiftEligibility.objects.bulk_create(
+        (
+            AgencyShiftEligibility(
+                agency_id=agency_id, shift_id=shift_id, trust_id=trust_id,
+                shift_date=shift_date, shift_time=shift_time,
+            )
+            for agency_id, shift_id, trust_id, shift_date, shift_time in rows.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AgencyShiftEligibility',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shift_date', models.DateField()),
+                ('shift_time', models.TimeField()),
+                ('agency', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='eligible_shifts', to='core.agency')),
+                ('shift', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='eligible_agencies', to='core.shift')),
+                ('trust', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.nhstrust')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['agency', 'shift_date', 'shift_time', 'shift'], name='eligibility_feed_idx')],
+                'unique_together': {('agency', 'shift')},
+            },
+        ),
+        migrations.RunPython(populate_eligibility, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:11
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_agency_shift_eligibility'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentExpiryNotification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('expiry_date', models.DateField()),
+                ('sent_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('agency', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='expiry_notifications', to='core.agency')),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='expiry_notifications', to='core.nursedocument')),
+            ],
+            options={
+                'unique_together': {('document', 'expiry_date')},
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_document_expiry_notification'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='nurse',
+            index=models.Index(condition=models.Q(('is_approved', False)), fields=['created_at'], name='nurse_pending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trustagencyaccess',
+            index=models.Index(condition=models.Q(('approved', False)), fields=['created_at'], name='access_pending_idx'),
+        ),
+    ]
@@ -0,0 +1,90 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:02
+
+from datetime import datetime, timedelta
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+UNKNOWN_DURATION = timedelta(hours=12)
+BATCH_SIZE = 1000
+
+
+def populate_windows(apps, schema_editor):
+    Shift = apps.get_model('core', 'Shift')
+    Booking = apps.get_model('core', 'Booking')
+    shifts = Shift.objects.only('shift_date', 'shift_time', 'duration_hours').order_by('pk')
+    last = 0
+    # A batch at a time by primary key, so neither the table nor an open
+    # cursor over it is held while the batch is written back.
+    while True:
+        batch = list(shifts.filter(pk__gt=last)[:BATCH_SIZE])
+        if not batch:
+            break
+        for shift in batch:
+            shift.starts_at = timezone.make_aware(datetime.combine(shift.shift_date, shift.shift_time))
+            duration = timedelta(hours=float(shift.duration_hours)) if shift.duration_hours else UNKNOWN_DURATION
+            shift.ends_at = shift.starts_at + duration
+        Shift.objects.bulk_update(batch, ['starts_at', 'ends_at'])
+        last = batch[-1].pk
+
+    window = Shift.objects.filter(pk=OuterRef('shift_id'))
+    Booking.objects.update(
+        starts_at=Subquery(window.values('starts_at')),
+        ends_at=Subquery(window.values('ends_at')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_pending_approval_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shift',
+            name='starts_at',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='shift',
+            name='ends_at',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='booking',
+            name='starts_at',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='booking',
+            name='ends_at',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.RunPython(populate_windows, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='shift',
+            name='starts_at',
+            field=models.DateTimeField(editable=False),
+        ),
+        migrations.AlterField(
+            model_name='shift',
+            name='ends_at',
+            field=models.DateTimeField(editable=False),
+        ),
+        migrations.AlterField(
+            model_name='booking',
+            name='starts_at',
+            field=models.DateTimeField(editable=False),
+        ),
+        migrations.AlterField(
+            model_name='booking',
+            name='ends_at',
+            field=models.DateTimeField(editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(condition=models.Q(('cancelled', False)), fields=['nurse', 'starts_at'], name='booking_nurse_window_idx'),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:20
+
+from collections import defaultdict
+
+from django.db import migrations, models
+from django.db.models import Max
+from django.utils import timezone
+
+REQUIRED_TYPES = ('registration', 'dbs')
+
+
+def populate_compliance(apps, schema_editor):
+    Nurse = apps.get_model('core', 'Nurse')
+    NurseDocument = apps.get_model('core', 'NurseDocument')
+    today = timezone.now().date()
+    latest = defaultdict(dict)
+    documents = NurseDocument.objects.filter(
+        verified=True, document_type__in=REQUIRED_TYPES,
+    ).values('nurse_id', 'document_type').annotate(expiry=Max('expiry_date')).order_by()
+    for row in documents:
+        latest[row['nurse_id']][row['document_type']] = row['expiry']
+    nurses = []
+    for nurse in Nurse.objects.filter(pk__in=list(latest)).only('id'):
+        expiries = latest[nurse.pk]
+        if len(expiries) == len(REQUIRED_TYPES):
+            nurse.compliant_until = min(expiries.values())
+            nurse.is_compliant = nurse.compliant_until >= today
+            nurses.append(nurse)
+    Nurse.objects.bulk_update(nurses, ['compliant_until', 'is_compliant'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_shift_booking_windows'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='nurse',
+            name='compliant_until',
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='nurse',
+            name='is_compliant',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='nurse',
+            index=models.Index(condition=models.Q(('is_compliant', True)), fields=['agency'], name='nurse_compliant_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='nurse',
+            index=models.Index(condition=models.Q(('is_compliant', True)), fields=['compliant_until'], name='nurse_compliance_expiry_idx'),
+        ),
+        migrations.RunPython(populate_compliance, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:22
+
+import hashlib
+
+import core.uploads
+from django.db import migrations, models
+
+
+def record_checksums(apps, schema_editor):
+    # Existing files keep their names; only new uploads are stored by checksum.
+    NurseDocument = apps.get_model('core', 'NurseDocument')
+    documents = []
+    for document in NurseDocument.objects.filter(checksum='').exclude(file_url='').iterator():
+        storage = document.file_url.storage
+        if not storage.exists(document.file_url.name):
+            continue
+        hasher = hashlib.sha256()
+        with storage.open(document.file_url.name, 'rb') as fileobj:
+            for chunk in fileobj.chunks():
+                hasher.update(chunk)
+        document.checksum = hasher.hexdigest()
+        document.size = storage.size(document.file_url.name)
+        documents.append(document)
+    NurseDocument.objects.bulk_update(documents, ['checksum', 'size'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_nurse_compliance'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='nursedocument',
+            name='checksum',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='nursedocument',
+            name='preview',
+            field=models.ImageField(blank=True, editable=False, upload_to='document_previews/'),
+        ),
+        migrations.AddField(
+            model_name='nursedocument',
+            name='size',
+            field=models.PositiveBigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AlterField(
+            model_name='nursedocument',
+            name='file_url',
+            field=models.FileField(storage=core.uploads.ContentAddressedStorage(), upload_to='nurse_documents/'),
+        ),
+        migrations.AddIndex(
+            model_name='nursedocument',
+            index=models.Index(fields=['checksum'], name='document_checksum_idx'),
+        ),
+        migrations.RunPython(record_checksums, migrations.RunPython.noop),
+    ]
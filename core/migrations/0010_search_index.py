@@ -0,0 +1,53 @@
+from django.db import migrations
+
+# FTS5 tables for core.search; the rowid of each entry is the indexed row's id.
+TABLES = {
+    'core_nurse_search': (
+        'full_name, registration_number, specialty',
+        'SELECT id, full_name, registration_number, specialty FROM core_nurse',
+    ),
+    'core_shift_search': (
+        'po_number, ward, specialty, hospital',
+        'SELECT s.id, s.po_number, s.ward, s.specialty_required, h.name '
+        'FROM core_shift s JOIN core_hospital h ON h.id = s.hospital_id',
+    ),
+    'core_agency_search': (
+        'name, registration_number, contact_email',
+        'SELECT id, name, registration_number, contact_email FROM core_agency',
+    ),
+}
+
+
+def create_search_tables(apps, schema_editor):
+    connection = schema_editor.connection
+    # Other databases search with icontains; see core.search.
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for table, (columns, select) in TABLES.items():
+            # Prefix indexes make the two- and three-character prefix queries
+            # that search-as-you-type sends as cheap as whole-word ones.
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE {table} USING fts5({columns}, "
+                f"tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+            )
+            cursor.execute(f'INSERT INTO {table} (rowid, {columns}) {select}')
+
+
+def drop_search_tables(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for table in TABLES:
+            cursor.execute(f'DROP TABLE IF EXISTS {table}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_replica_heartbeat'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_tables, drop_search_tables),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:55
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='hospital',
+            name='shifts_changed_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AddField(
+            model_name='hospital',
+            name='shifts_version',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+    ]
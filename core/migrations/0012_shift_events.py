@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:59
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_hospital_shifts_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShiftEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('opened', 'Opened'), ('booked', 'Booked')], max_length=10)),
+                ('shift_id', models.PositiveBigIntegerField()),
+                ('trust_id', models.PositiveBigIntegerField()),
+                ('data', models.JSONField()),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:08
+
+import django.db.models.deletion
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+def populate_rollups(apps, schema_editor):
+    Shift = apps.get_model('core', 'Shift')
+    BillingRollup = apps.get_model('core', 'BillingRollup')
+    totals = defaultdict(lambda: [0, Decimal('0.00'), Decimal('0.0000')])
+    rows = Shift.objects.filter(status='completed', booking__cancelled=False).values_list(
+        'hospital__trust', 'booking__agency', 'shift_date', 'specialty_required', 'duration_hours', 'rate_per_hour',
+    )
+    for trust_id, agency_id, shift_date, specialty, duration, rate in rows.iterator():
+        cell = totals[trust_id, agency_id, shift_date.replace(day=1), specialty or '']
+        cell[0] += 1
+        cell[1] += duration
+        cell[2] += duration * rate
+    BillingRollup.objects.bulk_create(
+        (
+            BillingRollup(
+                trust_id=trust_id, agency_id=agency_id, month=month, specialty=specialty,
+                shifts=shifts, hours=hours, amount=amount,
+            )
+            for (trust_id, agency_id, month, specialty), (shifts, hours, amount) in totals.items()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BillingRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('specialty', models.CharField(blank=True, max_length=100)),
+                ('shifts', models.PositiveIntegerField()),
+                ('hours', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('amount', models.DecimalField(decimal_places=4, max_digits=16)),
+                ('agency', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='billing_rollups', to='core.agency')),
+                ('trust', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.nhstrust')),
+            ],
+            options={
+                'unique_together': {('month', 'agency', 'trust', 'specialty')},
+            },
+        ),
+        migrations.RunPython(populate_rollups, migrations.RunPython.noop),
+    ]
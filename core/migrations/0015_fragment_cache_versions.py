@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_billing_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='nurse',
+            name='cache_version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='shift',
+            name='cache_version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
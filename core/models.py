@@ -1,9 +1,12 @@
 from django.db import models
+from django.db.models import F, Q
 from django.contrib.auth.models import AbstractUser
 from django.utils.translation import gettext_lazy as _
 from django.core.exceptions import ValidationError
 from django.utils import timezone
-from datetime import datetime
+from datetime import datetime, timedelta
+
+from .uploads import checksum, document_storage
 
 class User(AbstractUser):
     class Role(models.TextChoices):
@@ -19,24 +22,14 @@ class User(AbstractUser):
     created_at = models.DateTimeField(auto_now_add=True)
     last_login_ip = models.GenericIPAddressField(null=True, blank=True)
     is_active = models.BooleanField(default=True)
+    # Written by core.throttle when an account is locked out or logs in again;
+    # the attempts themselves are counted in the cache.
     failed_login_attempts = models.IntegerField(default=0)
     last_failed_login = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
         return f"{self.email} ({self.role})"
 
-    def increment_failed_login(self):
-        self.failed_login_attempts += 1
-        self.last_failed_login = timezone.now()
-        if self.failed_login_attempts >= 5:
-            self.is_active = False
-        self.save()
-
-    def reset_failed_login(self):
-        self.failed_login_attempts = 0
-        self.last_failed_login = None
-        self.save()
-
 class NHSTrust(models.Model):
     name = models.CharField(max_length=255)
     website = models.URLField(blank=True)
@@ -59,6 +52,10 @@ class Hospital(models.Model):
     emergency_contact = models.CharField(max_length=100, null=True, blank=True)
     created_at = models.DateTimeField(default=timezone.now)
     is_active = models.BooleanField(default=True)
+    # Bumped by core.shift_calendar whenever one of the hospital's shifts or
+    # bookings changes; the shift calendar's ETag and Last-Modified.
+    shifts_version = models.PositiveBigIntegerField(default=0, editable=False)
+    shifts_changed_at = models.DateTimeField(default=timezone.now, editable=False)
 
     def __str__(self):
         return self.name
@@ -89,12 +86,33 @@ class TrustAgencyAccess(models.Model):
 
     class Meta:
         unique_together = ('trust', 'agency')
+        indexes = [
+            # Covers the "approved trusts for this agency" subquery without touching the table.
+            models.Index(fields=['agency', 'approved', 'trust'], name='access_agency_approved_idx'),
+            models.Index(fields=['created_at'], condition=Q(approved=False), name='access_pending_idx'),
+        ]
 
     def save(self, *args, **kwargs):
         if self.approved and not self.approved_at:
             self.approved_at = timezone.now()
         super().save(*args, **kwargs)
 
+def save_with_new_cache_version(instance, save, *args, **kwargs):
+    """
+    Save a changed Shift or Nurse under the next ``cache_version``. The
+    version is incremented in the UPDATE itself, so two concurrent saves can
+    never leave the same version on different contents; it is then left
+    deferred, to be read back if anything asks for it.
+    """
+    if instance._state.adding:
+        save(*args, **kwargs)
+        return
+    instance.cache_version = F('cache_version') + 1
+    if kwargs.get('update_fields') is not None:
+        kwargs['update_fields'] = {*kwargs['update_fields'], 'cache_version'}
+    save(*args, **kwargs)
+    del instance.cache_version
+
 class Nurse(models.Model):
     agency = models.ForeignKey(Agency, on_delete=models.CASCADE, related_name='nurses')
     full_name = models.CharField(max_length=255)
@@ -107,6 +125,24 @@ class Nurse(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     is_active = models.BooleanField(default=True)
     notes = models.TextField(blank=True)
+    # Maintained by core.compliance from the nurse's documents.
+    is_compliant = models.BooleanField(default=False, editable=False)
+    compliant_until = models.DateField(null=True, blank=True, editable=False)
+    # Bumped whenever anything shown in the nurse's table row changes (see core.fragments).
+    cache_version = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['agency', 'is_approved'], name='nurse_agency_approved_idx'),
+            models.Index(fields=['agency'], condition=Q(is_compliant=True), name='nurse_compliant_idx'),
+            models.Index(fields=['compliant_until'], condition=Q(is_compliant=True), name='nurse_compliance_expiry_idx'),
+            models.Index(
+                fields=['agency'],
+                condition=Q(is_approved=True, is_active=True),
+                name='nurse_bookable_idx',
+            ),
+            models.Index(fields=['created_at'], condition=Q(is_approved=False), name='nurse_pending_idx'),
+        ]
 
     def __str__(self):
         return self.full_name
@@ -118,7 +154,7 @@ class Nurse(models.Model):
     def save(self, *args, **kwargs):
         if self.is_approved and not self.approved_at:
             self.approved_at = timezone.now()
-        super().save(*args, **kwargs)
+        save_with_new_cache_version(self, super().save, *args, **kwargs)
 
 class NurseDocument(models.Model):
     DOCUMENT_TYPES = [
@@ -129,10 +165,17 @@ class NurseDocument(models.Model):
         ('insurance', 'Insurance'),
         ('other', 'Other'),
     ]
+    # A nurse can only be put forward for a shift while one verified document
+    # of each of these types is in date.
+    REQUIRED_TYPES = ('registration', 'dbs')
 
     nurse = models.ForeignKey(Nurse, on_delete=models.CASCADE, related_name='documents')
     document_type = models.CharField(max_length=100, choices=DOCUMENT_TYPES)
-    file_url = models.FileField(upload_to='nurse_documents/')
+    file_url = models.FileField(upload_to='nurse_documents/', storage=document_storage)
+    # SHA-256 of the file, which also names it on disk; shared by every copy of the same upload.
+    checksum = models.CharField(max_length=64, blank=True, editable=False)
+    size = models.PositiveBigIntegerField(null=True, blank=True, editable=False)
+    preview = models.ImageField(upload_to='document_previews/', blank=True, editable=False)
     expiry_date = models.DateField()
     uploaded_at = models.DateTimeField(auto_now_add=True)
     verified = models.BooleanField(default=False)
@@ -140,6 +183,12 @@ class NurseDocument(models.Model):
     verified_at = models.DateTimeField(null=True, blank=True)
     notes = models.TextField(blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['expiry_date'], name='document_expiry_idx'),
+            models.Index(fields=['checksum'], name='document_checksum_idx'),
+        ]
+
     def __str__(self):
         return f"{self.nurse.full_name} - {self.document_type}"
 
@@ -147,6 +196,33 @@ class NurseDocument(models.Model):
         if self.expiry_date and self.expiry_date < timezone.now().date():
             raise ValidationError({'expiry_date': 'Expiry date cannot be in the past'})
 
+    def save(self, *args, **kwargs):
+        if self.file_url and not self.file_url._committed:
+            self.checksum = checksum(self.file_url.file)
+            self.size = self.file_url.size
+        super().save(*args, **kwargs)
+
+class DocumentExpiryNotification(models.Model):
+    """
+    Ledger of expiry warnings already sent, so reruns of
+    check_expiring_documents do not mail the same agency twice. Keyed on the
+    expiry date too: a document whose expiry is corrected is warned about again.
+    """
+    document = models.ForeignKey(NurseDocument, on_delete=models.CASCADE, related_name='expiry_notifications')
+    agency = models.ForeignKey(Agency, on_delete=models.CASCADE, related_name='expiry_notifications')
+    expiry_date = models.DateField()
+    sent_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = ('document', 'expiry_date')
+
+class ReplicaHeartbeat(models.Model):
+    """
+    A single row the primary rewrites every few seconds (``sync_replicas``).
+    Its age on a replica is how far that replica lags; see core.replicas.
+    """
+    beat_at = models.DateTimeField()
+
 class Shift(models.Model):
     class Status(models.TextChoices):
         OPEN = 'open', _('Open')
@@ -167,8 +243,26 @@ class Shift(models.Model):
         choices=Status.choices,
         default=Status.OPEN
     )
+    # Materialised from shift_date, shift_time and duration_hours on save.
+    starts_at = models.DateTimeField(editable=False)
+    ends_at = models.DateTimeField(editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     notes = models.TextField(blank=True)
+    # Bumped whenever anything shown in the shift's table rows changes (see core.fragments).
+    cache_version = models.PositiveIntegerField(default=0, editable=False)
+
+    # Most shifts are entered without a duration; assume a long day so that
+    # two of them on the same morning still count as overlapping.
+    UNKNOWN_DURATION = timedelta(hours=12)
+    # duration_hours cannot exceed 99.99, so no shift runs for longer than this.
+    MAX_DURATION = timedelta(hours=100)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'hospital'], name='shift_status_hospital_idx'),
+            models.Index(fields=['status', 'shift_date', 'shift_time'], name='shift_status_date_idx'),
+            models.Index(fields=['hospital', 'shift_date'], name='shift_hospital_date_idx'),
+        ]
 
     def __str__(self):
         return f"{self.hospital.name} - {self.shift_date} {self.shift_time}"
@@ -177,6 +271,40 @@ class Shift(models.Model):
         if self.shift_date and self.shift_date < timezone.now().date():
             raise ValidationError({'shift_date': 'Shift date cannot be in the past'})
 
+    def set_window(self):
+        """Fill starts_at and ends_at. Call this before bulk_create, which skips save()."""
+        self.starts_at = timezone.make_aware(datetime.combine(self.shift_date, self.shift_time))
+        duration = timedelta(hours=float(self.duration_hours)) if self.duration_hours else self.UNKNOWN_DURATION
+        self.ends_at = self.starts_at + duration
+
+    def save(self, *args, **kwargs):
+        self.set_window()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'starts_at', 'ends_at'}
+        save_with_new_cache_version(self, super().save, *args, **kwargs)
+
+class AgencyShiftEligibility(models.Model):
+    """
+    One row per (agency, open shift) the agency is approved to see.
+
+    Maintained incrementally by ``core.eligibility`` so the agency feed is a
+    range scan over ``eligibility_feed_idx`` instead of a join through
+    TrustAgencyAccess and Hospital. ``trust``, ``shift_date`` and
+    ``shift_time`` are copied from the shift for filtering and ordering.
+    """
+    agency = models.ForeignKey(Agency, on_delete=models.CASCADE, related_name='eligible_shifts')
+    shift = models.ForeignKey(Shift, on_delete=models.CASCADE, related_name='eligible_agencies')
+    trust = models.ForeignKey(NHSTrust, on_delete=models.CASCADE, related_name='+')
+    shift_date = models.DateField()
+    shift_time = models.TimeField()
+
+    class Meta:
+        unique_together = ('agency', 'shift')
+        indexes = [
+            models.Index(fields=['agency', 'shift_date', 'shift_time', 'shift'], name='eligibility_feed_idx'),
+        ]
+
 class Booking(models.Model):
     shift = models.OneToOneField(Shift, on_delete=models.CASCADE, related_name='booking')
     nurse = models.ForeignKey(Nurse, on_delete=models.CASCADE, related_name='bookings')
@@ -188,13 +316,95 @@ class Booking(models.Model):
     cancelled_at = models.DateTimeField(null=True, blank=True)
     cancellation_reason = models.TextField(blank=True)
     notes = models.TextField(blank=True)
+    # Copied from the shift so a nurse's bookings can be range-scanned for overlaps.
+    starts_at = models.DateTimeField(editable=False)
+    ends_at = models.DateTimeField(editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['nurse', 'starts_at'], condition=Q(cancelled=False), name='booking_nurse_window_idx'),
+        ]
 
     def __str__(self):
         return f"{self.nurse.full_name} - {self.shift}"
 
     def save(self, *args, **kwargs):
+        if self.starts_at is None or self.ends_at is None:
+            self.starts_at, self.ends_at = Shift.objects.values_list('starts_at', 'ends_at').get(pk=self.shift_id)
         if self.confirmed and not self.confirmed_at:
             self.confirmed_at = timezone.now()
         if self.cancelled and not self.cancelled_at:
             self.cancelled_at = timezone.now()
         super().save(*args, **kwargs)
+
+class ShiftEvent(models.Model):
+    """
+    Outbox of shift-opened and shift-booked events for the agency stream.
+    Written in the same transaction as the change; every process serving
+    streams tails the table by id (see core.shift_events).
+    """
+    class Kind(models.TextChoices):
+        OPENED = 'opened', _('Opened')
+        BOOKED = 'booked', _('Booked')
+
+    kind = models.CharField(max_length=10, choices=Kind.choices)
+    # Not foreign keys: an event outlives the shift it describes.
+    shift_id = models.PositiveBigIntegerField()
+    trust_id = models.PositiveBigIntegerField()
+    data = models.JSONField()
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+class Job(models.Model):
+    """
+    A unit of background work, run by ``run_worker`` (see core.jobs).
+    Workers claim queued jobs with a conditional UPDATE, so each job is run
+    by one worker however many there are.
+    """
+    class Status(models.TextChoices):
+        QUEUED = 'queued', _('Queued')
+        RUNNING = 'running', _('Running')
+        DONE = 'done', _('Done')
+        DEAD = 'dead', _('Dead')
+
+    task = models.CharField(max_length=200)
+    args = models.JSONField(default=list)
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    # Set by the worker that claimed the job.
+    claim = models.CharField(max_length=32, blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_at'], name='job_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.task} #{self.pk}'
+
+class BillingRollup(models.Model):
+    """
+    What one agency has billed one trust for a month's completed shifts in a
+    specialty: the shift count, hours, and the sum of ``duration_hours *
+    rate_per_hour``. Kept up to date by ``core.billing`` so invoices read a
+    few rows instead of every booking in the month.
+    """
+    trust = models.ForeignKey(NHSTrust, on_delete=models.CASCADE, related_name='+')
+    agency = models.ForeignKey(Agency, on_delete=models.CASCADE, related_name='billing_rollups')
+    # The first day of the month.
+    month = models.DateField()
+    specialty = models.CharField(max_length=100, blank=True)
+    shifts = models.PositiveIntegerField()
+    hours = models.DecimalField(max_digits=12, decimal_places=2)
+    amount = models.DecimalField(max_digits=16, decimal_places=4)
+
+    class Meta:
+        unique_together = ('month', 'agency', 'trust', 'specialty')
+
+    def __str__(self):
+        return f'{self.agency_id} / {self.trust_id} / {self.month:%Y-%m} / {self.specialty}'
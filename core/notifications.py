@@ -0,0 +1,183 @@
+"""
+Document expiry digests for agencies.
+
+Each agency gets one email listing all of its nurses' documents that expire
+within the window and have not been warned about yet. Digests are normally
+queued as background jobs (``queue_digests``), one per agency, and sent by
+``run_worker``, which retries a failed send with backoff. ``send_digests``
+sends them from the calling process instead, over a small pool of workers
+each holding one SMTP connection open for all of the messages it sends.
+Every digest that goes out is written to the DocumentExpiryNotification
+ledger so the next run skips it. A queued digest reserves its ledger rows
+before sending and mails only the documents it managed to reserve, so two
+jobs covering the same documents cannot both send them.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from itertools import groupby
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from . import jobs
+from .models import Agency, DocumentExpiryNotification, NurseDocument
+
+DEFAULT_WORKERS = 4
+
+
+class Digest:
+    def __init__(self, agency, documents):
+        self.agency = agency
+        self.documents = documents
+
+    def message(self):
+        count = len(self.documents)
+        lines = [
+            f'The following {count} nurse document{"s" if count != 1 else ""} '
+            f'will expire soon. Please upload replacements before the expiry date.',
+            '',
+        ]
+        for document in self.documents:
+            lines.append(
+                f'- {document.nurse.full_name}: {document.get_document_type_display()} '
+                f'expires {document.expiry_date}'
+            )
+        return EmailMessage(
+            subject=f'{count} Document{"s" if count != 1 else ""} Expiring Soon',
+            body='\n'.join(lines),
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            to=[self.agency.contact_email],
+        )
+
+
+class DeliveryReport:
+    def __init__(self):
+        self.sent = []
+        self.failed = []
+        self.skipped = []
+        self.elapsed = 0.0
+
+
+def unwarned(documents):
+    already_sent = DocumentExpiryNotification.objects.filter(
+        document=OuterRef('pk'),
+        expiry_date=OuterRef('expiry_date'),
+    )
+    return documents.filter(
+        ~Exists(already_sent)
+    ).select_related('nurse__agency').order_by('nurse__agency_id', 'expiry_date', 'id')
+
+
+def pending_documents(days, today=None):
+    """Documents expiring within ``days`` that no agency has been warned about yet."""
+    today = today or timezone.now().date()
+    return unwarned(NurseDocument.objects.filter(
+        expiry_date__gt=today,
+        expiry_date__lte=today + timedelta(days=days),
+    ))
+
+
+def build_digests(documents):
+    return [
+        Digest(agency_documents[0].nurse.agency, agency_documents)
+        for agency_documents in (
+            list(group) for _, group in groupby(documents.iterator(), key=lambda d: d.nurse.agency_id)
+        )
+    ]
+
+
+def _send_batch(digests):
+    sent, failed = [], []
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception:
+        return sent, list(digests)
+    try:
+        for digest in digests:
+            try:
+                connection.send_messages([digest.message()])
+            except Exception:
+                failed.append(digest)
+            else:
+                sent.append(digest)
+    finally:
+        connection.close()
+    return sent, failed
+
+
+def send_digests(digests, workers=DEFAULT_WORKERS):
+    """
+    Send ``digests`` over ``workers`` pooled mail connections and record
+    every successful one in the ledger.
+    """
+    report = DeliveryReport()
+    started = time.perf_counter()
+    deliverable = []
+    for digest in digests:
+        (deliverable if digest.agency.contact_email else report.skipped).append(digest)
+
+    workers = max(1, min(workers, len(deliverable)))
+    batches = [deliverable[i::workers] for i in range(workers)]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for sent, failed in pool.map(_send_batch, batches):
+            record_sent(sent)
+            report.sent.extend(sent)
+            report.failed.extend(failed)
+    report.elapsed = time.perf_counter() - started
+    return report
+
+
+def queue_digests(digests):
+    """Queue a send_digest job per agency; returns (queued, skipped for want of an email address)."""
+    queued, skipped = [], []
+    for digest in digests:
+        if not digest.agency.contact_email:
+            skipped.append(digest)
+            continue
+        jobs.enqueue(send_digest, digest.agency.pk, [document.pk for document in digest.documents])
+        queued.append(digest)
+    return queued, skipped
+
+
+@jobs.task
+def send_digest(agency_id, document_ids):
+    agency = Agency.objects.get(pk=agency_id)
+    if not agency.contact_email:
+        return
+    # Another job may have queued, or sent, some of these already. The
+    # ledger's unique_together lets only one job reserve each document.
+    reserved = {}
+    for document in unwarned(NurseDocument.objects.filter(pk__in=document_ids, nurse__agency_id=agency_id)):
+        try:
+            with transaction.atomic():
+                reserved[document] = DocumentExpiryNotification.objects.create(
+                    document=document, agency=agency, expiry_date=document.expiry_date
+                )
+        except IntegrityError:
+            continue
+    if not reserved:
+        return
+    try:
+        Digest(agency, list(reserved)).message().send()
+    except Exception:
+        # Release the documents so the retry can reserve them again.
+        DocumentExpiryNotification.objects.filter(pk__in=[row.pk for row in reserved.values()]).delete()
+        raise
+
+
+def record_sent(digests):
+    DocumentExpiryNotification.objects.bulk_create(
+        [
+            DocumentExpiryNotification(
+                document=document, agency=digest.agency, expiry_date=document.expiry_date
+            )
+            for digest in digests
+            for document in digest.documents
+        ],
+        ignore_conflicts=True,
+    )
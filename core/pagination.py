@@ -0,0 +1,144 @@
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Max, Q
+from django.utils.functional import cached_property
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+class KeysetPaginator:
+    """
+    Cursor pagination over a fixed, unique ordering.
+
+    Unlike Django's ``Paginator`` this never runs ``COUNT(*)`` or ``OFFSET``:
+    each page is a single indexed range query starting after the last row of
+    the previous page, so page N costs the same as page 1.
+    """
+
+    def __init__(self, queryset, ordering, page_size=50):
+        self.queryset = queryset.order_by(*ordering)
+        self.ordering = ordering
+        self.page_size = page_size
+
+    def encode_cursor(self, obj):
+        values = [_serialize(getattr(obj, field)) for field in self.ordering]
+        return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+    def decode_cursor(self, cursor):
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except (ValueError, TypeError):
+            return None
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            return None
+        # Convert each value as its field would, so that a tampered cursor is
+        # treated like a malformed one instead of failing in the query.
+        fields = [self.queryset.model._meta.get_field(field) for field in self.ordering]
+        try:
+            values = [field.to_python(value) for field, value in zip(fields, values)]
+        except (ValidationError, TypeError, ValueError):
+            return None
+        if None in values:
+            return None
+        return values
+
+    def after(self, values):
+        # Lexicographic "row > cursor" expanded into OR-ed prefixes:
+        # (a > x) OR (a = x AND b > y) OR (a = x AND b = y AND c > z)
+        condition = Q()
+        for i, field in enumerate(self.ordering):
+            prefix = {f: values[j] for j, f in enumerate(self.ordering[:i])}
+            condition |= Q(**prefix, **{f'{field}__gt': values[i]})
+        return condition
+
+    def page_queryset(self, cursor=None):
+        queryset = self.queryset
+        values = self.decode_cursor(cursor) if cursor else None
+        if values is not None:
+            queryset = queryset.filter(self.after(values))
+        return queryset[:self.page_size + 1]
+
+    def get_page(self, cursor=None):
+        return self.make_page(list(self.page_queryset(cursor)))
+
+    async def aget_page(self, cursor=None):
+        return self.make_page([row async for row in self.page_queryset(cursor)])
+
+    def make_page(self, rows):
+        next_cursor = None
+        if len(rows) > self.page_size:
+            rows = rows[:self.page_size]
+            next_cursor = self.encode_cursor(rows[-1])
+        return KeysetPage(rows, next_cursor)
+
+
+def estimated_count(model, using='default'):
+    """
+    Roughly how many rows ``model``'s table holds, without counting them, or
+    None when the database keeps no estimate. On SQLite this is the highest
+    primary key, which overstates the count by however many rows were deleted.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [table])
+            row = cursor.fetchone()
+        # reltuples is -1 for a table that has never been analyzed.
+        return row[0] if row and row[0] >= 0 else None
+    if connection.vendor == 'mysql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT table_rows FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s',
+                [table]
+            )
+            row = cursor.fetchone()
+        return row[0] if row else None
+    if connection.vendor == 'sqlite' and model._meta.pk.get_internal_type() in ('AutoField', 'BigAutoField'):
+        return model._default_manager.using(using).aggregate(highest=Max('pk'))['highest'] or 0
+    return None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    A ``Paginator`` for admin changelists over tables too big to ``COUNT(*)``.
+
+    An unfiltered list of a big table takes its count from
+    ``estimated_count``; a filtered one counts at most ``count_limit`` rows, so
+    only the first ``count_limit`` results can be paged to. Small results are
+    counted exactly.
+    """
+    count_limit = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_count(queryset.model, queryset.db)
+            if estimate is not None and estimate > self.count_limit:
+                return estimate
+        return queryset.order_by()[:self.count_limit].count()
+
+
+def _serialize(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
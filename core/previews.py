@@ -0,0 +1,59 @@
+"""
+Thumbnail previews of uploaded documents.
+
+Decoding and resizing an image is far slower than storing it, so previews are
+made by a background job (see core.jobs), never on the request thread. A
+preview is named after the document's checksum and shared by every document
+with the same content, like the file itself. Pillow cannot rasterise PDFs,
+so those simply have no preview.
+"""
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from PIL import Image
+
+from . import jobs
+from .models import NurseDocument
+
+PREVIEW_SIZE = (320, 320)
+
+
+def schedule(document_id):
+    jobs.enqueue(generate, document_id)
+
+
+def preview_name(digest):
+    return f'document_previews/{digest[:2]}/{digest}.png'
+
+
+def render(fileobj):
+    """PNG bytes of a thumbnail of an image file, or None if it is not an image."""
+    try:
+        with Image.open(fileobj) as image:
+            # Lets the JPEG decoder downscale while decoding instead of afterwards.
+            image.draft('RGB', PREVIEW_SIZE)
+            image.thumbnail(PREVIEW_SIZE)
+            if image.mode not in ('RGB', 'RGBA', 'L'):
+                image = image.convert('RGB')
+            output = BytesIO()
+            image.save(output, format='PNG', optimize=True)
+            return output.getvalue()
+    except (OSError, Image.DecompressionBombError):
+        return None
+
+
+@jobs.task
+def generate(document_id):
+    document = NurseDocument.objects.filter(pk=document_id).exclude(checksum='').first()
+    if document is None:
+        return None
+    name = preview_name(document.checksum)
+    storage = document.preview.storage
+    if not storage.exists(name):
+        with document.file_url.open('rb') as fileobj:
+            png = render(fileobj)
+        if png is None:
+            return None
+        storage.save(name, ContentFile(png))
+    NurseDocument.objects.filter(checksum=document.checksum).update(preview=name)
+    return name
@@ -0,0 +1,190 @@
+"""
+Read replicas for listing and reporting traffic.
+
+Replicas are the DATABASES aliases named in ``settings.DATABASE_REPLICAS``.
+Nothing reads from them by default: a view opts in with ``@replica_reads``,
+and ``ReplicaRouter`` then sends the ORM's reads for that request (and for a
+streamed response body) to one replica. Every write goes to ``default``.
+
+Three things send a replica-reading request back to the primary:
+
+* stickiness: ``replica_middleware`` sets a short-lived cookie on any
+  response whose request wrote to the database, so the user who just booked
+  a shift sees it on the next page even before the replicas have it;
+* lag: a replica whose ``ReplicaHeartbeat`` is older than ``REPLICA_MAX_LAG``
+  seconds is skipped, as is one that cannot be reached. Health is checked at
+  most every ``REPLICA_HEALTH_CHECK_INTERVAL`` seconds per process;
+* no healthy replica at all.
+
+The heartbeat is written on the primary by ``sync_replicas`` and reaches the
+replicas the same way any other row does. For local testing with SQLite,
+``sync_replicas`` also copies the primary file over each replica's.
+"""
+import asyncio
+import contextvars
+import functools
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.decorators import sync_and_async_middleware
+
+from .models import ReplicaHeartbeat
+
+PIN_COOKIE = 'primary_until'
+
+
+class _RequestState:
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.wrote = False
+
+
+# Per request (or per thread outside requests); the state object is mutable so
+# a write made in a sync_to_async thread is seen by the middleware.
+_request = contextvars.ContextVar('replica_request', default=None)
+_read_alias = contextvars.ContextVar('replica_read_alias', default=None)
+
+_health = {}
+_health_lock = threading.Lock()
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def replica_lag(alias):
+    """Seconds since the replica's last heartbeat, or None if it is unreachable or has none."""
+    try:
+        beat_at = ReplicaHeartbeat.objects.using(alias).values_list('beat_at', flat=True).first()
+    except DatabaseError:
+        return None
+    if beat_at is None:
+        return None
+    return (timezone.now() - beat_at).total_seconds()
+
+
+def beat():
+    """Stamp the heartbeat on the primary."""
+    ReplicaHeartbeat.objects.update_or_create(pk=1, defaults={'beat_at': timezone.now()})
+
+
+def is_healthy(alias):
+    now = time.monotonic()
+    with _health_lock:
+        checked = _health.get(alias)
+    if checked and now - checked[0] < _setting('REPLICA_HEALTH_CHECK_INTERVAL', 5):
+        return checked[1]
+    lag = replica_lag(alias)
+    healthy = lag is not None and lag <= _setting('REPLICA_MAX_LAG', 30)
+    with _health_lock:
+        _health[alias] = (now, healthy)
+    return healthy
+
+
+def reset_health():
+    with _health_lock:
+        _health.clear()
+
+
+def choose_read_alias():
+    state = _request.get()
+    if state is not None and state.pinned:
+        return DEFAULT_DB_ALIAS
+    healthy = [alias for alias in _setting('DATABASE_REPLICAS', []) if is_healthy(alias)]
+    return random.choice(healthy) if healthy else DEFAULT_DB_ALIAS
+
+
+@contextmanager
+def reading_from(alias):
+    token = _read_alias.set(alias)
+    try:
+        yield alias
+    finally:
+        _read_alias.reset(token)
+
+
+def _stream_from(alias, content):
+    # A streamed body is iterated after the view has returned, so each chunk
+    # is produced with the replica selected again.
+    iterator = iter(content)
+    while True:
+        with reading_from(alias):
+            try:
+                chunk = next(iterator)
+            except StopIteration:
+                return
+        yield chunk
+
+
+def replica_reads(view):
+    """Let a read-only view's queries go to a replica."""
+    if asyncio.iscoroutinefunction(view):
+        @functools.wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            # The health check may query the replicas.
+            with reading_from(await sync_to_async(choose_read_alias)()):
+                return await view(request, *args, **kwargs)
+        return async_wrapper
+
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        with reading_from(choose_read_alias()) as alias:
+            response = view(request, *args, **kwargs)
+        if isinstance(response, StreamingHttpResponse) and not response.is_async:
+            response.streaming_content = _stream_from(alias, response.streaming_content)
+        return response
+    return wrapper
+
+
+@sync_and_async_middleware
+def replica_middleware(get_response):
+    def start(request):
+        try:
+            pinned = float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+        except ValueError:
+            pinned = False
+        state = _RequestState(pinned)
+        return state, _request.set(state)
+
+    def finish(response, state, token):
+        _request.reset(token)
+        if state.wrote:
+            seconds = _setting('REPLICA_STICKY_SECONDS', 10)
+            response.set_cookie(PIN_COOKIE, str(time.time() + seconds), max_age=seconds, httponly=True, samesite='Lax')
+        return response
+
+    if asyncio.iscoroutinefunction(get_response):
+        async def middleware(request):
+            state, token = start(request)
+            return finish(await get_response(request), state, token)
+    else:
+        def middleware(request):
+            state, token = start(request)
+            return finish(get_response(request), state, token)
+    return middleware
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return _read_alias.get() or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = _request.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Replicas get their schema by replication (or sync_replicas), not migrate.
+        return db == DEFAULT_DB_ALIAS
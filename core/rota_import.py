@@ -0,0 +1,169 @@
+"""
+Bulk import of shifts from a hospital's rostering system.
+
+Rows are parsed lazily from CSV, NDJSON or a JSON array, validated with the
+fields of ``ShiftImportRowForm`` and ``Shift.clean`` (the same rules as the
+single-shift form) and written with ``bulk_create`` one batch at a time, so
+only a single batch of rows is ever held in memory.
+"""
+import csv
+import io
+import json
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from . import eligibility, search, shift_calendar, shift_events, stats
+from .forms import ShiftImportRowForm
+from .models import Shift
+
+BATCH_SIZE = 500
+READ_SIZE = 64 * 1024
+SEPARATORS = ' \t\r\n,'
+
+
+class RotaFormatError(ValueError):
+    pass
+
+
+class ImportReport:
+    def __init__(self):
+        self.created = 0
+        self.errors = []
+        self.format_error = None
+
+    @property
+    def rows(self):
+        return self.created + len(self.errors)
+
+    def add_error(self, row_number, errors):
+        self.errors.append((row_number, errors))
+
+
+def detect_format(filename):
+    name = (filename or '').lower()
+    if name.endswith('.csv'):
+        return 'csv'
+    if name.endswith(('.json', '.ndjson', '.jsonl')):
+        return 'json'
+    raise RotaFormatError('Cannot tell the file format from its name; choose CSV or JSON.')
+
+
+def iter_rows(fileobj, fmt):
+    """Yield one dict per rota row from a binary file object."""
+    if fmt not in ('csv', 'json'):
+        raise RotaFormatError(f'Unsupported rota format: {fmt}')
+    text = io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='')
+    rows = csv.DictReader(text) if fmt == 'csv' else _iter_json(text)
+    try:
+        yield from rows
+    except (csv.Error, UnicodeDecodeError) as exc:
+        raise RotaFormatError(f'Could not read rota file: {exc}') from exc
+
+
+def _iter_json(text):
+    # Accepts either a top-level array of objects or one object per line,
+    # decoding incrementally so the whole document is never in memory.
+    decoder = json.JSONDecoder()
+    buffer, pos, eof = '', 0, False
+    in_array = None
+    while True:
+        while True:
+            while pos < len(buffer) and buffer[pos] in SEPARATORS:
+                pos += 1
+            if pos < len(buffer) or eof:
+                break
+            chunk = text.read(READ_SIZE)
+            buffer, pos, eof = chunk, 0, not chunk
+        if pos == len(buffer):
+            if in_array:
+                raise RotaFormatError('Unterminated JSON array in rota file')
+            return
+
+        char = buffer[pos]
+        if in_array is None:
+            in_array = char == '['
+            if in_array:
+                pos += 1
+                continue
+        if in_array and char == ']':
+            return
+        if char != '{':
+            raise RotaFormatError('Each rota entry must be a JSON object')
+
+        while True:
+            try:
+                value, pos = decoder.raw_decode(buffer, pos)
+                break
+            except json.JSONDecodeError:
+                if eof:
+                    raise RotaFormatError('Malformed or truncated JSON in rota file')
+                chunk = text.read(READ_SIZE)
+                buffer, pos, eof = buffer[pos:] + chunk, 0, not chunk
+        yield value
+
+
+def validate_row(row, hospital):
+    """
+    Return ``(shift, errors)`` for one row.
+
+    Equivalent to binding a ShiftImportRowForm, but reuses the form's field
+    instances instead of deep-copying them for every row, which dominates the
+    cost of a large import.
+    """
+    cleaned, errors = {}, {}
+    for name, field in ShiftImportRowForm.base_fields.items():
+        try:
+            cleaned[name] = field.clean(row.get(name))
+        except ValidationError as exc:
+            errors[name] = list(exc.messages)
+    if errors:
+        return None, errors
+
+    for name in ('duration_hours', 'rate_per_hour'):
+        if cleaned[name] is None:
+            cleaned[name] = Shift._meta.get_field(name).get_default()
+    shift = Shift(hospital=hospital, **cleaned)
+    try:
+        shift.clean()
+    except ValidationError as exc:
+        return None, {field: list(messages) for field, messages in exc.message_dict.items()}
+    shift.set_window()
+    return shift, None
+
+
+def import_rota(hospital, rows, batch_size=BATCH_SIZE):
+    """
+    Validate and insert ``rows``, returning an ImportReport. Valid rows are
+    kept even when others fail; a file that stops parsing part-way keeps the
+    rows before the fault and records it in ``report.format_error``.
+    """
+    report = ImportReport()
+    batch = []
+    try:
+        for row_number, row in enumerate(rows, start=1):
+            shift, errors = validate_row(row, hospital)
+            if errors:
+                report.add_error(row_number, errors)
+                continue
+            batch.append(shift)
+            if len(batch) >= batch_size:
+                report.created += _save_batch(batch)
+                batch = []
+    except RotaFormatError as exc:
+        report.format_error = str(exc)
+    if batch:
+        report.created += _save_batch(batch)
+    return report
+
+
+def _save_batch(shifts):
+    with transaction.atomic():
+        created = Shift.objects.bulk_create(shifts)
+        # bulk_create skips post_save, so do the signal handlers' work here.
+        eligibility.sync_shifts(Shift.objects.filter(id__in=[shift.id for shift in created]))
+        search.index(Shift, [shift.id for shift in created])
+        stats.invalidate(hospitals=[shifts[0].hospital_id], platform=True)
+        shift_calendar.touch(hospitals=[shifts[0].hospital_id])
+        shift_events.shifts_opened(Shift.objects.filter(id__in=[shift.id for shift in created]))
+    return len(created)
@@ -0,0 +1,213 @@
+"""
+Full-text search over nurses, shifts and agencies.
+
+On SQLite every searchable model has an FTS5 table (migration 0010) whose
+rowid is the model's primary key, so keeping an entry current is a delete
+and an insert by rowid. The signal handlers in ``core.signals`` index single
+saves and deletes; code that writes with ``bulk_create`` calls ``index``
+itself, and ``rebuild_search_index`` repopulates the tables from scratch.
+
+Queries are split into words and every word must match the start of a word
+in the entry, so "smi" finds Smith and "po0012" finds PO0012345. Numbers such
+as NMC registrations and PO numbers are single words and are found through
+the FTS index like names are, without a LIKE scan of the table. Results can
+be ranked with bm25, weighted towards names and reference numbers; ranking
+is done inside the FTS query, which then returns only the best matches.
+
+Other databases have no FTS5 tables, and searching falls back to
+``icontains`` over the same fields.
+"""
+import re
+
+from django.core.exceptions import EmptyResultSet
+from django.db import connections, router
+from django.db.models import Case, Q, When
+from django.db.models.expressions import RawSQL
+
+from .models import Agency, Nurse, Shift
+
+BATCH_SIZE = 2000
+# Ranked searches show at most this many of the best matches.
+RANKED_LIMIT = 200
+
+
+class Index:
+    def __init__(self, model, table, fields):
+        self.model = model
+        self.table = table
+        # FTS column -> (ORM lookup, bm25 weight)
+        self.fields = fields
+
+    @property
+    def lookups(self):
+        return [lookup for lookup, _ in self.fields.values()]
+
+    @property
+    def weights(self):
+        return ', '.join(str(weight) for _, weight in self.fields.values())
+
+
+INDEXES = {
+    Nurse: Index(Nurse, 'core_nurse_search', {
+        'full_name': ('full_name', 10.0),
+        'registration_number': ('registration_number', 10.0),
+        'specialty': ('specialty', 1.0),
+    }),
+    Shift: Index(Shift, 'core_shift_search', {
+        'po_number': ('po_number', 10.0),
+        'ward': ('ward', 5.0),
+        'specialty': ('specialty_required', 1.0),
+        'hospital': ('hospital__name', 2.0),
+    }),
+    Agency: Index(Agency, 'core_agency_search', {
+        'name': ('name', 10.0),
+        'registration_number': ('registration_number', 10.0),
+        'contact_email': ('contact_email', 2.0),
+    }),
+}
+
+def is_available(using):
+    """Whether ``using`` has the FTS5 tables, which migration 0010 creates on every SQLite database."""
+    return connections[using].vendor == 'sqlite'
+
+
+def match_expression(text):
+    """An FTS5 query requiring a prefix match of every word in ``text``, or None if it has no words."""
+    words = re.findall(r'\w+', text.casefold())
+    if not words:
+        return None
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def _fallback(index, text):
+    condition = Q()
+    for word in text.split():
+        condition &= Q(*[Q(**{f'{lookup}__icontains': word}) for lookup in index.lookups], _connector=Q.OR)
+    return condition
+
+
+def matching(model, text):
+    """The primary keys of ``model`` rows matching ``text``, for use as ``pk__in=`` (or ``nurse__in=``...)."""
+    index = INDEXES[model]
+    using = router.db_for_read(model)
+    if not is_available(using):
+        return model._default_manager.filter(_fallback(index, text)).values('pk')
+    expression = match_expression(text)
+    if expression is None:
+        return model._default_manager.none().values('pk')
+    return RawSQL(f'SELECT rowid FROM {index.table} WHERE {index.table} MATCH %s', [expression])
+
+
+def search_queryset(queryset, text, ranked=False):
+    """
+    Narrow ``queryset`` to the rows matching ``text``.
+
+    With ``ranked``, the best ``RANKED_LIMIT`` matches are looked up straight
+    away, in one query that has the FTS index rank them, and the queryset
+    returned holds just those, best first.
+    """
+    text = text.strip()
+    if not text:
+        return queryset
+    expression = match_expression(text)
+    if not (ranked and expression and is_available(queryset.db)):
+        return queryset.filter(pk__in=matching(queryset.model, text))
+    index = INDEXES[queryset.model]
+    try:
+        sql, params = _sql(queryset, 'pk')
+    except EmptyResultSet:
+        return queryset.none()
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(
+            # The unary + keeps FTS5 from probing the MATCH once per rowid in the subquery.
+            f'SELECT rowid FROM {index.table} WHERE {index.table} MATCH %s AND +rowid IN ({sql}) '
+            f'ORDER BY bm25({index.table}, {index.weights}) LIMIT %s',
+            [expression, *params, RANKED_LIMIT]
+        )
+        pks = [row[0] for row in cursor.fetchall()]
+    if not pks:
+        return queryset.none()
+    return queryset.filter(pk__in=pks).order_by(
+        Case(*[When(pk=pk, then=position) for position, pk in enumerate(pks)])
+    )
+
+
+def index(model, pks):
+    """(Re)index the rows of ``model`` with these primary keys; missing rows are removed."""
+    using = router.db_for_write(model)
+    if not is_available(using):
+        return
+    pks = list(pks)
+    with connections[using].cursor() as cursor:
+        for start in range(0, len(pks), BATCH_SIZE):
+            batch = pks[start:start + BATCH_SIZE]
+            _delete(cursor, INDEXES[model], batch)
+            _insert(cursor, model._base_manager.using(using).filter(pk__in=batch))
+
+
+def _sql(queryset, *fields):
+    return queryset.order_by().values_list(*fields).query.get_compiler(queryset.db).as_sql()
+
+
+def _insert(cursor, queryset):
+    entry = INDEXES[queryset.model]
+    sql, params = _sql(queryset, 'pk', *entry.lookups)
+    cursor.execute(f'INSERT INTO {entry.table} (rowid, {", ".join(entry.fields)}) {sql}', params)
+
+
+def remove(model, pks):
+    using = router.db_for_write(model)
+    if not is_available(using):
+        return
+    with connections[using].cursor() as cursor:
+        _delete(cursor, INDEXES[model], list(pks))
+
+
+def _delete(cursor, entry, pks):
+    if pks:
+        cursor.execute(f'DELETE FROM {entry.table} WHERE rowid IN ({", ".join(["%s"] * len(pks))})', pks)
+
+
+def index_queryset(queryset):
+    """(Re)index every row of ``queryset``, in two statements however many there are."""
+    using = router.db_for_write(queryset.model)
+    if not is_available(using):
+        return
+    queryset = queryset.using(using)
+    entry = INDEXES[queryset.model]
+    try:
+        sql, params = _sql(queryset, 'pk')
+    except EmptyResultSet:
+        return
+    with connections[using].cursor() as cursor:
+        cursor.execute(f'DELETE FROM {entry.table} WHERE rowid IN ({sql})', params)
+        _insert(cursor, queryset)
+
+
+def hospital_renamed(hospital):
+    """Reindex a hospital's shifts if their entries still carry an old name."""
+    using = router.db_for_write(Shift)
+    if not is_available(using):
+        return
+    shift_id = Shift.objects.using(using).filter(hospital=hospital).values_list('pk', flat=True).first()
+    if shift_id is None:
+        return
+    with connections[using].cursor() as cursor:
+        cursor.execute(f'SELECT hospital FROM {INDEXES[Shift].table} WHERE rowid = %s', [shift_id])
+        row = cursor.fetchone()
+    if row is None or row[0] != hospital.name:
+        index_queryset(Shift.objects.filter(hospital=hospital))
+
+
+def rebuild(models=None):
+    """Empty and repopulate the search tables; returns {model: rows indexed}."""
+    counts = {}
+    for model in models or INDEXES:
+        using = router.db_for_write(model)
+        if not is_available(using):
+            continue
+        with connections[using].cursor() as cursor:
+            cursor.execute(f'DELETE FROM {INDEXES[model].table}')
+            _insert(cursor, model._base_manager.using(using).all())
+            counts[model] = cursor.rowcount
+    return counts
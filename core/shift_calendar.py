@@ -0,0 +1,93 @@
+"""
+A hospital's shifts over a window of weeks, grouped by day and ward.
+
+Ward screens and rota tools poll the calendar, so its responses are
+validated rather than rebuilt: every hospital carries ``shifts_version`` and
+``shifts_changed_at``, which ``touch`` moves on whenever one of its shifts or
+bookings changes, and the views derive their ETag and Last-Modified from
+them. A poll that finds nothing changed costs the lookup of the hospital row
+and a 304; anything else is one range scan over ``shift_hospital_date_idx``.
+
+The signal handlers in ``core.signals`` touch the hospital for single saves
+and deletes; code that writes shifts with ``bulk_create`` or ``update()``
+calls ``touch`` itself.
+"""
+from datetime import timedelta
+from itertools import groupby
+
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Hospital, Shift
+
+DEFAULT_WEEKS = 2
+MAX_WEEKS = 6
+
+FIELDS = (
+    'id', 'shift_date', 'shift_time', 'ward', 'specialty_required', 'po_number',
+    'duration_hours', 'rate_per_hour', 'status', 'booking__nurse__full_name',
+)
+
+
+def touch(hospitals=(), shifts=()):
+    """Record a change to the shifts of these hospitals, or of the hospitals of these shifts."""
+    changes = {'shifts_version': F('shifts_version') + 1, 'shifts_changed_at': timezone.now()}
+    if hospitals:
+        Hospital.objects.filter(pk__in=hospitals).update(**changes)
+    if shifts:
+        Hospital.objects.filter(pk__in=Shift.objects.filter(pk__in=shifts).values('hospital_id')).update(**changes)
+
+
+def window(start=None, weeks=None):
+    """The first and last day of a calendar of ``weeks`` weeks from ``start`` (today by default)."""
+    start = start or timezone.localdate()
+    return start, start + timedelta(days=7 * (weeks or DEFAULT_WEEKS) - 1)
+
+
+def calendar_days(hospital_id, start, end):
+    """
+    Every day from ``start`` to ``end``, each as {'date', 'wards'} with the
+    day's shifts grouped under {'ward', 'shifts'} in ward order.
+    """
+    rows = Shift.objects.filter(
+        hospital_id=hospital_id, shift_date__range=(start, end)
+    ).order_by('shift_date', 'ward', 'shift_time', 'id').values(*FIELDS)
+    by_date = {
+        date: [
+            {'ward': ward or '', 'shifts': list(shifts)}
+            for ward, shifts in groupby(day, key=lambda row: row['ward'] or '')
+        ]
+        for date, day in groupby(rows, key=lambda row: row['shift_date'])
+    }
+    return [
+        {'date': start + timedelta(days=i), 'wards': by_date.get(start + timedelta(days=i), [])}
+        for i in range((end - start).days + 1)
+    ]
+
+
+def as_json(days):
+    return [
+        {
+            'date': day['date'].isoformat(),
+            'wards': [
+                {
+                    'ward': ward['ward'],
+                    'shifts': [
+                        {
+                            'id': shift['id'],
+                            'time': shift['shift_time'].strftime('%H:%M'),
+                            'duration_hours': str(shift['duration_hours']),
+                            'specialty': shift['specialty_required'] or '',
+                            'po_number': shift['po_number'] or '',
+                            'rate_per_hour': str(shift['rate_per_hour']),
+                            'status': shift['status'],
+                            'nurse': shift['booking__nurse__full_name'],
+                        }
+                        for shift in ward['shifts']
+                    ],
+                }
+                for ward in day['wards']
+            ],
+        }
+        for day in days
+    ]
@@ -0,0 +1,291 @@
+"""
+Shift-opened and shift-booked events, pushed to agencies as Server-Sent Events.
+
+Agencies used to find new shifts by reloading ``available_shifts`` every few
+seconds. The stream at ``/available-shifts/stream/`` tells them instead: a
+connection subscribes to the trusts its agency is approved for, and is sent
+an event when one of their hospitals opens a shift or a shift is booked.
+
+Each process has one broker, which fans events out to all of its
+connections. A connection is a coroutine waiting on a small queue, so an
+idle one costs a few kilobytes and no thread; the broker indexes
+subscriptions by trust, so an event only touches the connections that can
+see it. Two brokers are available (``settings.SHIFT_EVENTS_BROKER``):
+
+* ``database``: events are written to the ``ShiftEvent`` outbox in the same
+  transaction as the change, and a thread in every process serving streams
+  polls the table once a second. Any process can publish, whatever its
+  server, and a client that reconnects with ``Last-Event-ID`` is sent what
+  it missed.
+* ``memory``: events are handed straight to this process's connections when
+  the transaction commits. Nothing is stored; for local testing.
+
+Streams end after ``STREAM_SECONDS``, and browsers reconnect by themselves,
+so a connection's trusts are never more than that out of date.
+"""
+import asyncio
+import itertools
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import Shift, ShiftEvent
+
+logger = logging.getLogger(__name__)
+
+# Events a slow connection may have waiting before it is dropped; it will
+# reconnect and, with the database broker, catch up from the outbox.
+QUEUE_SIZE = 100
+KEEPALIVE_SECONDS = 15
+STREAM_SECONDS = 300
+RETRY_MILLISECONDS = 3000
+POLL_SECONDS = 1
+REPLAY_LIMIT = 500
+RETENTION = timedelta(hours=1)
+PRUNE_SECONDS = 60
+
+
+class Event:
+    def __init__(self, id, kind, trust_id, data):
+        self.id = id
+        self.kind = kind
+        self.trust_id = trust_id
+        self.data = data
+
+    def encode(self):
+        return f'id: {self.id}\nevent: shift-{self.kind}\ndata: {json.dumps(self.data)}\n\n'
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(row.id, row.kind, row.trust_id, row.data)
+
+
+# Sent when a client has missed more than can be replayed: reload the page.
+RESET = 'event: shift-reset\ndata: {}\n\n'
+
+
+class Subscription:
+    def __init__(self, trusts):
+        self.trusts = frozenset(trusts)
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(QUEUE_SIZE)
+        self.overflowed = False
+
+    def deliver(self, event):
+        # Runs on the subscription's own event loop.
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+
+class Broker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_trust = defaultdict(set)
+        self._count = 0
+
+    def subscribe(self, trusts):
+        """Start receiving events for these trusts; call from the connection's event loop."""
+        subscription = Subscription(trusts)
+        with self._lock:
+            for trust_id in subscription.trusts:
+                self._by_trust[trust_id].add(subscription)
+            self._count += 1
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for trust_id in subscription.trusts:
+                subscribers = self._by_trust[trust_id]
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._by_trust[trust_id]
+            self._count -= 1
+
+    @property
+    def subscriber_count(self):
+        return self._count
+
+    def fan_out(self, events):
+        """Queue each event for every subscription to its trust. Safe from any thread."""
+        for event in events:
+            with self._lock:
+                subscribers = list(self._by_trust.get(event.trust_id, ()))
+            for subscription in subscribers:
+                try:
+                    subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+                except RuntimeError:
+                    # The connection's loop has closed under it.
+                    pass
+
+
+class MemoryBroker(Broker):
+    def __init__(self):
+        super().__init__()
+        self._ids = itertools.count(1)
+
+    def publish(self, kind, rows):
+        """Announce ``rows`` of (shift id, trust id, data) once the current transaction commits."""
+        events = [Event(next(self._ids), kind, trust_id, data) for _, trust_id, data in rows]
+        transaction.on_commit(lambda: self.fan_out(events))
+
+    def replay(self, trusts, after):
+        # Nothing is kept to replay.
+        return []
+
+
+class DatabaseBroker(Broker):
+    def __init__(self):
+        super().__init__()
+        self._tailer = None
+        self.last_id = None
+
+    def publish(self, kind, rows):
+        ShiftEvent.objects.bulk_create([
+            ShiftEvent(kind=kind, shift_id=shift_id, trust_id=trust_id, data=data)
+            for shift_id, trust_id, data in rows
+        ])
+
+    def subscribe(self, trusts):
+        subscription = super().subscribe(trusts)
+        with self._lock:
+            if self._tailer is None:
+                self._tailer = threading.Thread(target=self._tail, name='shift-events', daemon=True)
+                self._tailer.start()
+        return subscription
+
+    def replay(self, trusts, after):
+        """Events for ``trusts`` after id ``after``, or None if there are too many to replay."""
+        rows = list(
+            ShiftEvent.objects.filter(id__gt=after, trust_id__in=trusts).order_by('id')[:REPLAY_LIMIT + 1]
+        )
+        if len(rows) > REPLAY_LIMIT:
+            return None
+        return [Event.from_row(row) for row in rows]
+
+    def poll(self):
+        """Fan out the events written since the last poll; returns how many there were."""
+        if self.last_id is None:
+            self.last_id = ShiftEvent.objects.aggregate(last=Max('id'))['last'] or 0
+            return 0
+        events = [Event.from_row(row) for row in ShiftEvent.objects.filter(id__gt=self.last_id).order_by('id')]
+        if events:
+            self.last_id = events[-1].id
+            self.fan_out(events)
+        return len(events)
+
+    def prune(self):
+        return ShiftEvent.objects.filter(created_at__lt=timezone.now() - RETENTION).delete()[0]
+
+    def _tail(self):
+        # One thread per process, however many connections; it stops when
+        # the last one goes and the next subscribe starts another.
+        pruned = 0
+        try:
+            while True:
+                with self._lock:
+                    if not self._count:
+                        self._tailer = None
+                        self.last_id = None
+                        return
+                try:
+                    close_old_connections()
+                    self.poll()
+                    if time.monotonic() - pruned > PRUNE_SECONDS:
+                        self.prune()
+                        pruned = time.monotonic()
+                except Exception:
+                    logger.exception('Polling shift events failed')
+                time.sleep(POLL_SECONDS)
+        finally:
+            connection.close()
+
+
+BROKERS = {
+    'database': DatabaseBroker,
+    'memory': MemoryBroker,
+}
+_brokers = {}
+_brokers_lock = threading.Lock()
+
+
+def get_broker():
+    name = settings.SHIFT_EVENTS_BROKER
+    with _brokers_lock:
+        if name not in _brokers:
+            _brokers[name] = BROKERS[name]()
+        return _brokers[name]
+
+
+def shifts_opened(shifts):
+    """Announce a queryset of newly opened shifts to the agencies that can book them."""
+    rows = shifts.filter(status=Shift.Status.OPEN).values(
+        'id', 'hospital__trust_id', 'hospital__name', 'ward', 'specialty_required',
+        'shift_date', 'shift_time', 'duration_hours', 'rate_per_hour',
+    )
+    _publish(ShiftEvent.Kind.OPENED, [
+        (row['id'], row['hospital__trust_id'], {
+            'shift': row['id'],
+            'hospital': row['hospital__name'],
+            'ward': row['ward'] or '',
+            'specialty': row['specialty_required'] or '',
+            'date': row['shift_date'].isoformat(),
+            'time': row['shift_time'].strftime('%H:%M'),
+            'duration_hours': str(row['duration_hours']),
+            'rate_per_hour': str(row['rate_per_hour']),
+        })
+        for row in rows
+    ])
+
+
+def shifts_booked(shift_ids):
+    rows = Shift.objects.filter(pk__in=shift_ids).values_list('id', 'hospital__trust_id')
+    _publish(ShiftEvent.Kind.BOOKED, [(shift_id, trust_id, {'shift': shift_id}) for shift_id, trust_id in rows])
+
+
+def _publish(kind, rows):
+    if rows:
+        get_broker().publish(kind, rows)
+
+
+async def stream(trusts, last_event_id=None, lifetime=STREAM_SECONDS):
+    """The body of an event stream: events for ``trusts`` until ``lifetime`` runs out."""
+    broker = get_broker()
+    subscription = broker.subscribe(trusts)
+    try:
+        yield f'retry: {RETRY_MILLISECONDS}\n\n'
+        # Subscribed first, so nothing falls between the replay and the queue.
+        last = 0
+        if last_event_id and last_event_id.isdigit():
+            missed = await sync_to_async(broker.replay)(subscription.trusts, int(last_event_id))
+            if missed is None:
+                yield RESET
+                return
+            for event in missed:
+                last = event.id
+                yield event.encode()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + lifetime
+        while not subscription.overflowed:
+            timeout = min(KEEPALIVE_SECONDS, deadline - loop.time())
+            if timeout <= 0:
+                return
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), timeout)
+            except asyncio.TimeoutError:
+                yield ': keep-alive\n\n'
+                continue
+            if event.id > last:
+                yield event.encode()
+    finally:
+        broker.unsubscribe(subscription)
@@ -0,0 +1,220 @@
+from django.contrib.auth.signals import user_logged_in, user_login_failed
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import billing, compliance, eligibility, fragments, previews, search, shift_calendar, shift_events, stats, throttle
+from .models import (
+    NHSTrust, Hospital, Agency, TrustAgencyAccess, Nurse, NurseDocument, Shift, Booking
+)
+
+
+@receiver(post_save, sender=Shift)
+def shift_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        eligibility.sync_shift(instance)
+
+
+@receiver(post_save, sender=Shift)
+def shift_window_saved(sender, instance, created, raw=False, **kwargs):
+    # Bookings carry a copy of their shift's times for the overlap check.
+    if not raw and not created:
+        Booking.objects.filter(shift_id=instance.pk).update(starts_at=instance.starts_at, ends_at=instance.ends_at)
+
+
+@receiver(post_save, sender=Hospital)
+def hospital_saved(sender, instance, created, raw=False, **kwargs):
+    if not raw and not created:
+        eligibility.sync_hospital(instance)
+
+
+@receiver(post_save, sender=TrustAgencyAccess)
+def access_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        eligibility.sync_access(instance)
+
+
+@receiver(post_delete, sender=TrustAgencyAccess)
+def access_deleted(sender, instance, **kwargs):
+    eligibility.revoke_access(instance)
+
+
+@receiver([post_save, post_delete], sender=NurseDocument)
+def document_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        compliance.refresh_nurse(instance.nurse_id)
+
+
+@receiver(post_save, sender=NurseDocument)
+def document_saved(sender, instance, created, raw=False, **kwargs):
+    if not raw and created and instance.checksum:
+        previews.schedule(instance.pk)
+
+
+# Login throttling
+
+# record_login() sets last_login along with last_login_ip in a single UPDATE.
+user_logged_in.disconnect(dispatch_uid='update_last_login')
+
+
+@receiver(user_logged_in)
+def login_succeeded(sender, request, user, **kwargs):
+    throttle.record_login(user, throttle.client_ip(request))
+
+
+@receiver(user_login_failed)
+def login_failed(sender, credentials, request=None, **kwargs):
+    throttle.record_failure(credentials.get('username'), throttle.client_ip(request))
+
+
+# Dashboard statistics
+
+@receiver([post_save, post_delete], sender=Shift)
+def shift_changed_stats(sender, instance, created=False, **kwargs):
+    agencies = [] if created else list(
+        Booking.objects.filter(shift_id=instance.pk).values_list('agency_id', flat=True)
+    )
+    stats.invalidate(hospitals=[instance.hospital_id], agencies=agencies, platform=True)
+
+
+@receiver([post_save, post_delete], sender=Booking)
+def booking_changed_stats(sender, instance, **kwargs):
+    # Bookings are made by claiming the shift with QuerySet.update(), which
+    # sends no Shift signal, so the hospital's counts are dropped from here.
+    hospitals = Shift.objects.filter(pk=instance.shift_id).values_list('hospital_id', flat=True)
+    stats.invalidate(hospitals=list(hospitals), agencies=[instance.agency_id], platform=True)
+
+
+@receiver([post_save, post_delete], sender=Nurse)
+def nurse_changed_stats(sender, instance, **kwargs):
+    stats.invalidate(agencies=[instance.agency_id], platform=True)
+
+
+@receiver([post_save, post_delete], sender=NurseDocument)
+def document_changed_stats(sender, instance, **kwargs):
+    agencies = Nurse.objects.filter(pk=instance.nurse_id).values_list('agency_id', flat=True)
+    stats.invalidate(agencies=list(agencies))
+
+
+@receiver([post_save, post_delete], sender=NHSTrust)
+@receiver([post_save, post_delete], sender=Hospital)
+@receiver([post_save, post_delete], sender=Agency)
+@receiver([post_save, post_delete], sender=TrustAgencyAccess)
+def platform_changed_stats(sender, **kwargs):
+    stats.invalidate(platform=True)
+
+
+# Search index
+
+@receiver(post_save, sender=Nurse)
+@receiver(post_save, sender=Shift)
+@receiver(post_save, sender=Agency)
+def searchable_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index(sender, [instance.pk])
+
+
+@receiver(post_delete, sender=Nurse)
+@receiver(post_delete, sender=Shift)
+@receiver(post_delete, sender=Agency)
+def searchable_deleted(sender, instance, **kwargs):
+    search.remove(sender, [instance.pk])
+
+
+@receiver(post_save, sender=Hospital)
+def hospital_saved_search(sender, instance, created, raw=False, **kwargs):
+    # Shift entries carry the hospital's name.
+    if not raw and not created:
+        search.hospital_renamed(instance)
+
+
+# Shift calendar versions
+
+@receiver([post_save, post_delete], sender=Shift)
+def shift_changed_calendar(sender, instance, raw=False, **kwargs):
+    if not raw:
+        shift_calendar.touch(hospitals=[instance.hospital_id])
+
+
+@receiver([post_save, post_delete], sender=Booking)
+def booking_changed_calendar(sender, instance, raw=False, **kwargs):
+    if not raw:
+        shift_calendar.touch(shifts=[instance.shift_id])
+
+
+@receiver(post_save, sender=Nurse)
+def nurse_saved_calendar(sender, instance, created, raw=False, **kwargs):
+    # Booked shifts show the nurse's name.
+    if not raw and not created:
+        shift_calendar.touch(shifts=Booking.objects.filter(nurse_id=instance.pk).values('shift_id'))
+
+
+# Agency shift stream
+
+@receiver(post_save, sender=Shift)
+def shift_saved_events(sender, instance, created, raw=False, **kwargs):
+    if not raw and created:
+        shift_events.shifts_opened(Shift.objects.filter(pk=instance.pk))
+
+
+@receiver(post_save, sender=Booking)
+def booking_saved_events(sender, instance, created, raw=False, **kwargs):
+    if not raw and created:
+        shift_events.shifts_booked([instance.shift_id])
+
+
+# Billing rollups
+
+@receiver([pre_save, pre_delete], sender=Shift)
+def shift_changing_billing(sender, instance, raw=False, **kwargs):
+    # Note the cells the shift bills to before the change, so they are
+    # refreshed too if it moves month, agency or specialty or stops billing.
+    if not raw and instance.pk is not None and not instance._state.adding:
+        instance._billing_keys = billing.keys([instance.pk])
+
+
+@receiver([pre_save, pre_delete], sender=Booking)
+def booking_changing_billing(sender, instance, raw=False, **kwargs):
+    # A shift without a booking bills nothing, so a new booking has nothing to capture.
+    if not raw and not instance._state.adding:
+        instance._billing_keys = billing.keys([instance.shift_id])
+
+
+@receiver([post_save, post_delete], sender=Shift)
+def shift_changed_billing(sender, instance, raw=False, **kwargs):
+    if not raw:
+        billing.refresh_shifts([instance.pk], before=getattr(instance, '_billing_keys', ()))
+
+
+@receiver([post_save, post_delete], sender=Booking)
+def booking_changed_billing(sender, instance, raw=False, **kwargs):
+    if not raw:
+        billing.refresh_shifts([instance.shift_id], before=getattr(instance, '_billing_keys', ()))
+
+
+# Table fragment versions. Shifts and nurses bump their own version when
+# saved (see Shift.save); these cover what their rows show of other models.
+
+@receiver([post_save, post_delete], sender=Booking)
+def booking_changed_fragments(sender, instance, created=True, raw=False, **kwargs):
+    # The shift tables show whether a shift has a booking, not its details.
+    if not raw and created:
+        fragments.bump(Shift.objects.filter(pk=instance.shift_id))
+
+
+@receiver(post_save, sender=Hospital)
+def hospital_saved_fragments(sender, instance, created, raw=False, **kwargs):
+    if not raw and not created:
+        fragments.bump(Shift.objects.filter(hospital=instance))
+
+
+@receiver(post_save, sender=NHSTrust)
+def trust_saved_fragments(sender, instance, created, raw=False, **kwargs):
+    if not raw and not created:
+        fragments.bump(Shift.objects.filter(hospital__trust=instance))
+
+
+@receiver([post_save, post_delete], sender=NurseDocument)
+def document_changed_fragments(sender, instance, created=True, raw=False, **kwargs):
+    # The nurse table shows whether a nurse has any documents.
+    if not raw and created:
+        fragments.bump(Nurse.objects.filter(pk=instance.nurse_id))
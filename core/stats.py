@@ -0,0 +1,141 @@
+"""
+Dashboard statistics for hospitals, agencies and the platform as a whole.
+
+All of a principal's counts are fetched in a single round trip: each count
+becomes a scalar ``(SELECT COUNT(*) ...)`` subquery of one SELECT, so every
+count is answered from its own index. The resulting dict is cached per
+principal and dropped by the signal handlers in ``core.signals`` whenever a
+Shift, Booking, Nurse or NurseDocument that feeds it changes.
+"""
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, router, transaction
+from django.utils import timezone
+
+from .models import (
+    NHSTrust, Hospital, Agency, TrustAgencyAccess, Nurse, NurseDocument, Shift, Booking
+)
+
+CACHE_TIMEOUT = 300
+EXPIRY_WARNING_DAYS = 30
+
+
+def _key(kind, pk=None):
+    return f'stats:{kind}' if pk is None else f'stats:{kind}:{pk}'
+
+
+def count_all(model, **querysets):
+    """Evaluate several querysets' counts with one query: {name: count}."""
+    connection = connections[router.db_for_read(model)]
+    qn = connection.ops.quote_name
+    selects, params = [], []
+    for name, queryset in querysets.items():
+        sql, query_params = queryset.order_by().values('pk').query.sql_with_params()
+        selects.append(f'(SELECT COUNT(*) FROM ({sql}) {qn(name + "_rows")}) AS {qn(name)}')
+        params.extend(query_params)
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT ' + ', '.join(selects), params)
+        return dict(zip(querysets, cursor.fetchone()))
+
+
+def _shift_status_counts(shifts):
+    return {status: shifts.filter(status=status) for status in Shift.Status.values}
+
+
+def _compute_hospital(hospital_id):
+    shifts = Shift.objects.filter(hospital_id=hospital_id)
+    return count_all(
+        Shift,
+        upcoming=shifts.filter(status=Shift.Status.OPEN, shift_date__gte=timezone.now().date()),
+        **_shift_status_counts(shifts),
+    )
+
+
+def _compute_agency(agency_id):
+    today = timezone.now().date()
+    nurses = Nurse.objects.filter(agency_id=agency_id)
+    bookings = Booking.objects.filter(agency_id=agency_id, cancelled=False)
+    return count_all(
+        Nurse,
+        nurses=nurses,
+        approved_nurses=nurses.filter(is_approved=True),
+        pending_nurses=nurses.filter(is_approved=False),
+        compliant_nurses=nurses.filter(is_compliant=True),
+        upcoming_bookings=bookings.filter(shift__shift_date__gte=today),
+        completed_bookings=bookings.filter(shift__status=Shift.Status.COMPLETED),
+        expiring_documents=NurseDocument.objects.filter(
+            nurse__agency_id=agency_id,
+            expiry_date__gt=today,
+            expiry_date__lte=today + timedelta(days=EXPIRY_WARNING_DAYS),
+        ),
+    )
+
+
+def _compute_platform():
+    return count_all(
+        Shift,
+        trusts=NHSTrust.objects.all(),
+        hospitals=Hospital.objects.all(),
+        agencies=Agency.objects.all(),
+        pending_nurses=Nurse.objects.filter(is_approved=False),
+        pending_access=TrustAgencyAccess.objects.filter(approved=False),
+        **_shift_status_counts(Shift.objects.all()),
+    )
+
+
+def _timeout():
+    # Counts read from a replica may predate the write whose invalidation
+    # prompted the recount, so they are kept only as long as a replica may lag.
+    if router.db_for_read(Shift) != DEFAULT_DB_ALIAS:
+        return min(CACHE_TIMEOUT, settings.REPLICA_MAX_LAG)
+    return CACHE_TIMEOUT
+
+
+def hospital_stats(hospital_id):
+    return cache.get_or_set(_key('hospital', hospital_id), lambda: _compute_hospital(hospital_id), _timeout())
+
+
+def agency_stats(agency_id):
+    return cache.get_or_set(_key('agency', agency_id), lambda: _compute_agency(agency_id), _timeout())
+
+
+def platform_stats():
+    return cache.get_or_set(_key('platform'), _compute_platform, _timeout())
+
+
+async def _acached(key, compute, *args):
+    # cache.aget_or_set() would call ``compute`` on the event loop, where the
+    # ORM refuses to run, so a miss is computed in the request's sync thread.
+    value = await cache.aget(key)
+    if value is None:
+        value = await sync_to_async(compute)(*args)
+        await cache.aset(key, value, _timeout())
+    return value
+
+
+async def ahospital_stats(hospital_id):
+    return await _acached(_key('hospital', hospital_id), _compute_hospital, hospital_id)
+
+
+async def aagency_stats(agency_id):
+    return await _acached(_key('agency', agency_id), _compute_agency, agency_id)
+
+
+async def aplatform_stats():
+    return await _acached(_key('platform'), _compute_platform)
+
+
+def invalidate(hospitals=(), agencies=(), platform=False):
+    """
+    Drop cached stats once the current transaction commits, so a concurrent
+    request cannot re-cache the pre-commit numbers.
+    """
+    keys = [_key('hospital', pk) for pk in hospitals if pk]
+    keys += [_key('agency', pk) for pk in agencies if pk]
+    if platform:
+        keys.append(_key('platform'))
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
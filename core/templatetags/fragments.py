@@ -0,0 +1,80 @@
+"""
+Template tags for core.fragments.
+
+    {% load fragments %}
+    {% cachedtable 'shift_list' shifts user.role query %}
+        {% for shift in shifts %}
+            {% cachedrow shift %}<tr>...</tr>{% endcachedrow %}
+        {% endfor %}
+    {% endcachedtable %}
+
+``cachedtable`` takes a name, the rows, and anything else the table's output
+depends on. ``cachedrow`` renders uncached inside anything but a cached table.
+"""
+from django import template
+
+from core import fragments
+
+register = template.Library()
+
+TABLE = 'core.fragments.table'
+
+
+class CachedTableNode(template.Node):
+    def __init__(self, nodelist, name, rows, vary):
+        self.nodelist = nodelist
+        self.name = name
+        self.rows = rows
+        self.vary = vary
+
+    def render(self, context):
+        rows = list(self.rows.resolve(context))
+        table = fragments.Table(
+            self.name.resolve(context), rows, [value.resolve(context) for value in self.vary]
+        )
+        html = table.lookup()
+        if html is not None:
+            return html
+        outer = context.render_context.get(TABLE)
+        context.render_context[TABLE] = table
+        try:
+            html = self.nodelist.render(context)
+        finally:
+            context.render_context[TABLE] = outer
+        table.store(html)
+        return html
+
+
+class CachedRowNode(template.Node):
+    def __init__(self, nodelist, obj):
+        self.nodelist = nodelist
+        self.obj = obj
+
+    def render(self, context):
+        table = context.render_context.get(TABLE)
+        if table is None:
+            return self.nodelist.render(context)
+        return table.row(self.obj.resolve(context), lambda: self.nodelist.render(context))
+
+
+@register.tag
+def cachedtable(parser, token):
+    bits = token.split_contents()
+    if len(bits) < 3:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' takes a name, the rows, and optional values to vary on")
+    nodelist = parser.parse(('endcachedtable',))
+    parser.delete_first_token()
+    return CachedTableNode(
+        nodelist, parser.compile_filter(bits[1]), parser.compile_filter(bits[2]),
+        [parser.compile_filter(bit) for bit in bits[3:]],
+    )
+
+
+@register.tag
+def cachedrow(parser, token):
+    bits = token.split_contents()
+    if len(bits) != 2:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' takes the row's object")
+    nodelist = parser.parse(('endcachedrow',))
+    parser.delete_first_token()
+    return CachedRowNode(nodelist, parser.compile_filter(bits[1]))
@@ -0,0 +1,81 @@
+from datetime import time, timedelta
+from decimal import Decimal
+from itertools import count
+
+from django.utils import timezone
+
+from core.models import (
+    User, NHSTrust, Hospital, Agency, TrustAgencyAccess,
+    Nurse, NurseDocument, Shift, Booking
+)
+
+_sequence = count(1)
+
+
+def make_user(role, password=None, **kwargs):
+    n = next(_sequence)
+    kwargs.setdefault('username', f'{role}{n}')
+    kwargs.setdefault('email', f'{role}{n}@example.com')
+    user = User(role=role, **kwargs)
+    # Hashing is deliberately slow; only pay for it when a test logs in with a password.
+    user.set_password(password)
+    user.save()
+    return user
+
+
+def make_trust(**kwargs):
+    kwargs.setdefault('name', f'Trust {next(_sequence)}')
+    return NHSTrust.objects.create(**kwargs)
+
+
+def make_hospital(trust=None, **kwargs):
+    kwargs.setdefault('name', f'Hospital {next(_sequence)}')
+    return Hospital.objects.create(
+        trust=trust or make_trust(),
+        user=kwargs.pop('user', None) or make_user(User.Role.HOSPITAL),
+        **kwargs
+    )
+
+
+def make_agency(**kwargs):
+    kwargs.setdefault('name', f'Agency {next(_sequence)}')
+    kwargs.setdefault('contact_email', f'agency{next(_sequence)}@example.com')
+    return Agency.objects.create(
+        user=kwargs.pop('user', None) or make_user(User.Role.AGENCY),
+        **kwargs
+    )
+
+
+def approve(agency, trust, approved=True):
+    return TrustAgencyAccess.objects.create(trust=trust, agency=agency, approved=approved)
+
+
+def make_nurse(agency, **kwargs):
+    n = next(_sequence)
+    kwargs.setdefault('full_name', f'Nurse {n}')
+    kwargs.setdefault('registration_number', f'NMC{n:06d}')
+    kwargs.setdefault('specialty', 'General Nursing')
+    kwargs.setdefault('is_approved', True)
+    kwargs.setdefault('dob', timezone.now().date() - timedelta(days=365 * 30))
+    return Nurse.objects.create(agency=agency, **kwargs)
+
+
+def make_document(nurse, document_type='registration', **kwargs):
+    kwargs.setdefault('file_url', f'nurse_documents/{document_type}.pdf')
+    kwargs.setdefault('expiry_date', timezone.now().date() + timedelta(days=365))
+    kwargs.setdefault('verified', True)
+    return NurseDocument.objects.create(nurse=nurse, document_type=document_type, **kwargs)
+
+
+def make_shift(hospital, days=1, **kwargs):
+    kwargs.setdefault('ward', 'Ward A')
+    kwargs.setdefault('specialty_required', 'General Nursing')
+    kwargs.setdefault('shift_date', timezone.now().date() + timedelta(days=days))
+    kwargs.setdefault('shift_time', time(8, 0))
+    kwargs.setdefault('duration_hours', Decimal('8.00'))
+    kwargs.setdefault('rate_per_hour', Decimal('25.00'))
+    return Shift.objects.create(hospital=hospital, **kwargs)
+
+
+def make_booking(shift, nurse, **kwargs):
+    return Booking.objects.create(shift=shift, nurse=nurse, agency=nurse.agency, **kwargs)
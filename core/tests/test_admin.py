@@ -0,0 +1,73 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.models import Shift, User
+from core.pagination import EstimatedCountPaginator
+from core.tests.factories import (
+    approve, make_agency, make_booking, make_document, make_hospital, make_nurse, make_shift, make_trust, make_user
+)
+
+
+class AdminScalingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.superuser = make_user(User.Role.ADMIN, is_staff=True, is_superuser=True)
+        cls.agency = make_agency()
+        cls.hospital = make_hospital(trust=make_trust())
+
+    def setUp(self):
+        self.client.force_login(self.superuser)
+
+    def add_rows(self, count):
+        for i in range(count):
+            nurse = make_nurse(self.agency)
+            make_document(nurse)
+            make_booking(make_shift(make_hospital(trust=self.hospital.trust), days=i + 1), nurse)
+
+    def changelist_queries(self, model):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse(f'admin:core_{model}_changelist'))
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        models = ['booking', 'shift', 'nurse', 'nursedocument', 'trustagencyaccess', 'hospital']
+        self.add_rows(2)
+        # Warm the cached filter choices.
+        for model in models:
+            self.changelist_queries(model)
+        before = {model: self.changelist_queries(model) for model in models}
+        self.add_rows(8)
+        self.assertEqual({model: self.changelist_queries(model) for model in models}, before)
+
+    def test_foreign_keys_are_not_rendered_as_full_selects(self):
+        self.add_rows(2)
+        response = self.client.get(reverse('admin:core_booking_add'))
+        self.assertNotContains(response, '<select name="shift"')
+        self.assertContains(response, 'class="vForeignKeyRawIdAdminField"')
+        self.assertContains(response, 'admin-autocomplete')
+
+    def test_big_tables_are_estimated_and_filtered_counts_capped(self):
+        for days in range(1, 6):
+            make_shift(self.hospital, days=days)
+        Shift.objects.filter(pk=Shift.objects.order_by('pk').first().pk).delete()
+        paginator = EstimatedCountPaginator(Shift.objects.order_by('-pk'), 2)
+        paginator.count_limit = 3
+        # Unfiltered: the highest id, so the deleted row still counts.
+        self.assertEqual(paginator.count, Shift.objects.order_by('-pk').first().pk)
+
+        paginator = EstimatedCountPaginator(Shift.objects.filter(status='open').order_by('-pk'), 2)
+        paginator.count_limit = 3
+        self.assertEqual(paginator.count, 3)
+
+        paginator = EstimatedCountPaginator(Shift.objects.order_by('-pk'), 2)
+        self.assertEqual(paginator.count, 4)
+
+    def test_access_changelist_is_unfiltered_without_a_search(self):
+        approve(self.agency, self.hospital.trust)
+        url = reverse('admin:core_trustagencyaccess_changelist')
+        self.assertFalse(self.client.get(url).context['cl'].queryset.query.where)
+        response = self.client.get(url, {'q': self.hospital.trust.name})
+        self.assertEqual(response.context['cl'].result_count, 1)
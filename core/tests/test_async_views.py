@@ -0,0 +1,90 @@
+import asyncio
+import re
+from unittest import mock
+
+from django.test import TestCase
+from django.urls import resolve, reverse
+
+from core import fragments
+from core.benchmarks import read_views
+from core.models import Shift, User
+from core.tests.factories import (
+    approve, make_agency, make_booking, make_document, make_hospital, make_nurse, make_shift, make_trust, make_user
+)
+
+CSRF_TOKEN = re.compile(rb'name="csrfmiddlewaretoken" value="[^"]+"')
+
+
+class AsyncViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.agency = make_agency()
+        cls.trust = make_trust()
+        approve(cls.agency, cls.trust)
+        approve(cls.agency, make_trust(), approved=False)
+        cls.hospital = make_hospital(trust=cls.trust)
+        cls.nurse = make_nurse(cls.agency)
+        make_nurse(cls.agency, is_approved=False)
+        make_document(cls.nurse)
+        make_document(cls.nurse, document_type='dbs')
+        make_shift(cls.hospital, days=2, specialty_required='ICU')
+        make_shift(cls.hospital, days=3)
+        make_booking(make_shift(cls.hospital, status=Shift.Status.BOOKED), cls.nurse)
+        cls.admin = make_user(User.Role.ADMIN)
+        cls.other_agency = make_agency()
+
+    def setUp(self):
+        views = read_views(async_views=True)
+        views.__enter__()
+        self.addCleanup(views.__exit__, None, None, None)
+
+    def pages(self):
+        agency = self.agency.user
+        hospital = self.hospital.user
+        return [
+            (agency, reverse('dashboard'), {}),
+            (agency, reverse('nurse_list'), {}),
+            (agency, reverse('nurse_documents', args=[self.nurse.id]), {}),
+            (agency, reverse('available_shifts'), {}),
+            (agency, reverse('available_shifts'), {'trust': self.trust.id, 'specialty': 'icu'}),
+            (hospital, reverse('dashboard'), {}),
+            (hospital, reverse('shift_list'), {}),
+            (self.admin, reverse('dashboard'), {}),
+        ]
+
+    async def fetch(self, user, url, params):
+        await self.async_client.aforce_login(user)
+        response = await self.async_client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return CSRF_TOKEN.sub(b'', response.content)
+
+    async def test_pages_match_the_sync_views(self):
+        for user, url, params in self.pages():
+            with self.subTest(url=url, params=params):
+                self.assertTrue(asyncio.iscoroutinefunction(resolve(url).func))
+                async_page = await self.fetch(user, url, params)
+                with read_views(async_views=False):
+                    sync_page = await self.fetch(user, url, params)
+                self.assertEqual(async_page, sync_page)
+
+    async def test_agency_cannot_see_another_agencys_nurse(self):
+        await self.async_client.aforce_login(self.other_agency.user)
+        response = await self.async_client.get(reverse('nurse_documents', args=[self.nurse.id]))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_role_checks_still_apply(self):
+        await self.async_client.aforce_login(self.hospital.user)
+        response = await self.async_client.get(reverse('nurse_list'))
+        self.assertEqual(response.status_code, 302)
+
+    async def test_admin_dashboard_reads_fragment_stats_off_the_event_loop(self):
+        def off_loop():
+            with self.assertRaises(RuntimeError):
+                asyncio.get_running_loop()
+            return {}
+
+        await self.async_client.aforce_login(self.admin)
+        with mock.patch.object(fragments, 'stats', side_effect=off_loop) as stats:
+            response = await self.async_client.get(reverse('dashboard'))
+        self.assertEqual(response.status_code, 200)
+        stats.assert_called_once_with()
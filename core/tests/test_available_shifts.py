@@ -0,0 +1,88 @@
+import base64
+import json
+from datetime import time
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core import views
+from core.models import Shift
+from core.tests.factories import approve, make_agency, make_hospital, make_shift, make_trust
+
+
+class AvailableShiftsTests(TestCase):
+    def setUp(self):
+        self.agency = make_agency()
+        self.trust = make_trust()
+        approve(self.agency, self.trust)
+        self.hospital = make_hospital(trust=self.trust)
+        self.client.force_login(self.agency.user)
+
+    def get(self, **params):
+        return self.client.get(reverse('available_shifts'), params)
+
+    def test_only_open_shifts_from_approved_trusts(self):
+        visible = make_shift(self.hospital)
+        make_shift(self.hospital, status=Shift.Status.BOOKED)
+        make_shift(make_hospital())
+        response = self.get()
+        self.assertEqual([s.id for s in response.context['shifts']], [visible.id])
+
+    def test_pages_follow_date_time_id_order(self):
+        shifts = [
+            make_shift(self.hospital, days=2, shift_time=time(8)),
+            make_shift(self.hospital, days=1, shift_time=time(20)),
+            make_shift(self.hospital, days=1, shift_time=time(8)),
+            make_shift(self.hospital, days=1, shift_time=time(8)),
+        ]
+        expected = [shifts[2].id, shifts[3].id, shifts[1].id, shifts[0].id]
+
+        seen = []
+        params = {}
+        with mock.patch.object(views, 'AVAILABLE_SHIFTS_PAGE_SIZE', 3):
+            while True:
+                response = self.get(**params)
+                seen.extend(s.id for s in response.context['shifts'])
+                if not response.context['next_query']:
+                    break
+                params = {'cursor': response.context['shifts'].next_cursor}
+        self.assertEqual(seen, expected)
+
+    def test_filters(self):
+        other_trust = make_trust()
+        approve(self.agency, other_trust)
+        other_hospital = make_hospital(trust=other_trust)
+        icu = make_shift(self.hospital, ward='ICU', specialty_required='Critical Care', days=3)
+        make_shift(self.hospital, ward='A&E', days=10)
+        elsewhere = make_shift(other_hospital, days=3)
+
+        response = self.get(specialty='critical care')
+        self.assertEqual([s.id for s in response.context['shifts']], [icu.id])
+        response = self.get(ward='icu')
+        self.assertEqual([s.id for s in response.context['shifts']], [icu.id])
+        response = self.get(trust=other_trust.id)
+        self.assertEqual([s.id for s in response.context['shifts']], [elsewhere.id])
+        response = self.get(date_to=icu.shift_date.isoformat())
+        self.assertEqual({s.id for s in response.context['shifts']}, {icu.id, elsewhere.id})
+
+    def test_invalid_cursor_starts_from_first_page(self):
+        shift = make_shift(self.hospital)
+        response = self.get(cursor='not-a-cursor')
+        self.assertEqual([s.id for s in response.context['shifts']], [shift.id])
+        for values in (['not-a-date', '09:00', 1], ['2100-01-01', '09:00', None], ['2100-01-01', [], 1]):
+            cursor = base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+            response = self.get(cursor=cursor)
+            self.assertEqual([s.id for s in response.context['shifts']], [shift.id])
+
+    def test_query_count_does_not_grow_with_rows(self):
+        make_shift(self.hospital)
+        with CaptureQueriesContext(connection) as few:
+            self.get()
+        for days in range(1, 30):
+            make_shift(make_hospital(trust=self.trust), days=days)
+        with CaptureQueriesContext(connection) as many:
+            self.get()
+        self.assertEqual(len(few), len(many))
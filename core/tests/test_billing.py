@@ -0,0 +1,102 @@
+import os
+import tempfile
+from datetime import date
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from core import billing
+from core.models import BillingRollup, Shift
+from core.tests.factories import make_agency, make_booking, make_hospital, make_nurse, make_shift, make_trust
+
+MONTH = date(2026, 3, 1)
+
+
+class BillingRollupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.trust = make_trust()
+        cls.hospital = make_hospital(trust=cls.trust)
+        cls.agency = make_agency(name='Alpha Staffing')
+        cls.other_agency = make_agency(name='Beta Staffing')
+        cls.nurse = make_nurse(cls.agency)
+        cls.other_nurse = make_nurse(cls.other_agency)
+
+    def worked(self, nurse, day=10, **kwargs):
+        shift = make_shift(self.hospital, shift_date=MONTH.replace(day=day), status=Shift.Status.BOOKED, **kwargs)
+        make_booking(shift, nurse)
+        shift.status = Shift.Status.COMPLETED
+        shift.save()
+        return shift
+
+    def rollup(self, agency=None, month=MONTH, specialty='General Nursing'):
+        return BillingRollup.objects.values_list('shifts', 'hours', 'amount').get(
+            agency=agency or self.agency, trust=self.trust, month=month, specialty=specialty
+        )
+
+    def test_completing_shifts_adds_exact_amounts(self):
+        self.worked(self.nurse, duration_hours=Decimal('7.50'), rate_per_hour=Decimal('33.33'))
+        self.worked(self.nurse, day=11, duration_hours=Decimal('0.10'), rate_per_hour=Decimal('0.10'))
+        make_booking(make_shift(self.hospital, shift_date=MONTH, status=Shift.Status.BOOKED), self.nurse)
+        self.assertEqual(self.rollup(), (2, Decimal('7.60'), Decimal('249.9850')))
+        self.assertEqual(billing.verify(), [])
+
+    def test_cancelling_or_moving_a_shift_leaves_its_old_cell(self):
+        shift = self.worked(self.nurse)
+        other = self.worked(self.nurse, day=12)
+
+        shift.shift_date = date(2026, 4, 2)
+        shift.save()
+        self.assertEqual(self.rollup(), (1, Decimal('8.00'), Decimal('200.0000')))
+        self.assertEqual(self.rollup(month=date(2026, 4, 1)), (1, Decimal('8.00'), Decimal('200.0000')))
+
+        booking = other.booking
+        booking.agency = self.other_agency
+        booking.save()
+        self.assertFalse(BillingRollup.objects.filter(agency=self.agency, month=MONTH).exists())
+        self.assertEqual(self.rollup(agency=self.other_agency)[0], 1)
+
+        booking.cancelled = True
+        booking.save()
+        shift.status = Shift.Status.CANCELLED
+        shift.save()
+        self.assertFalse(BillingRollup.objects.exists())
+
+    def test_deleting_a_shift_removes_it(self):
+        shift = self.worked(self.nurse)
+        self.worked(self.nurse, specialty_required=None)
+        self.assertEqual(self.rollup(specialty='')[0], 1)
+        shift.delete()
+        self.assertEqual(list(BillingRollup.objects.values_list('specialty', flat=True)), [''])
+        self.assertEqual(billing.verify(), [])
+
+    def test_rebuild_command_repairs_and_verifies(self):
+        self.worked(self.nurse)
+        self.worked(self.other_nurse)
+        BillingRollup.objects.filter(agency=self.agency).update(amount=Decimal('1.0000'))
+        Shift.objects.update(rate_per_hour=Decimal('30.00'))
+        with self.assertRaisesMessage(CommandError, '2 cells differ'):
+            call_command('rebuild_billing_rollups', verify_only=True, stdout=StringIO())
+        out = StringIO()
+        call_command('rebuild_billing_rollups', stdout=out)
+        self.assertIn('Rebuilt billing rollups with 2 rows', out.getvalue())
+        self.assertEqual(self.rollup()[2], Decimal('240.0000'))
+
+    def test_invoices_are_read_from_the_rollups(self):
+        self.worked(self.nurse)
+        self.worked(self.nurse, specialty_required='ICU', rate_per_hour=Decimal('40.00'))
+        self.worked(self.other_nurse)
+        [alpha, beta] = billing.invoices(date(2026, 3, 20))
+        self.assertEqual(alpha.agency, self.agency)
+        self.assertEqual([line['specialty'] for line in alpha.lines], ['General Nursing', 'ICU'])
+        self.assertEqual((alpha.shifts, alpha.hours, alpha.amount), (2, Decimal('16.00'), Decimal('520.0000')))
+        self.assertEqual(beta.amount, Decimal('200.0000'))
+
+        with tempfile.TemporaryDirectory() as directory, self.assertNumQueries(3):
+            call_command('generate_invoices', month=MONTH, output=directory, stdout=StringIO())
+            with open(os.path.join(directory, f'invoice-2026-03-agency-{self.agency.pk}.csv')) as invoice:
+                lines = invoice.read().splitlines()
+        self.assertEqual(lines[-1], 'Alpha Staffing,2026-03,Total,,2,16.00,520.0000')
@@ -0,0 +1,121 @@
+from datetime import time, timedelta
+from io import StringIO
+
+from django.contrib.messages import get_messages
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from core import bookings
+from core.bookings import BookingResult
+from core.models import AgencyShiftEligibility, Booking, Shift
+from core.tests.factories import (
+    approve, make_agency, make_booking, make_hospital, make_nurse, make_shift, make_trust
+)
+
+
+class BookShiftServiceTests(TestCase):
+    def setUp(self):
+        trust = make_trust()
+        self.hospital = make_hospital(trust=trust)
+        self.agency = make_agency()
+        approve(self.agency, trust)
+        self.nurse = make_nurse(self.agency)
+        self.shift = make_shift(self.hospital)
+
+    def test_books_open_shift(self):
+        result = bookings.book_shift(self.shift.id, self.nurse.id, self.agency)
+        self.assertEqual(result.status, BookingResult.BOOKED)
+        self.shift.refresh_from_db()
+        self.assertEqual(self.shift.status, Shift.Status.BOOKED)
+        self.assertEqual(result.booking.nurse, self.nurse)
+        self.assertFalse(AgencyShiftEligibility.objects.filter(shift=self.shift).exists())
+
+    def test_second_booking_is_already_taken(self):
+        rival = make_agency()
+        approve(rival, self.hospital.trust)
+        bookings.book_shift(self.shift.id, self.nurse.id, self.agency)
+        result = bookings.book_shift(self.shift.id, make_nurse(rival).id, rival)
+        self.assertEqual(result.status, BookingResult.TAKEN)
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_rejects_nurses_outside_the_agency_or_unapproved(self):
+        other_nurse = make_nurse(make_agency())
+        unapproved = make_nurse(self.agency, is_approved=False)
+        for nurse in (other_nurse, unapproved):
+            result = bookings.book_shift(self.shift.id, nurse.id, self.agency)
+            self.assertEqual(result.status, BookingResult.INVALID_NURSE)
+        self.shift.refresh_from_db()
+        self.assertEqual(self.shift.status, Shift.Status.OPEN)
+
+    def test_rejects_agencies_without_trust_approval(self):
+        outsider = make_agency()
+        result = bookings.book_shift(self.shift.id, make_nurse(outsider).id, outsider)
+        self.assertEqual(result.status, BookingResult.NOT_PERMITTED)
+
+    def test_view_reports_already_taken(self):
+        bookings.book_shift(self.shift.id, self.nurse.id, self.agency)
+        self.client.force_login(self.agency.user)
+        response = self.client.post(reverse('book_shift', args=[self.shift.id]), {'nurse': self.nurse.id})
+        self.assertRedirects(response, reverse('available_shifts'))
+        messages = [str(m) for m in get_messages(response.wsgi_request)]
+        self.assertEqual(messages, [BookingResult.MESSAGES[BookingResult.TAKEN]])
+
+    def test_view_does_not_accept_another_agencys_nurse(self):
+        other_nurse = make_nurse(make_agency())
+        self.client.force_login(self.agency.user)
+        response = self.client.post(reverse('book_shift', args=[self.shift.id]), {'nurse': other_nurse.id})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Booking.objects.exists())
+
+
+class OverlapTests(TestCase):
+    def setUp(self):
+        trust = make_trust()
+        self.hospital = make_hospital(trust=trust)
+        self.agency = make_agency()
+        approve(self.agency, trust)
+        self.nurse = make_nurse(self.agency)
+        # 20:00 for 12 hours, so it runs until 08:00 the next morning.
+        self.night = make_shift(self.hospital, days=3, shift_time=time(20, 0), duration_hours=12)
+        bookings.book_shift(self.night.id, self.nurse.id, self.agency)
+
+    def book(self, **kwargs):
+        shift = make_shift(self.hospital, **kwargs)
+        return shift, bookings.book_shift(shift.id, self.nurse.id, self.agency)
+
+    def test_windows_are_materialised(self):
+        booking = Booking.objects.get()
+        self.assertEqual(booking.ends_at - booking.starts_at, timedelta(hours=12))
+        self.assertEqual((booking.starts_at, booking.ends_at), (self.night.starts_at, self.night.ends_at))
+
+    def test_rejects_overlap_with_overnight_shift(self):
+        shift, result = self.book(days=4, shift_time=time(7, 0), duration_hours=8)
+        self.assertEqual(result.status, BookingResult.OVERLAP)
+        shift.refresh_from_db()
+        self.assertEqual(shift.status, Shift.Status.OPEN)
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_back_to_back_and_cancelled_bookings_do_not_clash(self):
+        _, result = self.book(days=4, shift_time=time(8, 0), duration_hours=8)
+        self.assertEqual(result.status, BookingResult.BOOKED)
+        Booking.objects.filter(shift=self.night).update(cancelled=True)
+        _, result = self.book(days=3, shift_time=time(21, 0), duration_hours=4)
+        self.assertEqual(result.status, BookingResult.BOOKED)
+
+    def test_moving_a_shift_moves_its_booking(self):
+        self.night.shift_time = time(22, 0)
+        self.night.save()
+        booking = Booking.objects.get()
+        self.assertEqual(booking.starts_at, self.night.starts_at)
+
+    def test_conflict_scan(self):
+        call_command('find_booking_conflicts', stdout=StringIO())
+        # Bookings made before the check existed can still overlap.
+        clash = make_booking(
+            make_shift(self.hospital, days=4, shift_time=time(6, 0), status=Shift.Status.BOOKED), self.nurse
+        )
+        make_booking(make_shift(self.hospital, days=10, status=Shift.Status.BOOKED), self.nurse)
+        self.assertEqual(list(bookings.find_overlaps()), [(Booking.objects.get(shift=self.night).id, clash.id)])
+        with self.assertRaisesMessage(CommandError, '1 overlapping bookings found'):
+            call_command('find_booking_conflicts', stdout=StringIO())
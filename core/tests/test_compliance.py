@@ -0,0 +1,64 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.utils import timezone
+
+from core import compliance
+from core.models import Nurse
+from core.tests.factories import make_agency, make_document, make_nurse
+
+
+def in_days(days):
+    return timezone.now().date() + timedelta(days=days)
+
+
+class ComplianceTests(TestCase):
+    def setUp(self):
+        self.agency = make_agency()
+        self.nurse = make_nurse(self.agency)
+
+    def state(self, nurse=None):
+        nurse = Nurse.objects.get(pk=(nurse or self.nurse).pk)
+        return nurse.is_compliant, nurse.compliant_until
+
+    def test_needs_every_required_type_verified(self):
+        make_document(self.nurse, 'registration', expiry_date=in_days(200))
+        self.assertEqual(self.state(), (False, None))
+        dbs = make_document(self.nurse, 'dbs', expiry_date=in_days(100), verified=False)
+        self.assertEqual(self.state(), (False, None))
+        dbs.verified = True
+        dbs.save()
+        self.assertEqual(self.state(), (True, in_days(100)))
+        # A newer document of the same type extends the window.
+        make_document(self.nurse, 'dbs', expiry_date=in_days(300))
+        self.assertEqual(self.state(), (True, in_days(200)))
+        dbs.delete()
+        self.assertEqual(self.state(), (True, in_days(200)))
+
+    def test_nightly_roll_over(self):
+        make_document(self.nurse, 'registration', expiry_date=in_days(1))
+        make_document(self.nurse, 'dbs', expiry_date=in_days(90))
+        other = make_nurse(self.agency)
+        make_document(other, 'registration')
+        make_document(other, 'dbs')
+        self.assertEqual(compliance.roll_over(today=in_days(1)), 0)
+        self.assertEqual(compliance.roll_over(today=in_days(2)), 1)
+        self.assertEqual(self.state(), (False, in_days(1)))
+        self.assertTrue(self.state(other)[0])
+
+    def test_command_rebuild_repairs_drift(self):
+        make_document(self.nurse, 'registration')
+        make_document(self.nurse, 'dbs')
+        Nurse.objects.update(is_compliant=False, compliant_until=None)
+        call_command('update_nurse_compliance', rebuild=True, stdout=StringIO())
+        self.assertEqual(self.state(), (True, in_days(365)))
+
+    def test_compliant_nurses_in_agency_is_an_indexed_filter(self):
+        sql, params = Nurse.objects.filter(agency=self.agency, is_compliant=True).query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            plan = ' '.join(row[-1] for row in cursor.fetchall())
+        self.assertIn('nurse_compliant_idx', plan)
@@ -0,0 +1,53 @@
+from datetime import date
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from core import bookings, eligibility
+from core.datagen import DataGenerator
+from core.models import Booking, NHSTrust, Nurse, NurseDocument, Shift, User
+
+SCALE = {'trusts': 3, 'hospitals': 5, 'agencies': 4, 'nurses': 60, 'shifts': 400}
+
+
+class DataGeneratorTests(TestCase):
+    def generate(self, seed=1):
+        DataGenerator(seed=seed, today=date(2026, 1, 5), batch_size=150).run(**SCALE)
+
+    def snapshot(self):
+        return (
+            list(Shift.objects.order_by('po_number').values_list(
+                'hospital__name', 'specialty_required', 'shift_date', 'shift_time', 'rate_per_hour', 'status'
+            )),
+            list(Booking.objects.order_by('shift__po_number').values_list(
+                'shift__po_number', 'nurse__registration_number', 'agency__name'
+            )),
+        )
+
+    def test_same_seed_gives_the_same_data(self):
+        self.generate()
+        first = self.snapshot()
+        User.objects.all().delete()
+        NHSTrust.objects.all().delete()
+        self.generate()
+        self.assertEqual(self.snapshot(), first)
+
+    def test_generated_data_is_consistent(self):
+        self.generate()
+        self.assertEqual(Shift.objects.count(), SCALE['shifts'])
+        self.assertEqual(NurseDocument.objects.count(), SCALE['nurses'] * len(NurseDocument.REQUIRED_TYPES))
+        self.assertTrue(Booking.objects.exists())
+        self.assertEqual(list(bookings.find_overlaps()), [])
+        self.assertEqual(eligibility.verify(), (0, 0))
+        self.assertFalse(Shift.objects.filter(starts_at__isnull=True).exists())
+        self.assertFalse(Shift.objects.filter(status=Shift.Status.OPEN, booking__isnull=False).exists())
+        self.assertTrue(Nurse.objects.filter(is_compliant=True).exists())
+
+    def test_command_validates_scale_options(self):
+        with self.assertRaises(CommandError):
+            call_command('seed_data', shifts=10, stdout=StringIO())
+        call_command('seed_data', trusts=1, hospitals=1, shifts=5, seed=3, stdout=StringIO())
+        self.assertEqual(Shift.objects.count(), 5)
+        with self.assertRaises(CommandError):
+            call_command('seed_data', trusts=1, seed=3, stdout=StringIO())
@@ -0,0 +1,84 @@
+import shutil
+import tempfile
+from datetime import timedelta
+
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core.models import NurseDocument, Shift, User
+from core.tests.factories import make_agency, make_booking, make_hospital, make_nurse, make_shift, make_user
+
+CONTENT = bytes(range(256)) * 40
+
+
+class DocumentDownloadTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings = override_settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.agency = make_agency()
+        self.nurse = make_nurse(self.agency, full_name='Jane Smith')
+        self.document = NurseDocument.objects.create(
+            nurse=self.nurse,
+            document_type='dbs',
+            file_url=ContentFile(CONTENT, name='scan.pdf'),
+            expiry_date=timezone.now().date() + timedelta(days=365),
+        )
+        self.url = reverse('document_download', args=[self.document.id])
+
+    def get(self, user, **headers):
+        self.client.force_login(user)
+        return self.client.get(self.url, headers=headers)
+
+    def body(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_only_owning_agency_admin_and_booking_hospital_can_download(self):
+        hospital = make_hospital()
+        self.assertEqual(self.get(make_agency().user).status_code, 404)
+        self.assertEqual(self.get(hospital.user).status_code, 404)
+        make_booking(make_shift(hospital, status=Shift.Status.BOOKED), self.nurse)
+        for user in (self.agency.user, hospital.user, make_user(User.Role.ADMIN)):
+            response = self.get(user)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(self.body(response), CONTENT)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertIn("filename*=UTF-8''Jane%20Smith%20-%20DBS%20Check.pdf", response['Content-Disposition'])
+
+    def test_media_url_is_not_served(self):
+        self.client.force_login(self.agency.user)
+        self.assertEqual(self.client.get('/media/' + self.document.file_url.name).status_code, 404)
+
+    def test_conditional_requests(self):
+        response = self.get(self.agency.user)
+        self.assertEqual(response['ETag'], f'"{self.document.checksum}"')
+        self.assertIn('private', response['Cache-Control'])
+        self.assertEqual(self.get(self.agency.user, if_none_match=response['ETag']).status_code, 304)
+        self.assertEqual(self.get(self.agency.user, if_modified_since=response['Last-Modified']).status_code, 304)
+
+    def test_byte_ranges(self):
+        response = self.get(self.agency.user, range='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(CONTENT)}')
+        self.assertEqual(self.body(response), CONTENT[10:20])
+
+        response = self.get(self.agency.user, range='bytes=-5')
+        self.assertEqual(self.body(response), CONTENT[-5:])
+
+        response = self.get(self.agency.user, range=f'bytes={len(CONTENT)}-')
+        self.assertEqual(response.status_code, 416)
+
+        response = self.get(self.agency.user, range='bytes=0-9', if_range='"stale"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.body(response), CONTENT)
+
+    @override_settings(DOCUMENT_SENDFILE='x-accel-redirect', DOCUMENT_ACCEL_REDIRECT_PREFIX='/protected/')
+    def test_offloads_to_the_web_server(self):
+        response = self.get(self.agency.user)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected/' + self.document.file_url.name)
+        self.assertEqual(response.content, b'')
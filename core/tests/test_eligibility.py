@@ -0,0 +1,83 @@
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from core import eligibility
+from core.models import AgencyShiftEligibility, Shift
+from core.tests.factories import approve, make_agency, make_hospital, make_shift, make_trust
+
+
+class EligibilityIndexTests(TestCase):
+    def setUp(self):
+        self.trust = make_trust()
+        self.hospital = make_hospital(trust=self.trust)
+        self.agency = make_agency()
+
+    def eligible_ids(self, agency=None):
+        return set(AgencyShiftEligibility.objects.filter(
+            agency=agency or self.agency
+        ).values_list('shift_id', flat=True))
+
+    def assertInSync(self):
+        self.assertEqual(eligibility.verify(), (0, 0))
+
+    def test_approval_grants_existing_and_new_open_shifts(self):
+        existing = make_shift(self.hospital)
+        make_shift(self.hospital, status=Shift.Status.BOOKED)
+        access = approve(self.agency, self.trust, approved=False)
+        self.assertEqual(self.eligible_ids(), set())
+
+        access.approved = True
+        access.save()
+        created = make_shift(self.hospital)
+        self.assertEqual(self.eligible_ids(), {existing.id, created.id})
+        self.assertInSync()
+
+    def test_revoking_or_deleting_access_removes_rows(self):
+        make_shift(self.hospital)
+        access = approve(self.agency, self.trust)
+        access.approved = False
+        access.save()
+        self.assertEqual(self.eligible_ids(), set())
+
+        access.approved = True
+        access.save()
+        access.delete()
+        self.assertEqual(self.eligible_ids(), set())
+        self.assertInSync()
+
+    def test_shift_leaves_index_when_booked_and_returns_when_reopened(self):
+        approve(self.agency, self.trust)
+        shift = make_shift(self.hospital)
+        shift.status = Shift.Status.BOOKED
+        shift.save()
+        self.assertEqual(self.eligible_ids(), set())
+        shift.status = Shift.Status.OPEN
+        shift.save()
+        self.assertEqual(self.eligible_ids(), {shift.id})
+
+    def test_hospital_moving_trust_moves_its_shifts(self):
+        other_trust = make_trust()
+        other_agency = make_agency()
+        approve(self.agency, self.trust)
+        approve(other_agency, other_trust)
+        shift = make_shift(self.hospital)
+
+        self.hospital.trust = other_trust
+        self.hospital.save()
+        self.assertEqual(self.eligible_ids(), set())
+        self.assertEqual(self.eligible_ids(other_agency), {shift.id})
+        self.assertInSync()
+
+    def test_command_rebuilds_after_out_of_band_update(self):
+        approve(self.agency, self.trust)
+        shift = make_shift(self.hospital)
+        Shift.objects.filter(pk=shift.pk).update(status=Shift.Status.CANCELLED)
+        self.assertEqual(eligibility.verify(), (0, 1))
+
+        with self.assertRaises(CommandError):
+            call_command('rebuild_shift_eligibility', verify_only=True, stdout=StringIO())
+        call_command('rebuild_shift_eligibility', stdout=StringIO())
+        self.assertEqual(self.eligible_ids(), set())
+        self.assertInSync()
@@ -0,0 +1,71 @@
+import csv
+import io
+import json
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core import exports
+from core.models import User
+from core.tests.factories import (
+    make_agency, make_booking, make_hospital, make_nurse, make_shift, make_trust, make_user
+)
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.trust = make_trust(name='North Trust')
+        cls.hospital = make_hospital(trust=cls.trust, name='General')
+        cls.agency = make_agency(name='Care Co')
+        cls.nurse = make_nurse(cls.agency, full_name='Ada Lovelace')
+        cls.booked = make_shift(cls.hospital, duration_hours=Decimal('7.50'), rate_per_hour=Decimal('31.20'))
+        cls.booking = make_booking(cls.booked, cls.nurse)
+        cls.open = make_shift(make_hospital(), days=5)
+
+    def read(self, response):
+        return list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))
+
+    def test_rows_are_fetched_in_one_query(self):
+        for day in range(2, 20):
+            make_booking(make_shift(self.hospital, days=day), self.nurse)
+        with CaptureQueriesContext(connection) as queries:
+            rows = list(exports.booking_export().rows())
+        self.assertEqual(len(rows), 19)
+        self.assertEqual(len(queries), 1)
+
+    def test_admin_shift_export_joins_names_and_amount(self):
+        self.client.force_login(make_user(User.Role.ADMIN))
+        response = self.client.get(reverse('export_shifts'), {'trust': self.trust.id})
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = self.read(response)
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['trust'], 'North Trust')
+        self.assertEqual(rows[0]['agency'], 'Care Co')
+        self.assertEqual(rows[0]['nurse'], 'Ada Lovelace')
+        self.assertEqual(Decimal(rows[0]['amount']), Decimal('234.0000'))
+
+    def test_hospitals_and_agencies_only_export_their_own_rows(self):
+        self.client.force_login(self.hospital.user)
+        rows = self.read(self.client.get(reverse('export_shifts')))
+        self.assertEqual([int(r['shift_id']) for r in rows], [self.booked.id])
+
+        self.client.force_login(make_agency().user)
+        self.assertEqual(self.read(self.client.get(reverse('export_bookings'))), [])
+
+    def test_invalid_filters_are_rejected(self):
+        self.client.force_login(make_user(User.Role.ADMIN))
+        response = self.client.get(reverse('export_bookings'), {'date_from': 'yesterday'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_command_writes_ndjson(self):
+        out = StringIO()
+        call_command('export_finance', 'bookings', format='ndjson', stdout=out)
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(rows[0]['booking_id'], self.booking.id)
+        self.assertEqual(rows[0]['hospital'], 'General')
@@ -0,0 +1,94 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.template import engines
+from django.test import TestCase
+from django.urls import reverse
+
+from core import compliance, fragments
+from core.models import Nurse
+from core.tests.factories import (
+    approve, make_agency, make_booking, make_document, make_hospital, make_nurse, make_shift, make_trust
+)
+
+
+class FragmentCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.trust = make_trust(name='North Trust')
+        cls.hospital = make_hospital(trust=cls.trust, name='General Hospital')
+        cls.agency = make_agency()
+        approve(cls.agency, cls.trust)
+        cls.nurse = make_nurse(cls.agency, full_name='Ada Lovelace')
+
+    def setUp(self):
+        fragments.reset_stats()
+        fragments.cache().clear()
+        self.addCleanup(fragments.cache().clear)
+
+    def get(self, user, name):
+        self.client.force_login(user)
+        return self.client.get(reverse(name)).content.decode()
+
+    def table(self, user, name):
+        return self.get(user, name).split('<tbody', 1)[1].split('</tbody>', 1)[0]
+
+    def test_unchanged_table_is_one_lookup_and_changed_rows_are_rerendered(self):
+        shifts = [make_shift(self.hospital, days=day, ward=f'Ward {day}') for day in (1, 2, 3)]
+        first = self.table(self.hospital.user, 'shift_list')
+        with mock.patch.object(fragments.cache(), 'get_many', side_effect=AssertionError('rows looked up')):
+            self.assertEqual(self.table(self.hospital.user, 'shift_list'), first)
+
+        shifts[0].ward = 'Ward 9'
+        shifts[0].save()
+        self.assertIn('Ward 9', self.get(self.hospital.user, 'shift_list'))
+        self.assertEqual(fragments.stats()['shift_list'], {
+            'table_hits': 1, 'table_misses': 2, 'row_hits': 2, 'row_misses': 4,
+            'table_hit_rate': 1 / 3, 'row_hit_rate': 2 / 6,
+        })
+
+    def test_bookings_and_renames_reach_the_shift_tables(self):
+        shift = make_shift(self.hospital)
+        self.assertNotIn('View Booking', self.get(self.hospital.user, 'shift_list'))
+        self.assertIn('North Trust', self.get(self.agency.user, 'available_shifts'))
+        make_booking(shift, self.nurse)
+        self.assertIn('View Booking', self.get(self.hospital.user, 'shift_list'))
+
+        other = make_shift(self.hospital, days=2)
+        self.trust.name = 'South Trust'
+        self.trust.save()
+        self.assertIn('South Trust', self.get(self.agency.user, 'available_shifts'))
+        self.hospital.name = 'Royal Hospital'
+        self.hospital.save()
+        self.assertIn('Royal Hospital', self.get(self.hospital.user, 'shift_list'))
+        other.refresh_from_db()
+        self.assertEqual(other.cache_version, 2)
+
+    def test_documents_and_compliance_reach_the_nurse_table(self):
+        self.assertNotIn('View Documents', self.get(self.agency.user, 'nurse_list'))
+        for document_type in ('registration', 'dbs', 'right_to_work'):
+            make_document(self.nurse, document_type=document_type)
+        page = self.get(self.agency.user, 'nurse_list')
+        self.assertIn('View Documents', page)
+
+        Nurse.objects.filter(pk=self.nurse.pk).update(compliant_until='2000-01-01')
+        compliance.roll_over()
+        self.assertIn('Missing or expired documents', self.get(self.agency.user, 'nurse_list'))
+
+    def test_saves_bump_the_version_in_the_database(self):
+        nurse = make_nurse(self.agency)
+        nurse.save()
+        nurse.save(update_fields=['full_name'])
+        self.assertEqual(nurse.cache_version, 2)
+
+    def test_report_and_cached_template_loader(self):
+        self.get(self.agency.user, 'nurse_list')
+        self.get(self.agency.user, 'nurse_list')
+        out = StringIO()
+        call_command('fragment_stats', reset=True, stdout=out)
+        self.assertIn('nurse_list: tables 1 hits, 1 misses (50%); rows 0 reused, 1 rendered (0%)', out.getvalue())
+        self.assertEqual(fragments.stats(), {})
+
+        [loader] = engines['django'].engine.template_loaders
+        self.assertEqual(type(loader).__module__, 'django.template.loaders.cached')
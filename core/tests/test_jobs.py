@@ -0,0 +1,87 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from core import jobs
+from core.models import Job
+
+calls = []
+
+
+@jobs.task(max_attempts=2)
+def record(value):
+    calls.append(value)
+
+
+@jobs.task(max_attempts=2)
+def fail():
+    raise ValueError('no')
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_jobs_run_once_in_order(self):
+        first = jobs.enqueue(record, 'first')
+        jobs.enqueue(record, 'second')
+        jobs.enqueue(record, 'later', delay=timedelta(hours=1))
+        jobs.Worker().run(burst=True)
+        self.assertEqual(calls, ['first', 'second'])
+        first.refresh_from_db()
+        self.assertEqual((first.status, first.attempts, first.claim), (Job.Status.DONE, 1, ''))
+        jobs.Worker().run(burst=True)
+        self.assertEqual(len(calls), 2)
+
+    def test_a_claimed_job_cannot_be_claimed_again(self):
+        job = jobs.enqueue(record, 1)
+        self.assertEqual(jobs.claim(5), [job])
+        self.assertEqual(jobs.claim(5), [])
+
+    def test_failures_back_off_then_die(self):
+        job = jobs.enqueue(fail)
+        started = timezone.now()
+        jobs.Worker().run(burst=True)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.Status.QUEUED, 1))
+        self.assertGreaterEqual(job.run_at, started + timedelta(seconds=jobs.BACKOFF_SECONDS))
+        self.assertIn('ValueError: no', job.last_error)
+
+        Job.objects.update(run_at=timezone.now())
+        jobs.Worker().run(burst=True)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.Status.DEAD, 2))
+        self.assertEqual(jobs.backoff(3), timedelta(seconds=jobs.BACKOFF_SECONDS * 4))
+
+    def test_expired_leases_are_requeued(self):
+        job = jobs.enqueue(record, 'again')
+        jobs.claim(1)
+        Job.objects.update(claimed_at=timezone.now() - jobs.LEASE - timedelta(seconds=1))
+        jobs.Worker().run(burst=True)
+        self.assertEqual(calls, ['again'])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.Status.DONE, 2))
+
+    def test_a_job_whose_lease_keeps_expiring_dies(self):
+        job = jobs.enqueue(record, 'crash')
+        for status in (Job.Status.QUEUED, Job.Status.DEAD):
+            jobs.claim(1)
+            Job.objects.update(claimed_at=timezone.now() - jobs.LEASE - timedelta(seconds=1))
+            self.assertEqual(jobs.requeue_expired(), 1)
+            job.refresh_from_db()
+            self.assertEqual(job.status, status)
+        self.assertEqual(job.attempts, 2)
+        self.assertIn('Lease expired', job.last_error)
+        self.assertEqual(jobs.claim(1), [])
+
+    def test_worker_command_reports_throughput_and_depth(self):
+        jobs.enqueue(record, 1)
+        jobs.enqueue(fail)
+        out = StringIO()
+        call_command('run_worker', concurrency=1, burst=True, stdout=out)
+        self.assertIn('In total: 1 done', out.getvalue())
+        self.assertIn('1 retried, 0 dead', out.getvalue())
+        self.assertIn('Queue: 1 queued, 0 running, 0 dead', out.getvalue())
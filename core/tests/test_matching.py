@@ -0,0 +1,109 @@
+from datetime import time, timedelta
+
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from core import matching
+from core.models import Booking, NurseDocument, Shift
+from core.tests.factories import (
+    approve, make_agency, make_booking, make_document, make_hospital, make_nurse, make_shift
+)
+
+
+def compliant_nurse(agency, expires_in=365, **kwargs):
+    nurse = make_nurse(agency, **kwargs)
+    for document_type in NurseDocument.REQUIRED_TYPES:
+        make_document(nurse, document_type, expiry_date=timezone.now().date() + timedelta(days=expires_in))
+    return nurse
+
+
+class NursePoolTests(TestCase):
+    def setUp(self):
+        self.hospital = make_hospital()
+        self.agency = make_agency()
+        approve(self.agency, self.hospital.trust)
+        self.shift = make_shift(self.hospital, days=10, specialty_required='ICU', duration_hours=12)
+
+    def matched(self, shift=None):
+        return [m.nurse_id for m in matching.NursePool.for_agency(self.agency.id).match(shift or self.shift)]
+
+    def test_requires_specialty_and_valid_verified_documents(self):
+        good = compliant_nurse(self.agency, specialty='icu ')
+        compliant_nurse(self.agency, specialty='Theatre')
+        compliant_nurse(self.agency, expires_in=5, specialty='ICU')
+        unverified = make_nurse(self.agency, specialty='ICU')
+        make_document(unverified, 'registration')
+        make_document(unverified, 'dbs', verified=False)
+        missing = make_nurse(self.agency, specialty='ICU')
+        make_document(missing, 'registration')
+        self.assertEqual(self.matched(), [good.id])
+
+    def test_unspecified_specialty_accepts_anyone(self):
+        nurses = {compliant_nurse(self.agency, specialty=s).id for s in ('ICU', 'Theatre')}
+        shift = make_shift(self.hospital, days=10, specialty_required='')
+        self.assertEqual(set(self.matched(shift)), nurses)
+
+    def test_excludes_overlapping_bookings_including_overnight(self):
+        free = compliant_nurse(self.agency, specialty='ICU')
+        night = compliant_nurse(self.agency, specialty='ICU')
+        previous_night = make_shift(
+            self.hospital, days=9, shift_time=time(20, 0), duration_hours=13, status=Shift.Status.BOOKED
+        )
+        make_booking(previous_night, night)
+        cancelled = compliant_nurse(self.agency, specialty='ICU')
+        make_booking(
+            make_shift(self.hospital, days=10, status=Shift.Status.BOOKED, duration_hours=12), cancelled, cancelled=True
+        )
+        self.assertEqual(set(self.matched()), {free.id, cancelled.id})
+
+    def test_ranks_nurses_who_know_the_hospital_first(self):
+        newcomer = compliant_nurse(self.agency, specialty='ICU', full_name='Aaron')
+        regular = compliant_nurse(self.agency, specialty='ICU', full_name='Zoe')
+        past = make_shift(self.hospital, days=1, status=Shift.Status.COMPLETED)
+        Shift.objects.filter(pk=past.pk).update(shift_date=timezone.now().date() - timedelta(days=30))
+        make_booking(past, regular)
+        matches = matching.NursePool.for_agency(self.agency.id).match(self.shift)
+        self.assertEqual([m.nurse_id for m in matches], [regular.id, newcomer.id])
+        self.assertEqual(matches[0].shifts_at_hospital, 1)
+
+    def test_best_shifts_for_a_nurse(self):
+        nurse = compliant_nurse(self.agency, expires_in=20, specialty='ICU')
+        better_paid = make_shift(self.hospital, days=12, specialty_required='ICU', rate_per_hour=40)
+        make_shift(self.hospital, days=12, specialty_required='Theatre')
+        make_shift(self.hospital, days=30, specialty_required='ICU')
+        clash = make_shift(self.hospital, days=15, specialty_required='ICU')
+        make_booking(make_shift(self.hospital, days=15, status=Shift.Status.BOOKED), nurse)
+        shifts = [m.shift.id for m in matching.best_shifts(nurse)]
+        self.assertEqual(shifts, [better_paid.id, self.shift.id])
+        self.assertNotIn(clash.id, shifts)
+
+
+class BookingFormMatchingTests(TestCase):
+    def setUp(self):
+        self.hospital = make_hospital()
+        self.agency = make_agency()
+        approve(self.agency, self.hospital.trust)
+        self.shift = make_shift(self.hospital, specialty_required='ICU')
+        self.client.force_login(self.agency.user)
+
+    def test_only_matching_nurses_can_be_booked(self):
+        good = compliant_nurse(self.agency, specialty='ICU')
+        wrong = compliant_nurse(self.agency, specialty='Theatre')
+        url = reverse('book_shift', args=[self.shift.id])
+        response = self.client.get(url)
+        self.assertEqual([m.nurse_id for m in response.context['form'].matches], [good.id])
+
+        response = self.client.post(url, {'nurse': wrong.id})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Booking.objects.exists())
+        response = self.client.post(url, {'nurse': good.id})
+        self.assertRedirects(response, reverse('available_shifts'))
+        self.assertEqual(Booking.objects.get().nurse, good)
+
+    def test_nurse_shift_matches_view(self):
+        nurse = compliant_nurse(self.agency, specialty='ICU')
+        response = self.client.get(reverse('nurse_shift_matches', args=[nurse.id]))
+        self.assertEqual([m.shift for m in response.context['matches']], [self.shift])
+        other = make_nurse(make_agency())
+        self.assertEqual(self.client.get(reverse('nurse_shift_matches', args=[other.id])).status_code, 404)
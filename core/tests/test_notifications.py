@@ -0,0 +1,103 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core import mail
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from core import jobs, notifications
+from core.models import DocumentExpiryNotification, Job
+from core.tests.factories import make_agency, make_document, make_nurse
+
+
+def in_days(days):
+    return timezone.now().date() + timedelta(days=days)
+
+
+class ExpiryDigestTests(TestCase):
+    def setUp(self):
+        self.agency = make_agency()
+        nurse = make_nurse(self.agency)
+        make_document(nurse, 'dbs', expiry_date=in_days(5))
+        make_document(nurse, 'id', expiry_date=in_days(20))
+        make_document(make_nurse(self.agency), 'insurance', expiry_date=in_days(10))
+        make_document(nurse, 'registration', expiry_date=in_days(90))
+        self.other_agency = make_agency()
+        make_document(make_nurse(self.other_agency), 'dbs', expiry_date=in_days(1))
+
+    def run_command(self, **options):
+        out = StringIO()
+        call_command('check_expiring_documents', stdout=out, **options)
+        # The digests are sent by the job queue.
+        jobs.Worker().run(burst=True)
+        return out.getvalue()
+
+    def test_one_digest_per_agency(self):
+        self.run_command(days=30)
+        self.assertEqual(len(mail.outbox), 2)
+        digest = next(m for m in mail.outbox if m.to == [self.agency.contact_email])
+        self.assertEqual(digest.subject, '3 Documents Expiring Soon')
+        self.assertIn('DBS Check', digest.body)
+        self.assertEqual(DocumentExpiryNotification.objects.count(), 4)
+
+    def test_rerun_does_not_resend(self):
+        self.run_command(days=30)
+        mail.outbox.clear()
+        output = self.run_command(days=30)
+        self.assertEqual(mail.outbox, [])
+        self.assertIn('Queued 0 digests', output)
+
+    def test_corrected_expiry_date_is_warned_again(self):
+        self.run_command(days=30)
+        mail.outbox.clear()
+        document = self.agency.nurses.first().documents.get(document_type='dbs')
+        document.expiry_date = in_days(6)
+        document.save()
+        self.run_command(days=30)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_dry_run_sends_and_records_nothing(self):
+        output = self.run_command(days=30, dry_run=True)
+        self.assertIn('4 expiring documents across 2 agencies', output)
+        self.assertEqual(mail.outbox, [])
+        self.assertFalse(DocumentExpiryNotification.objects.exists())
+
+    def test_now_sends_without_the_queue(self):
+        output = self.run_command(days=30, now=True, workers=2)
+        self.assertIn('Sent 2 digests covering 4 documents', output)
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertFalse(Job.objects.exists())
+
+    def test_failed_digests_are_retried(self):
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=OSError):
+            self.run_command(days=30)
+        self.assertFalse(DocumentExpiryNotification.objects.exists())
+        self.assertEqual(Job.objects.filter(status=Job.Status.QUEUED, attempts=1).count(), 2)
+        Job.objects.update(run_at=timezone.now())
+        jobs.Worker().run(burst=True)
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(DocumentExpiryNotification.objects.count(), 4)
+
+    def test_overlapping_jobs_send_each_document_once(self):
+        call_command('check_expiring_documents', days=30, stdout=StringIO())
+        call_command('check_expiring_documents', days=30, stdout=StringIO())
+        self.assertEqual(Job.objects.count(), 4)
+        jobs.Worker().run(burst=True)
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(DocumentExpiryNotification.objects.count(), 4)
+
+    def test_failed_digests_are_not_recorded(self):
+        digests = notifications.build_digests(notifications.pending_documents(30))
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=OSError):
+            report = notifications.send_digests(digests, workers=2)
+        self.assertEqual(len(report.failed), 2)
+        self.assertFalse(DocumentExpiryNotification.objects.exists())
+
+    def test_agencies_without_email_are_skipped(self):
+        self.other_agency.contact_email = ''
+        self.other_agency.save()
+        output = self.run_command(days=30)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn('No contact email', output)
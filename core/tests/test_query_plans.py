@@ -0,0 +1,95 @@
+import re
+from io import StringIO
+from unittest import skipUnless
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.models import User
+from core.tests.factories import (
+    approve, make_agency, make_document, make_hospital, make_nurse, make_shift, make_trust, make_user
+)
+
+# A bare "SCAN core_shift" (no "USING ... INDEX") means SQLite reads every row of the table.
+FULL_SCAN = re.compile(r'^SCAN (core_\w+)$')
+# Tables that grow with activity. Trusts, hospitals and agencies are small
+# reference tables that the admin dashboard legitimately counts in full.
+LARGE_TABLES = {
+    'core_shift', 'core_booking', 'core_nurse', 'core_nursedocument',
+    'core_trustagencyaccess', 'core_agencyshifteligibility', 'core_documentexpirynotification',
+}
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN output is SQLite specific')
+class QueryPlanTests(TestCase):
+    """
+    Runs every page through the test client, then EXPLAINs each query it issued.
+    A view that regresses to a full table scan of one of our tables fails here
+    long before the table is big enough for anyone to notice in production.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.trust = make_trust()
+        cls.hospital = make_hospital(trust=cls.trust)
+        cls.agency = make_agency()
+        approve(cls.agency, cls.trust)
+        cls.nurse = make_nurse(cls.agency)
+        make_document(cls.nurse)
+        make_document(cls.nurse, 'dbs')
+        cls.shift = make_shift(cls.hospital)
+        cls.admin = make_user(User.Role.ADMIN)
+
+    def plan(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assertPlansUseIndexes(self, queries, label):
+        for query in queries:
+            sql = query['sql']
+            if not sql.lstrip().upper().startswith('SELECT'):
+                continue
+            for step in self.plan(sql):
+                match = FULL_SCAN.match(step)
+                if match and match.group(1) in LARGE_TABLES:
+                    self.fail(f'{label} scans {match.group(1)}:\n{sql}')
+
+    def assertNoFullScans(self, user, url):
+        self.client.force_login(user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertLess(response.status_code, 400, url)
+        self.assertPlansUseIndexes(queries, url)
+
+    def test_hospital_views(self):
+        for name in ('dashboard', 'shift_list', 'shift_create', 'shift_calendar', 'shift_calendar_json'):
+            with self.subTest(name):
+                self.assertNoFullScans(self.hospital.user, reverse(name))
+
+    def test_agency_views(self):
+        urls = [
+            reverse('dashboard'),
+            reverse('nurse_list'),
+            reverse('nurse_create'),
+            reverse('nurse_documents', args=[self.nurse.id]),
+            reverse('nurse_document_upload', args=[self.nurse.id]),
+            reverse('nurse_shift_matches', args=[self.nurse.id]),
+            reverse('available_shifts'),
+            reverse('available_shifts') + '?specialty=General+Nursing&date_to=2100-01-01',
+            reverse('book_shift', args=[self.shift.id]),
+        ]
+        for url in urls:
+            with self.subTest(url):
+                self.assertNoFullScans(self.agency.user, url)
+
+    def test_admin_views(self):
+        self.assertNoFullScans(self.admin, reverse('dashboard'))
+
+    def test_expiring_documents_command(self):
+        with CaptureQueriesContext(connection) as queries:
+            call_command('check_expiring_documents', days=400, stdout=StringIO())
+        self.assertPlansUseIndexes(queries, 'check_expiring_documents')
@@ -0,0 +1,58 @@
+from datetime import timedelta
+
+from django.db import connections, router
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core import replicas
+from core.models import Nurse, ReplicaHeartbeat
+from core.tests.factories import make_agency, make_nurse
+
+
+@override_settings(DATABASE_REPLICAS=['replica'], REPLICA_MAX_LAG=30)
+class ReplicaRoutingTests(TestCase):
+    def setUp(self):
+        # The "replica" alias shares the test connection, so it sees the
+        # test's rows and every query it runs is still rolled back.
+        connections['replica'] = connections['default']
+        self.addCleanup(connections.__delitem__, 'replica')
+        replicas.reset_health()
+        self.addCleanup(replicas.reset_health)
+        ReplicaHeartbeat.objects.create(pk=1, beat_at=timezone.now())
+
+        self.agency = make_agency()
+        make_nurse(self.agency)
+        self.client.force_login(self.agency.user)
+
+    def listed_from(self):
+        response = self.client.get(reverse('nurse_list'))
+        self.assertEqual(response.status_code, 200)
+        return {nurse._state.db for nurse in response.context['nurses']}
+
+    def test_read_only_views_read_from_a_replica(self):
+        self.assertEqual(self.listed_from(), {'replica'})
+        self.assertEqual(Nurse.objects.first()._state.db, 'default')
+        with replicas.reading_from('replica'):
+            self.assertEqual(router.db_for_write(Nurse), 'default')
+
+    def test_lagging_replica_is_skipped(self):
+        ReplicaHeartbeat.objects.filter(pk=1).update(beat_at=timezone.now() - timedelta(minutes=5))
+        self.assertEqual(self.listed_from(), {'default'})
+
+    def test_writer_reads_from_the_primary_for_a_while(self):
+        response = self.client.post(reverse('nurse_create'), {
+            'full_name': 'New Nurse',
+            'dob': '1990-01-01',
+            'registration_number': 'NMC999999',
+            'specialty': 'ICU',
+        })
+        self.assertIn(replicas.PIN_COOKIE, response.cookies)
+        self.assertEqual(self.listed_from(), {'default'})
+
+        self.client.cookies.pop(replicas.PIN_COOKIE)
+        self.assertEqual(self.listed_from(), {'replica'})
+
+    def test_reads_do_not_pin(self):
+        response = self.client.get(reverse('nurse_list'))
+        self.assertNotIn(replicas.PIN_COOKIE, response.cookies)
@@ -0,0 +1,75 @@
+import io
+import json
+from datetime import timedelta
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from core import rota_import
+from core.models import AgencyShiftEligibility, Shift
+from core.tests.factories import approve, make_agency, make_hospital
+
+
+def future(days=7):
+    return (timezone.now().date() + timedelta(days=days)).isoformat()
+
+
+class RotaParsingTests(TestCase):
+    def rows(self, content, fmt):
+        return list(rota_import.iter_rows(io.BytesIO(content.encode()), fmt))
+
+    def test_csv_with_bom(self):
+        rows = self.rows('﻿ward,shift_date\nICU,2030-01-01\n', 'csv')
+        self.assertEqual(rows, [{'ward': 'ICU', 'shift_date': '2030-01-01'}])
+
+    def test_json_array_and_ndjson(self):
+        entries = [{'ward': f'W{i}', 'notes': 'x' * 100} for i in range(2000)]
+        self.assertEqual(self.rows(json.dumps(entries), 'json'), entries)
+        self.assertEqual(self.rows('\n'.join(json.dumps(e) for e in entries), 'json'), entries)
+
+    def test_malformed_json(self):
+        for content in ('[{"ward": "ICU"}', '{"ward": ', '[1, 2]'):
+            with self.assertRaises(rota_import.RotaFormatError, msg=content):
+                self.rows(content, 'json')
+
+
+class ImportRotaTests(TestCase):
+    def setUp(self):
+        self.hospital = make_hospital()
+        self.agency = make_agency()
+        approve(self.agency, self.hospital.trust)
+
+    def test_imports_valid_rows_and_reports_invalid_ones(self):
+        rows = [
+            {'ward': 'ICU', 'shift_date': future(), 'shift_time': '08:00', 'duration_hours': '12', 'rate_per_hour': '30'},
+            {'ward': 'A&E', 'shift_date': '2001-01-01', 'shift_time': '08:00'},
+            {'ward': 'A&E', 'shift_date': future(), 'shift_time': 'noon'},
+            {'ward': 'Theatre', 'shift_date': future(3), 'shift_time': '20:00'},
+        ]
+        report = rota_import.import_rota(self.hospital, iter(rows), batch_size=1)
+        self.assertEqual(report.created, 2)
+        self.assertEqual([row for row, _ in report.errors], [2, 3])
+        self.assertIn('shift_date', report.errors[0][1])
+        self.assertIn('shift_time', report.errors[1][1])
+        self.assertEqual(Shift.objects.filter(hospital=self.hospital).count(), 2)
+        # bulk_create bypasses signals; the importer must still feed the eligibility index.
+        self.assertEqual(AgencyShiftEligibility.objects.filter(agency=self.agency).count(), 2)
+
+    def test_keeps_rows_before_a_format_error(self):
+        content = json.dumps({'shift_date': future(), 'shift_time': '08:00'}) + '\n{"ward": '
+        report = rota_import.import_rota(self.hospital, rota_import.iter_rows(io.BytesIO(content.encode()), 'json'))
+        self.assertEqual(report.created, 1)
+        self.assertIsNotNone(report.format_error)
+
+    def test_upload_view(self):
+        self.client.force_login(self.hospital.user)
+        upload = SimpleUploadedFile(
+            'rota.csv',
+            f'ward,shift_date,shift_time\nICU,{future()},08:00\nICU,bad,08:00\n'.encode(),
+        )
+        response = self.client.post(reverse('shift_import'), {'file': upload})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['report'].created, 1)
+        self.assertContains(response, 'Enter a valid date.')
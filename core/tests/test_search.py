@@ -0,0 +1,85 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+
+from core import search
+from core.models import Nurse, Shift, User
+from core.tests.factories import (
+    approve, make_agency, make_booking, make_hospital, make_nurse, make_shift, make_trust, make_user
+)
+
+
+class SearchIndexTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.agency = make_agency(name='Northern Care')
+        cls.trust = make_trust()
+        approve(cls.agency, cls.trust)
+        cls.hospital = make_hospital(trust=cls.trust, name='St Mary')
+        cls.smith = make_nurse(cls.agency, full_name='Joanna Smith', registration_number='12A3456E', specialty='ICU')
+        cls.jones = make_nurse(cls.agency, full_name='Ann Jones', registration_number='99B0001X', specialty='Smithfield ICU')
+        cls.shift = make_shift(cls.hospital, ward='Ward 7', po_number='PO-2026-00417')
+
+    def found(self, model, text, **kwargs):
+        return list(search.search_queryset(model.objects.all(), text, **kwargs).values_list('pk', flat=True))
+
+    def test_prefix_and_number_lookups(self):
+        self.assertEqual(self.found(Nurse, 'joa smi'), [self.smith.pk])
+        self.assertEqual(self.found(Nurse, '12a3456e'), [self.smith.pk])
+        self.assertEqual(self.found(Shift, 'PO-2026-00417'), [self.shift.pk])
+        self.assertEqual(self.found(Shift, '00417'), [self.shift.pk])
+        self.assertEqual(self.found(Nurse, 'smith OR 1=1"'), [])
+        self.assertEqual(self.found(Nurse, '--'), [])
+
+    def test_name_matches_rank_above_specialty_matches(self):
+        self.assertEqual(self.found(Nurse, 'smith', ranked=True), [self.smith.pk, self.jones.pk])
+
+    def test_saves_and_deletes_keep_the_index_current(self):
+        self.smith.full_name = 'Joanna Baker'
+        self.smith.save()
+        self.assertEqual(self.found(Nurse, 'baker'), [self.smith.pk])
+        self.assertEqual(self.found(Nurse, 'joanna smith'), [])
+
+        self.hospital.name = 'Royal Infirmary'
+        self.hospital.save()
+        self.assertEqual(self.found(Shift, 'royal'), [self.shift.pk])
+
+        shift_id = self.shift.pk
+        self.shift.delete()
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT count(*) FROM core_shift_search WHERE rowid = %s', [shift_id])
+            self.assertEqual(cursor.fetchone()[0], 0)
+
+    def test_rebuild_command_restores_the_index(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM core_nurse_search')
+        self.assertEqual(self.found(Nurse, 'smith'), [])
+        call_command('rebuild_search_index', model=['nurse'], stdout=StringIO())
+        self.assertEqual(self.found(Nurse, 'joanna'), [self.smith.pk])
+
+    def test_search_boxes(self):
+        other = make_nurse(make_agency(), full_name='Joanna Smithers')
+        self.client.force_login(self.agency.user)
+        response = self.client.get(reverse('nurse_list'), {'q': 'smith'})
+        self.assertEqual([nurse.pk for nurse in response.context['nurses']], [self.smith.pk, self.jones.pk])
+        self.assertNotIn(other.pk, [nurse.pk for nurse in response.context['nurses']])
+
+        response = self.client.get(reverse('available_shifts'), {'q': 'ward 7'})
+        self.assertEqual([shift.pk for shift in response.context['shifts']], [self.shift.pk])
+        response = self.client.get(reverse('available_shifts'), {'q': 'ward 8'})
+        self.assertEqual(list(response.context['shifts']), [])
+
+        self.client.force_login(self.hospital.user)
+        response = self.client.get(reverse('shift_list'), {'q': '00417'})
+        self.assertEqual([shift.pk for shift in response.context['shifts']], [self.shift.pk])
+
+    def test_admin_searches_through_the_index(self):
+        make_booking(make_shift(self.hospital, po_number='PO-77', status=Shift.Status.BOOKED), self.jones)
+        self.client.force_login(make_user(User.Role.ADMIN, is_staff=True, is_superuser=True))
+        response = self.client.get(reverse('admin:core_booking_changelist'), {'q': 'jones'})
+        self.assertEqual(response.context['cl'].result_count, 1)
+        response = self.client.get(reverse('admin:core_nurse_changelist'), {'q': '99b0001x'})
+        self.assertEqual([nurse.pk for nurse in response.context['cl'].result_list], [self.jones.pk])
@@ -0,0 +1,90 @@
+from datetime import date, time, timedelta
+
+from django.test import TestCase
+from django.urls import reverse
+
+from core.models import Hospital
+from core.tests.factories import make_agency, make_booking, make_hospital, make_nurse, make_shift, make_trust
+
+START = date(2100, 3, 1)
+
+
+class ShiftCalendarTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.hospital = make_hospital(trust=make_trust())
+        cls.nurse = make_nurse(make_agency())
+        cls.late = make_shift(cls.hospital, ward='Ward B', shift_date=START, shift_time=time(20, 0))
+        cls.early = make_shift(cls.hospital, ward='Ward B', shift_date=START, shift_time=time(8, 0))
+        cls.ward_a = make_shift(cls.hospital, ward='Ward A', shift_date=START)
+        cls.last_day = make_shift(cls.hospital, shift_date=START + timedelta(days=13))
+        make_shift(cls.hospital, shift_date=START + timedelta(days=14))
+        make_shift(cls.hospital, shift_date=START - timedelta(days=1))
+        make_shift(make_hospital(trust=cls.hospital.trust), shift_date=START)
+
+    def setUp(self):
+        self.client.force_login(self.hospital.user)
+
+    def get(self, name='shift_calendar_json', **headers):
+        return self.client.get(reverse(name), {'start': START.isoformat()}, headers=headers)
+
+    def test_window_is_grouped_by_day_and_ward(self):
+        data = self.get().json()
+        self.assertEqual((data['start'], data['end']), ('2100-03-01', '2100-03-14'))
+        self.assertEqual(len(data['days']), 14)
+        first = data['days'][0]['wards']
+        self.assertEqual([ward['ward'] for ward in first], ['Ward A', 'Ward B'])
+        self.assertEqual([shift['id'] for shift in first[1]['shifts']], [self.early.pk, self.late.pk])
+        self.assertEqual([day['wards'] for day in data['days'][1:13]], [[]] * 12)
+        self.assertEqual(data['days'][13]['wards'][0]['shifts'][0]['id'], self.last_day.pk)
+
+        response = self.get('shift_calendar')
+        self.assertContains(response, 'Ward B')
+        self.assertEqual(response.context['next_start'], START + timedelta(days=14))
+
+    def test_unchanged_calendar_is_not_modified(self):
+        response = self.get()
+        self.assertIn('no-cache', response['Cache-Control'])
+        with self.assertNumQueries(3):
+            repeat = self.get(if_none_match=response['ETag'])
+        self.assertEqual(repeat.status_code, 304)
+        self.assertEqual(self.get(if_modified_since=response['Last-Modified']).status_code, 304)
+        # The same version of another window, or as HTML, is a different entity.
+        self.assertNotEqual(self.get('shift_calendar')['ETag'], response['ETag'])
+
+    def test_shift_and_booking_changes_move_the_version(self):
+        etag = self.get()['ETag']
+        version = Hospital.objects.get(pk=self.hospital.pk).shifts_version
+
+        booking = make_booking(self.early, self.nurse)
+        response = self.get(if_none_match=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['days'][0]['wards'][1]['shifts'][0]['nurse'], self.nurse.full_name)
+
+        booking.delete()
+        self.late.ward = 'Ward C'
+        self.late.save()
+        self.assertEqual(Hospital.objects.get(pk=self.hospital.pk).shifts_version, version + 3)
+
+    def test_invalid_window_is_rejected(self):
+        response = self.client.get(reverse('shift_calendar_json'), {'weeks': 7})
+        self.assertEqual(response.status_code, 400)
+
+    def test_html_page_is_not_reused_across_logins(self):
+        # The first page sets the CSRF cookie its logout form depends on.
+        self.get('shift_calendar')
+        etag = self.get('shift_calendar')['ETag']
+        self.assertEqual(self.get('shift_calendar', if_none_match=etag).status_code, 304)
+        self.hospital.user.set_password('secret')
+        self.hospital.user.save()
+        self.client.post(reverse('logout'))
+        self.client.post(reverse('login'), {'username': self.hospital.user.username, 'password': 'secret'})
+        self.assertEqual(self.get('shift_calendar', if_none_match=etag).status_code, 200)
+
+    def test_renaming_a_nurse_moves_the_version(self):
+        make_booking(self.early, self.nurse)
+        etag = self.get()['ETag']
+        self.nurse.full_name = 'Renamed Nurse'
+        self.nurse.save()
+        response = self.get(if_none_match=etag)
+        self.assertEqual(response.json()['days'][0]['wards'][1]['shifts'][0]['nurse'], 'Renamed Nurse')
@@ -0,0 +1,102 @@
+import asyncio
+import json
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core import bookings, shift_events
+from core.models import ShiftEvent
+from core.tests.factories import approve, make_agency, make_document, make_hospital, make_nurse, make_shift, make_trust
+
+
+class ShiftEventTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.agency = make_agency()
+        cls.trust = make_trust()
+        cls.other_trust = make_trust()
+        approve(cls.agency, cls.trust)
+        approve(cls.agency, cls.other_trust, approved=False)
+        cls.hospital = make_hospital(trust=cls.trust)
+        cls.other_hospital = make_hospital(trust=cls.other_trust)
+        cls.nurse = make_nurse(cls.agency)
+        make_document(cls.nurse)
+
+    def setUp(self):
+        # A broker of its own for every test, whose outbox tailer never starts.
+        patches = [
+            mock.patch.dict(shift_events._brokers, clear=True),
+            mock.patch.object(shift_events.DatabaseBroker, '_tail', lambda broker: None),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_changes_are_written_to_the_outbox(self):
+        shift = make_shift(self.hospital)
+        make_shift(self.hospital, status='booked')
+        result = bookings.book_shift(shift.id, self.nurse.id, self.agency)
+        self.assertTrue(result)
+        events = list(ShiftEvent.objects.order_by('id').values_list('kind', 'shift_id', 'trust_id'))
+        self.assertEqual(events, [('opened', shift.id, self.trust.id), ('booked', shift.id, self.trust.id)])
+        self.assertEqual(ShiftEvent.objects.first().data['ward'], 'Ward A')
+
+    async def test_events_reach_only_subscribers_to_their_trust(self):
+        broker = shift_events.get_broker()
+        ours = broker.subscribe([self.trust.id])
+        theirs = broker.subscribe([self.other_trust.id])
+        await sync_to_async(broker.poll)()
+        shift = await sync_to_async(make_shift)(self.hospital)
+        self.assertEqual(await sync_to_async(broker.poll)(), 1)
+        event = await asyncio.wait_for(ours.queue.get(), 1)
+        self.assertEqual((event.kind, event.data['shift']), ('opened', shift.id))
+        self.assertTrue(theirs.queue.empty())
+        broker.unsubscribe(ours)
+        broker.unsubscribe(theirs)
+        self.assertEqual(broker.subscriber_count, 0)
+
+    async def test_stream_replays_missed_events_for_approved_trusts(self):
+        await sync_to_async(make_shift)(self.other_hospital)
+        shift = await sync_to_async(make_shift)(self.hospital)
+        await self.async_client.aforce_login(self.agency.user)
+        response = await self.async_client.get(reverse('shift_stream'), headers={'Last-Event-ID': '0'})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        messages = aiter(response.streaming_content)
+        try:
+            self.assertEqual(await anext(messages), b'retry: 3000\n\n')
+            message = (await anext(messages)).decode()
+        finally:
+            await messages.aclose()
+        lines = message.splitlines()
+        self.assertEqual(lines[1], 'event: shift-opened')
+        self.assertEqual(json.loads(lines[2][len('data: '):])['shift'], shift.id)
+
+    async def test_too_many_missed_events_resets_the_client(self):
+        await sync_to_async(make_shift)(self.hospital)
+        await sync_to_async(make_shift)(self.hospital)
+        chunks = []
+        with mock.patch.object(shift_events, 'REPLAY_LIMIT', 1):
+            async for chunk in shift_events.stream([self.trust.id], last_event_id='0'):
+                chunks.append(chunk)
+        self.assertEqual(chunks[-1], shift_events.RESET)
+        self.assertEqual(shift_events.get_broker().subscriber_count, 0)
+
+    async def test_idle_stream_keeps_alive_until_its_lifetime_ends(self):
+        with mock.patch.object(shift_events, 'KEEPALIVE_SECONDS', 0.05):
+            chunks = [chunk async for chunk in shift_events.stream([self.trust.id], lifetime=0.12)]
+        self.assertEqual(chunks[0], 'retry: 3000\n\n')
+        self.assertEqual(set(chunks[1:]), {': keep-alive\n\n'})
+        self.assertGreaterEqual(len(chunks), 3)
+        self.assertEqual(shift_events.get_broker().subscriber_count, 0)
+
+    @override_settings(SHIFT_EVENTS_BROKER='memory')
+    def test_memory_broker_publishes_on_commit(self):
+        broker = shift_events.get_broker()
+        with mock.patch.object(broker, 'fan_out') as fan_out:
+            with self.captureOnCommitCallbacks(execute=True):
+                shift = make_shift(self.hospital)
+        self.assertFalse(ShiftEvent.objects.exists())
+        [event] = fan_out.call_args.args[0]
+        self.assertEqual((event.kind, event.trust_id, event.data['shift']), ('opened', self.trust.id, shift.id))
@@ -0,0 +1,67 @@
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from core import bookings, stats
+from core.models import Shift, User
+from core.tests.factories import (
+    approve, make_agency, make_document, make_hospital, make_nurse, make_shift, make_user
+)
+
+
+class DashboardStatsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.hospital = make_hospital()
+        self.agency = make_agency()
+        approve(self.agency, self.hospital.trust)
+        self.nurse = make_nurse(self.agency)
+        make_shift(self.hospital)
+        make_shift(self.hospital, status=Shift.Status.COMPLETED)
+        make_shift(self.hospital, status=Shift.Status.CANCELLED)
+
+    def test_hospital_counts_in_one_query_then_cached(self):
+        with self.assertNumQueries(1):
+            counts = stats.hospital_stats(self.hospital.id)
+        self.assertEqual(counts, {'open': 1, 'booked': 0, 'completed': 1, 'cancelled': 1, 'upcoming': 1})
+        with self.assertNumQueries(0):
+            stats.hospital_stats(self.hospital.id)
+
+    def test_agency_and_platform_counts_in_one_query(self):
+        make_nurse(self.agency, is_approved=False)
+        make_document(self.nurse, expiry_date=timezone.now().date() + timedelta(days=3))
+        with self.assertNumQueries(1):
+            counts = stats.agency_stats(self.agency.id)
+        self.assertEqual(counts['nurses'], 2)
+        self.assertEqual(counts['pending_nurses'], 1)
+        self.assertEqual(counts['expiring_documents'], 1)
+        with self.assertNumQueries(1):
+            counts = stats.platform_stats()
+        self.assertEqual((counts['hospitals'], counts['agencies'], counts['open']), (1, 1, 1))
+
+    def test_booking_invalidates_hospital_and_agency(self):
+        stats.hospital_stats(self.hospital.id)
+        stats.agency_stats(self.agency.id)
+        shift = make_shift(self.hospital, days=2)
+        with self.captureOnCommitCallbacks(execute=True):
+            bookings.book_shift(shift.id, self.nurse.id, self.agency)
+        self.assertEqual(stats.hospital_stats(self.hospital.id)['booked'], 1)
+        self.assertEqual(stats.agency_stats(self.agency.id)['upcoming_bookings'], 1)
+
+    def test_document_upload_invalidates_agency(self):
+        self.assertEqual(stats.agency_stats(self.agency.id)['expiring_documents'], 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            make_document(self.nurse, expiry_date=timezone.now().date() + timedelta(days=3))
+        self.assertEqual(stats.agency_stats(self.agency.id)['expiring_documents'], 1)
+
+    def test_dashboards_render_counts(self):
+        for user, text in (
+            (self.hospital.user, 'Completed Shifts: 1'),
+            (self.agency.user, 'Nurses: 1 (1 approved, 0 pending)'),
+            (make_user(User.Role.ADMIN), 'Shifts: 1 open, 0 booked, 1 completed, 1 cancelled'),
+        ):
+            self.client.force_login(user)
+            self.assertContains(self.client.get(reverse('dashboard')), text)
@@ -0,0 +1,92 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core import throttle
+from core.models import User
+from core.tests.factories import make_user
+
+WINDOW = 15 * 60
+
+
+def user_writes(queries):
+    return [q['sql'] for q in queries if q['sql'].startswith('UPDATE "core_user"')]
+
+
+@override_settings(
+    LOGIN_FAILURE_WINDOW=WINDOW, LOGIN_FAILURE_LIMIT=5, LOGIN_IP_FAILURE_LIMIT=20,
+    # Keep the real code path without paying for a slow hash on every attempt.
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+)
+class LoginThrottleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = make_user(User.Role.AGENCY, password='correct horse')
+
+    def login(self, password, username=None, ip='10.0.0.1'):
+        return self.client.post(reverse('login'), {
+            'username': username or self.user.username,
+            'password': password,
+        }, REMOTE_ADDR=ip)
+
+    def test_failures_are_counted_in_the_cache_and_only_the_lockout_is_written(self):
+        with CaptureQueriesContext(connection) as queries:
+            for _ in range(4):
+                self.assertEqual(self.login('wrong').status_code, 200)
+        self.assertEqual(user_writes(queries.captured_queries), [])
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.login('wrong')
+        self.assertTrue(response.context['form'].throttled)
+        [write] = user_writes(queries.captured_queries)
+        self.assertNotIn('"password"', write)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.failed_login_attempts, 5)
+        self.assertIsNotNone(self.user.last_failed_login)
+        self.assertTrue(self.user.is_active)
+
+        # Locked out: even the right password is refused, without a write.
+        with CaptureQueriesContext(connection) as queries:
+            response = self.login('correct horse')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['form'].throttled)
+        self.assertEqual(user_writes(queries.captured_queries), [])
+
+    def test_lockout_in_another_case_is_written_to_the_account(self):
+        for _ in range(5):
+            self.login('wrong', username=self.user.username.upper())
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.failed_login_attempts, 5)
+        self.assertIsNotNone(self.user.last_failed_login)
+
+    def test_success_records_ip_and_clears_lockout_in_one_update(self):
+        User.objects.filter(pk=self.user.pk).update(failed_login_attempts=5)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.login('correct horse', ip='192.0.2.7')
+        self.assertRedirects(response, reverse('dashboard'), fetch_redirect_response=False)
+        self.assertEqual(len(user_writes(queries.captured_queries)), 1)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.last_login_ip, '192.0.2.7')
+        self.assertIsNotNone(self.user.last_login)
+        self.assertEqual(self.user.failed_login_attempts, 0)
+
+    def test_window_slides(self):
+        username, start = self.user.username, 1000 * WINDOW
+        for i in range(5):
+            throttle.record_failure(username, None, now=start + WINDOW - 10 + i)
+        self.assertTrue(throttle.is_locked(username.upper(), None, now=start + WINDOW - 1))
+        # Just past the boundary the previous window still mostly counts,
+        # so a single further failure locks the account again.
+        self.assertFalse(throttle.is_locked(username, None, now=start + WINDOW + 60))
+        self.assertTrue(throttle.record_failure(username, None, now=start + WINDOW + 60))
+        self.assertTrue(throttle.is_locked(username, None, now=start + WINDOW + 60))
+        self.assertFalse(throttle.is_locked(username, None, now=start + 3 * WINDOW))
+
+    def test_one_ip_spraying_many_usernames_is_throttled(self):
+        for i in range(20):
+            self.login('wrong', username=f'nobody{i}', ip='198.51.100.1')
+        self.assertTrue(self.login('correct horse', ip='198.51.100.1').context['form'].throttled)
+        self.assertEqual(self.login('correct horse', ip='198.51.100.2').status_code, 302)
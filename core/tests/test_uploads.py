@@ -0,0 +1,82 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from io import BytesIO
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from core import jobs, previews
+from core.models import NurseDocument
+from core.tests.factories import make_agency, make_nurse
+
+PDF = b'%PDF-1.4\n' + b'0' * 100000
+
+
+def png_bytes():
+    output = BytesIO()
+    Image.new('RGB', (1200, 800), 'teal').save(output, format='PNG')
+    return output.getvalue()
+
+
+class DocumentStorageTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings = override_settings(MEDIA_ROOT=self.media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def upload(self, nurse, content, name='dbs.pdf'):
+        self.client.force_login(nurse.agency.user)
+        response = self.client.post(reverse('nurse_document_upload', args=[nurse.id]), {
+            'document_type': 'dbs',
+            'file_url': SimpleUploadedFile(name, content),
+            'expiry_date': (timezone.now().date() + timedelta(days=365)).isoformat(),
+        })
+        self.assertRedirects(response, reverse('nurse_list'))
+        return NurseDocument.objects.filter(nurse=nurse).latest('id')
+
+    def stored_files(self):
+        return [files for _, _, files in os.walk(os.path.join(self.media_root, 'nurse_documents')) if files]
+
+    def test_identical_uploads_share_one_file(self):
+        first = self.upload(make_nurse(make_agency()), PDF)
+        second = self.upload(make_nurse(make_agency()), PDF, name='DBS copy.PDF')
+        digest = hashlib.sha256(PDF).hexdigest()
+        self.assertEqual((first.checksum, first.size), (digest, len(PDF)))
+        self.assertEqual(second.checksum, digest)
+        self.assertEqual(first.file_url.name, f'nurse_documents/{digest[:2]}/{digest}.pdf')
+        self.assertEqual(second.file_url.name, first.file_url.name)
+        self.assertEqual(self.stored_files(), [[f'{digest}.pdf']])
+        with second.file_url.open('rb') as fileobj:
+            self.assertEqual(fileobj.read(), PDF)
+
+    def test_preview_is_made_once_per_content(self):
+        image = png_bytes()
+        first = self.upload(make_nurse(make_agency()), image, name='scan.png')
+        second = self.upload(make_nurse(make_agency()), image, name='scan.png')
+        name = previews.generate(first.id)
+        self.assertEqual(name, previews.preview_name(first.checksum))
+        second.refresh_from_db()
+        self.assertEqual(second.preview.name, name)
+        with Image.open(second.preview.path) as thumbnail:
+            self.assertLessEqual(max(thumbnail.size), max(previews.PREVIEW_SIZE))
+
+    def test_upload_queues_its_preview(self):
+        document = self.upload(make_nurse(make_agency()), png_bytes(), name='scan.png')
+        self.assertFalse(document.preview)
+        jobs.Worker().run(burst=True)
+        document.refresh_from_db()
+        self.assertEqual(document.preview.name, previews.preview_name(document.checksum))
+
+    def test_pdfs_have_no_preview(self):
+        document = self.upload(make_nurse(make_agency()), PDF)
+        self.assertIsNone(previews.generate(document.id))
+        document.refresh_from_db()
+        self.assertFalse(document.preview)
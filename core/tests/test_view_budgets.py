@@ -0,0 +1,37 @@
+import shutil
+import tempfile
+
+from django.test import TestCase, override_settings
+
+from core import urls, viewbench
+from core.datagen import DataGenerator
+
+
+class ViewBudgetTests(TestCase):
+    """
+    The query half of ``bench_views``: every page, as the role that uses it,
+    must not issue more queries than ``view_budgets.json`` allows, with its
+    caches warm or empty. Latency and memory budgets need realistic volumes
+    and are checked by the command.
+    """
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        # The database broker tails its outbox from a thread, outside the test's transaction.
+        settings = override_settings(MEDIA_ROOT=media_root, SHIFT_EVENTS_BROKER='memory')
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_every_page_has_a_case_and_a_budget(self):
+        url_names = {pattern.name for pattern in urls.urlpatterns}
+        self.assertEqual({url_name for _, url_name, _, _ in viewbench.CASES}, url_names)
+        self.assertEqual({name for name, _, _, _ in viewbench.CASES}, set(viewbench.load_budgets()))
+
+    def test_query_counts_are_within_budget(self):
+        DataGenerator(seed=5).run(trusts=3, hospitals=4, agencies=3, nurses=60, shifts=300)
+        budgets = viewbench.load_budgets()
+        for name, path, result in viewbench.measure(viewbench.CASES, viewbench.fixtures(), runs=1):
+            with self.subTest(view=name):
+                self.assertLess(result['status'], 400, path)
+                self.assertEqual(viewbench.over_budget(name, result, budgets.get(name), checks=('queries', 'cold_queries')), [])
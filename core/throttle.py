@@ -0,0 +1,127 @@
+"""
+Login throttling that keeps its counters out of the users table.
+
+Failed attempts are counted in the cache, per username and per client IP,
+over a sliding window: each key keeps a counter for the current and the
+previous window and the estimate weights the previous one by how much of it
+still overlaps, so a burst cannot reset itself at a window boundary. Once a
+username reaches ``LOGIN_FAILURE_LIMIT``, ``ThrottledModelBackend`` refuses it
+before hashing the password, and so does an IP past ``LOGIN_IP_FAILURE_LIMIT``.
+
+The database only hears about lockouts: the attempt that crosses the limit
+writes ``failed_login_attempts`` and ``last_failed_login`` with one UPDATE,
+and a later successful login clears them along with setting ``last_login``
+and ``last_login_ip``. A credential-stuffing burst therefore costs one write
+per targeted account rather than one per attempt.
+
+The cache must be shared by every worker (Redis or memcached) for the limits
+to hold across processes.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from django.core.exceptions import PermissionDenied
+from django.utils import timezone
+
+from .models import User
+
+
+def _settings():
+    return (
+        getattr(settings, 'LOGIN_FAILURE_WINDOW', 15 * 60),
+        getattr(settings, 'LOGIN_FAILURE_LIMIT', 5),
+        getattr(settings, 'LOGIN_IP_FAILURE_LIMIT', 100),
+    )
+
+
+def client_ip(request):
+    return request.META.get('REMOTE_ADDR') if request is not None else None
+
+
+def _key(kind, value):
+    # Hashed so any username is a valid memcached key, and case-folded so
+    # "Alice" and "alice" share a counter.
+    digest = hashlib.sha256(str(value).casefold().encode()).hexdigest()[:32]
+    return f'login:{kind}:{digest}'
+
+
+def _window(now, window):
+    bucket, elapsed = divmod(now, window)
+    return int(bucket), 1 - elapsed / window
+
+
+def _estimate(current, previous, overlap):
+    return current + previous * overlap
+
+
+def _count(key, now, window):
+    bucket, overlap = _window(now, window)
+    counts = cache.get_many([f'{key}:{bucket}', f'{key}:{bucket - 1}'])
+    return _estimate(counts.get(f'{key}:{bucket}', 0), counts.get(f'{key}:{bucket - 1}', 0), overlap)
+
+
+def _hit(key, now, window):
+    bucket, overlap = _window(now, window)
+    current_key = f'{key}:{bucket}'
+    # The counter outlives its own window so it can serve as the next one's "previous".
+    cache.add(current_key, 0, timeout=2 * window)
+    current = cache.incr(current_key)
+    return _estimate(current, cache.get(f'{key}:{bucket - 1}', 0), overlap)
+
+
+def is_locked(username, ip, now=None):
+    window, user_limit, ip_limit = _settings()
+    now = time.time() if now is None else now
+    if username and _count(_key('user', username), now, window) >= user_limit:
+        return True
+    return bool(ip) and _count(_key('ip', ip), now, window) >= ip_limit
+
+
+def record_failure(username, ip, now=None):
+    """Count a failed attempt; returns True if it locked the username out."""
+    window, user_limit, _ = _settings()
+    now = time.time() if now is None else now
+    if ip:
+        _hit(_key('ip', ip), now, window)
+    if not username:
+        return False
+    attempts = _hit(_key('user', username), now, window)
+    if not attempts - 1 < user_limit <= attempts:
+        return False
+    User.objects.filter(username__iexact=username).update(
+        failed_login_attempts=int(attempts),
+        last_failed_login=timezone.now(),
+    )
+    return True
+
+
+def record_login(user, ip):
+    """Store a successful login in one UPDATE and forget the username's failures."""
+    window = _settings()[0]
+    now = time.time()
+    bucket, _ = _window(now, window)
+    key = _key('user', user.get_username())
+    cache.delete_many([f'{key}:{bucket}', f'{key}:{bucket - 1}'])
+
+    user.last_login = timezone.now()
+    user.last_login_ip = ip
+    fields = {'last_login': user.last_login, 'last_login_ip': ip}
+    if user.failed_login_attempts or user.last_failed_login:
+        user.failed_login_attempts = fields['failed_login_attempts'] = 0
+        user.last_failed_login = fields['last_failed_login'] = None
+    User.objects.filter(pk=user.pk).update(**fields)
+
+
+class ThrottledModelBackend(ModelBackend):
+    """ModelBackend that refuses throttled usernames and IPs without hashing the password."""
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(User.USERNAME_FIELD)
+        if is_locked(username, client_ip(request)):
+            # Stops authenticate() trying other backends; it then sends user_login_failed.
+            raise PermissionDenied
+        return super().authenticate(request, username=username, password=password, **kwargs)
@@ -0,0 +1,71 @@
+"""
+Streaming, content-addressed storage for uploaded documents.
+
+``HashingFileUploadHandler`` streams each upload to a temporary file in
+chunks, as Django's TemporaryFileUploadHandler does, and feeds every chunk
+to SHA-256 on the way through, so the checksum is ready the moment the
+request body has been read. ``ContentAddressedStorage`` files documents
+under that checksum: a second upload of the same PDF, by any agency, finds
+the file already on disk and is not written again.
+"""
+import hashlib
+import os
+import posixpath
+
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+
+MAX_EXTENSION_LENGTH = 10
+
+
+def checksum(content):
+    """SHA-256 hex digest of a File, using the one taken during upload if there is one."""
+    digest = getattr(content, 'sha256', None)
+    if digest is None:
+        hasher = hashlib.sha256()
+        for chunk in content.chunks():
+            hasher.update(chunk)
+        digest = hasher.hexdigest()
+        content.seek(0)
+    return digest
+
+
+class HashingFileUploadHandler(TemporaryFileUploadHandler):
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.hasher = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.hasher.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        upload = super().file_complete(file_size)
+        upload.sha256 = self.hasher.hexdigest()
+        return upload
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Stores ``<upload_to>/<aa>/<sha256><ext>``. Identical content always maps
+    to the same name, so an existing file is reused rather than copied, and
+    overwriting one that a concurrent upload just wrote changes nothing.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('allow_overwrite', True)
+        super().__init__(**kwargs)
+
+    def hashed_name(self, name, content):
+        digest = checksum(content)
+        extension = os.path.splitext(name)[1].lower()[:MAX_EXTENSION_LENGTH]
+        return posixpath.join(posixpath.dirname(name), digest[:2], digest + extension)
+
+    def _save(self, name, content):
+        name = self.hashed_name(name, content)
+        if self.exists(name):
+            return name
+        return super()._save(name, content)
+
+
+document_storage = ContentAddressedStorage()
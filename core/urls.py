@@ -1,23 +1,38 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import async_views, views
+
+# Pages polled hard enough to be worth serving from coroutines under ASGI.
+read_views = async_views if settings.ASYNC_VIEWS else views
 
 urlpatterns = [
-    path('', views.dashboard, name='dashboard'),
+    path('', read_views.dashboard, name='dashboard'),
     
     # Agency URLs
-    path('nurses/', views.nurse_list, name='nurse_list'),
+    path('nurses/', read_views.nurse_list, name='nurse_list'),
     path('nurses/create/', views.nurse_create, name='nurse_create'),
     path('nurses/<int:nurse_id>/documents/', views.nurse_document_upload, name='nurse_document_upload'),
-    path('nurses/<int:nurse_id>/documents/list/', views.nurse_documents, name='nurse_documents'),
+    path('nurses/<int:nurse_id>/documents/list/', read_views.nurse_documents, name='nurse_documents'),
+    path('nurses/<int:nurse_id>/shifts/', views.nurse_shift_matches, name='nurse_shift_matches'),
+    path('documents/<int:document_id>/', views.document_download, name='document_download'),
+    path('documents/<int:document_id>/preview/', views.document_download, {'preview': True}, name='document_preview'),
     
     # Hospital URLs
     path('shifts/create/', views.shift_create, name='shift_create'),
-    path('shifts/', views.shift_list, name='shift_list'),
+    path('shifts/import/', views.shift_import, name='shift_import'),
+    path('shifts/', read_views.shift_list, name='shift_list'),
+    path('shifts/calendar/', views.shift_calendar, name='shift_calendar'),
+    path('shifts/calendar.json', views.shift_calendar, {'fmt': 'json'}, name='shift_calendar_json'),
     
     # Agency Shift URLs
-    path('available-shifts/', views.available_shifts, name='available_shifts'),
+    path('available-shifts/', read_views.available_shifts, name='available_shifts'),
+    path('available-shifts/stream/', async_views.shift_stream, name='shift_stream'),
     path('shifts/<int:shift_id>/book/', views.book_shift, name='book_shift'),
     
+    # Finance exports
+    path('exports/shifts/', views.export_shifts, name='export_shifts'),
+    path('exports/bookings/', views.export_bookings, name='export_bookings'),
+
     # Admin URLs
     path('admin/nurses/<int:nurse_id>/approve/', views.approve_nurse, name='approve_nurse'),
     path('admin/agency-trust/<int:access_id>/approve/', views.approve_agency_trust, name='approve_agency_trust'),
@@ -0,0 +1,209 @@
+"""
+Per-view latency, query and memory budgets.
+
+Every URL in ``core.urls`` has at least one entry in ``CASES``: the page is
+requested as the role that normally uses it, against data made by
+``core.datagen``. ``measure`` makes one request with every cache emptied,
+counting its queries (``cold_queries``), times repeated warm requests through
+the test client, then makes one more under ``tracemalloc`` while capturing
+queries, and ``over_budget`` compares the results with ``view_budgets.json``.
+Budgeting the cold request as well keeps a regression on the cache-miss
+path (dashboard stats, table fragments, changelist estimates) from hiding
+behind a warm cache.
+
+Query counts do not depend on how much data there is, only on how a view is
+written, so the test suite checks them on a small dataset. Latency and
+memory do depend on it, so ``bench_views`` checks those at scale on a
+throwaway database, and rewrites the budgets with ``--update-budgets``.
+"""
+import json
+import time
+import tracemalloc
+from datetime import timedelta
+from io import BytesIO
+from pathlib import Path
+
+from asgiref.sync import async_to_sync
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.db import connection, reset_queries
+from django.db.models import Count, Q
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from . import previews
+from .benchmarks import percentile
+from .models import User, Agency, Hospital, Nurse, NurseDocument, Shift, TrustAgencyAccess
+
+BUDGETS_PATH = Path(__file__).with_name('view_budgets.json')
+
+# (budget name, URL name, role, URL argument)
+CASES = [
+    ('dashboard:admin', 'dashboard', 'admin', None),
+    ('dashboard:agency', 'dashboard', 'agency', None),
+    ('dashboard:hospital', 'dashboard', 'hospital', None),
+    ('nurse_list', 'nurse_list', 'agency', None),
+    ('nurse_create', 'nurse_create', 'agency', None),
+    ('nurse_document_upload', 'nurse_document_upload', 'agency', 'nurse'),
+    ('nurse_documents', 'nurse_documents', 'agency', 'nurse'),
+    ('nurse_shift_matches', 'nurse_shift_matches', 'agency', 'nurse'),
+    ('document_download', 'document_download', 'agency', 'document'),
+    ('document_preview', 'document_preview', 'agency', 'document'),
+    ('shift_create', 'shift_create', 'hospital', None),
+    ('shift_import', 'shift_import', 'hospital', None),
+    ('shift_list', 'shift_list', 'hospital', None),
+    ('shift_calendar', 'shift_calendar', 'hospital', None),
+    ('shift_calendar_json', 'shift_calendar_json', 'hospital', None),
+    ('available_shifts', 'available_shifts', 'agency', None),
+    ('shift_stream', 'shift_stream', 'agency', None),
+    ('book_shift', 'book_shift', 'agency', 'shift'),
+    ('export_shifts', 'export_shifts', 'hospital', None),
+    ('export_bookings', 'export_bookings', 'agency', None),
+    ('approve_nurse', 'approve_nurse', 'admin', 'nurse'),
+    ('approve_agency_trust', 'approve_agency_trust', 'admin', 'access'),
+]
+
+
+def load_budgets(path=BUDGETS_PATH):
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_budgets(budgets, path=BUDGETS_PATH):
+    with open(path, 'w') as f:
+        json.dump(budgets, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def _image():
+    output = BytesIO()
+    Image.new('RGB', (640, 480), 'white').save(output, format='PNG')
+    return ContentFile(output.getvalue(), name='registration.png')
+
+
+def fixtures():
+    """
+    Pick the busiest agency and a hospital it supplies from the generated
+    data, and return the users and URL arguments the cases need. The agency's
+    nurse gets a real document with a preview, so downloads are served, not 404s.
+    """
+    agency = Agency.objects.annotate(
+        nurse_count=Count('nurses', filter=Q(nurses__is_approved=True, nurses__is_active=True))
+    ).order_by('-nurse_count', 'pk').select_related('user').first()
+    access = TrustAgencyAccess.objects.filter(agency=agency, approved=True).order_by('pk').first()
+    hospital = Hospital.objects.filter(trust_id=access.trust_id).annotate(
+        shift_count=Count('shifts')
+    ).order_by('-shift_count', 'pk').select_related('user').first()
+    # A compliant nurse, so matching runs in full rather than stopping early.
+    nurse = Nurse.objects.filter(
+        agency=agency, is_approved=True, is_active=True, is_compliant=True
+    ).order_by('pk').first()
+    document = NurseDocument.objects.create(
+        nurse=nurse,
+        document_type='registration',
+        file_url=_image(),
+        expiry_date=timezone.now().date() + timedelta(days=365),
+    )
+    previews.generate(document.pk)
+    shift = Shift.objects.filter(
+        hospital=hospital, status=Shift.Status.OPEN, starts_at__gt=timezone.now()
+    ).order_by('starts_at', 'pk').first()
+    admin, _ = User.objects.get_or_create(username='viewbench_admin', defaults={'role': User.Role.ADMIN})
+    return {
+        'users': {'admin': admin, 'agency': agency.user, 'hospital': hospital.user},
+        'nurse': nurse.pk,
+        'document': document.pk,
+        'shift': shift.pk,
+        'access': access.pk,
+    }
+
+
+async def _first_message(response):
+    iterator = aiter(response.streaming_content)
+    try:
+        await anext(iterator, None)
+    finally:
+        await iterator.aclose()
+
+
+def _request(client, path):
+    response = client.get(path)
+    # An event stream never ends; time it up to its first message.
+    if response.get('Content-Type') == 'text/event-stream':
+        async_to_sync(_first_message)(response)
+    # Streamed bodies (exports, downloads) are only produced as they are read.
+    elif response.streaming:
+        for _ in response.streaming_content:
+            pass
+    response.close()
+    return response
+
+
+def measure(cases, fixture, runs=20):
+    """
+    Yield (case name, path, result) for each case; result holds status,
+    latencies, queries, cold_queries and peak_kb.
+    """
+    clients = {}
+    for name, url_name, role, argument in cases:
+        if role not in clients:
+            clients[role] = Client()
+            clients[role].force_login(fixture['users'][role])
+        client = clients[role]
+        path = reverse(url_name, args=[fixture[argument]] if argument else [])
+
+        # The first request finds every cache empty and fills what the later ones find warm.
+        for cache in caches.all(initialized_only=True):
+            cache.clear()
+        # A full query log (the setup's queries, with DEBUG on) would hide the new ones.
+        reset_queries()
+        with CaptureQueriesContext(connection) as cold_queries:
+            status = _request(client, path).status_code
+        latencies = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            _request(client, path)
+            latencies.append(time.perf_counter() - started)
+
+        tracemalloc.start()
+        try:
+            with CaptureQueriesContext(connection) as queries:
+                _request(client, path)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        yield name, path, {
+            'status': status,
+            'latencies': latencies,
+            'queries': len(queries),
+            'cold_queries': len(cold_queries),
+            'peak_kb': peak // 1024,
+        }
+
+
+def summary(result):
+    latencies = result['latencies']
+    return {
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'queries': result['queries'],
+        'cold_queries': result['cold_queries'],
+        'peak_kb': result['peak_kb'],
+    }
+
+
+def over_budget(name, result, budget, checks=('queries', 'cold_queries', 'p95_ms', 'peak_kb')):
+    """Messages for every measurement of ``result`` above its budget."""
+    if budget is None:
+        return [f'{name} has no budget in {BUDGETS_PATH.name}']
+    measured = summary(result)
+    return [
+        f'{name}: {check} {measured[check]:.0f} over budget of {budget[check]}'
+        for check in checks
+        if measured[check] > budget[check]
+    ]
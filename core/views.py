@@ -1,14 +1,31 @@
+import hashlib
+import os
+
+from datetime import datetime, time, timedelta
+
+from django.http import Http404, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
+from django.utils import timezone
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
-from django.db.models import Q
+from django.db.models import Exists, OuterRef, Q
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
 from .models import (
     User, NHSTrust, Hospital, Agency, TrustAgencyAccess,
-    Nurse, NurseDocument, Shift, Booking
+    Nurse, NurseDocument, Shift, Booking, AgencyShiftEligibility
 )
 from .forms import (
-    NurseForm, NurseDocumentForm, ShiftForm, BookingForm
+    NurseForm, NurseDocumentForm, ShiftForm, BookingForm,
+    AvailableShiftFilterForm, RotaImportForm, ExportFilterForm, ShiftCalendarForm
 )
+from . import bookings, downloads, exports, fragments, matching, rota_import, search, stats
+from .pagination import KeysetPaginator
+from .shift_calendar import DEFAULT_WEEKS, as_json, calendar_days
+from .replicas import replica_reads
+
+AVAILABLE_SHIFTS_PAGE_SIZE = 50
+SHIFT_IMPORT_ERRORS_SHOWN = 200
 
 def is_admin(user):
     return user.role == 'admin'
@@ -19,27 +36,71 @@ def is_agency(user):
 def is_hospital(user):
     return user.role == 'hospital'
 
+# Querysets shared with core.async_views. Each fetches everything its template
+# shows, so rendering never has to go back to the database.
+def approved_trust_access(agency_id):
+    return TrustAgencyAccess.objects.filter(agency_id=agency_id, approved=True).select_related('trust')
+
+def agency_nurses(user):
+    return Nurse.objects.filter(agency__user=user).annotate(
+        has_documents=Exists(NurseDocument.objects.filter(nurse=OuterRef('pk')))
+    )
+
+def hospital_shifts(user):
+    return Shift.objects.filter(hospital__user=user).select_related('hospital', 'booking')
+
+def available_shifts_paginator(agency_id, form):
+    eligible = AgencyShiftEligibility.objects.filter(
+        agency_id=agency_id
+    ).select_related('shift__hospital__trust')
+    return KeysetPaginator(
+        form.filter_queryset(eligible),
+        ordering=('shift_date', 'shift_time', 'shift_id'),
+        page_size=AVAILABLE_SHIFTS_PAGE_SIZE
+    )
+
+def available_shifts_context(request, form, page):
+    page.object_list = [row.shift for row in page.object_list]
+    params = request.GET.copy()
+    params.pop('cursor', None)
+    first_query = params.urlencode() if 'cursor' in request.GET else None
+    next_query = None
+    if page.has_next:
+        params['cursor'] = page.next_cursor
+        next_query = params.urlencode()
+    return {
+        'shifts': page,
+        'form': form,
+        'first_query': first_query,
+        'next_query': next_query,
+    }
+
 @login_required
+@replica_reads
 def dashboard(request):
     if request.user.role == 'admin':
-        return render(request, 'core/admin_dashboard.html')
+        return render(request, 'core/admin_dashboard.html', {
+            'stats': stats.platform_stats(),
+            'fragment_stats': fragments.stats(),
+        })
     elif request.user.role == 'agency':
-        return render(request, 'core/agency_dashboard.html')
+        agency_id = request.user.agency.id
+        return render(request, 'core/agency_dashboard.html', {
+            'stats': stats.agency_stats(agency_id),
+            'approved_access': approved_trust_access(agency_id),
+        })
     elif request.user.role == 'hospital':
-        context = {
-            'open_shifts_count': request.user.hospital.shifts.filter(status='open').count(),
-            'booked_shifts_count': request.user.hospital.shifts.filter(status='booked').count(),
-            'completed_shifts_count': request.user.hospital.shifts.filter(status='completed').count(),
-        }
-        return render(request, 'core/hospital_dashboard.html', context)
+        return render(request, 'core/hospital_dashboard.html', {'stats': stats.hospital_stats(request.user.hospital.id)})
     return redirect('login')
 
 # Agency Views
 @login_required
 @user_passes_test(is_agency)
+@replica_reads
 def nurse_list(request):
-    nurses = Nurse.objects.filter(agency=request.user.agency)
-    return render(request, 'core/nurse_list.html', {'nurses': nurses})
+    query = request.GET.get('q', '')
+    nurses = search.search_queryset(agency_nurses(request.user), query, ranked=True)
+    return render(request, 'core/nurse_list.html', {'nurses': nurses, 'query': query})
 
 @login_required
 @user_passes_test(is_agency)
@@ -74,6 +135,7 @@ def nurse_document_upload(request, nurse_id):
 
 @login_required
 @user_passes_test(is_agency)
+@replica_reads
 def nurse_documents(request, nurse_id):
     nurse = get_object_or_404(Nurse, id=nurse_id, agency=request.user.agency)
     documents = nurse.documents.all().order_by('-uploaded_at')
@@ -82,6 +144,42 @@ def nurse_documents(request, nurse_id):
         'documents': documents
     })
 
+@login_required
+@user_passes_test(is_agency)
+@replica_reads
+def nurse_shift_matches(request, nurse_id):
+    nurse = get_object_or_404(Nurse, id=nurse_id, agency=request.user.agency)
+    return render(request, 'core/nurse_shift_matches.html', {
+        'nurse': nurse,
+        'matches': matching.best_shifts(nurse),
+    })
+
+def _can_see_document(user, document):
+    if user.role == 'admin':
+        return True
+    if user.role == 'agency':
+        return document.nurse.agency_id == user.agency.id
+    if user.role == 'hospital':
+        # Hospitals see the documents of nurses booked onto their shifts.
+        return Booking.objects.filter(
+            nurse_id=document.nurse_id, shift__hospital=user.hospital, cancelled=False
+        ).exists()
+    return False
+
+@login_required
+@replica_reads
+def document_download(request, document_id, preview=False):
+    document = get_object_or_404(NurseDocument.objects.select_related('nurse'), id=document_id)
+    if not _can_see_document(request.user, document):
+        raise Http404('No document matches the given query.')
+    fieldfile = document.preview if preview else document.file_url
+    if not fieldfile or not fieldfile.storage.exists(fieldfile.name):
+        raise Http404('The file for this document is missing.')
+    extension = os.path.splitext(fieldfile.name)[1]
+    filename = f'{document.nurse.full_name} - {document.get_document_type_display()}{extension}'
+    etag = f'{document.checksum}-preview' if preview and document.checksum else document.checksum or None
+    return downloads.serve(request, fieldfile, filename, etag=etag, as_attachment='download' in request.GET)
+
 # Hospital Views
 @login_required
 @user_passes_test(is_hospital)
@@ -100,48 +198,180 @@ def shift_create(request):
 
 @login_required
 @user_passes_test(is_hospital)
+def shift_import(request):
+    report = None
+    if request.method == 'POST':
+        form = RotaImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            upload = form.cleaned_data['file']
+            try:
+                fmt = form.cleaned_data['format'] or rota_import.detect_format(upload.name)
+            except rota_import.RotaFormatError as exc:
+                form.add_error('format', str(exc))
+            else:
+                report = rota_import.import_rota(request.user.hospital, rota_import.iter_rows(upload.file, fmt))
+                if report.created:
+                    messages.success(request, f'Imported {report.created} shifts.')
+    else:
+        form = RotaImportForm()
+    return render(request, 'core/shift_import.html', {
+        'form': form,
+        'report': report,
+        'errors': report.errors[:SHIFT_IMPORT_ERRORS_SHOWN] if report else [],
+    })
+
+@login_required
+@user_passes_test(is_hospital)
+@replica_reads
 def shift_list(request):
-    shifts = Shift.objects.filter(hospital=request.user.hospital)
-    return render(request, 'core/shift_list.html', {'shifts': shifts})
+    query = request.GET.get('q', '')
+    shifts = search.search_queryset(hospital_shifts(request.user), query, ranked=True)
+    return render(request, 'core/shift_list.html', {'shifts': shifts, 'query': query})
+
+# Shift calendar. The ETag and Last-Modified come from the hospital's
+# shifts_version, so a poll that finds nothing changed is answered with a 304
+# after one query for the hospital row. The HTML page also embeds a CSRF token
+# (the logout form), so its ETag carries a digest of the CSRF secret and it
+# has no Last-Modified: a page kept from before the user logged in again must
+# not be reused.
+def _calendar_state(request):
+    state = getattr(request, '_shift_calendar', None)
+    if state is None:
+        form = ShiftCalendarForm(request.GET)
+        hospital = Hospital.objects.values('id', 'shifts_version', 'shifts_changed_at').get(user=request.user)
+        state = request._shift_calendar = (form, hospital)
+    return state
+
+def _calendar_etag(request, fmt='html'):
+    form, hospital = _calendar_state(request)
+    if not form.is_valid():
+        return None
+    start, end = form.window()
+    etag = f'{hospital["id"]}-{hospital["shifts_version"]}-{start:%Y%m%d}-{end:%Y%m%d}-{fmt}'
+    if fmt == 'html':
+        csrf_secret = request.META.get('CSRF_COOKIE') or ''
+        etag += '-' + hashlib.md5(csrf_secret.encode()).hexdigest()[:12]
+    return etag
+
+def _calendar_last_modified(request, fmt='html'):
+    form, hospital = _calendar_state(request)
+    # A date alone cannot tell the HTML page's CSRF token apart; only the ETag can.
+    if fmt == 'html' or not form.is_valid():
+        return None
+    if form.cleaned_data['start']:
+        return hospital['shifts_changed_at']
+    # Without a start date the window moves on at midnight, changes or not.
+    midnight = timezone.make_aware(datetime.combine(timezone.localdate(), time()))
+    return max(hospital['shifts_changed_at'], midnight)
+
+@login_required
+@user_passes_test(is_hospital)
+@replica_reads
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_calendar_etag, last_modified_func=_calendar_last_modified)
+def shift_calendar(request, fmt='html'):
+    form, hospital = _calendar_state(request)
+    if not form.is_valid():
+        return HttpResponseBadRequest(form.errors.as_text())
+    start, end = form.window()
+    days = calendar_days(hospital['id'], start, end)
+    if fmt == 'json':
+        return JsonResponse({
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            'version': hospital['shifts_version'],
+            'days': as_json(days),
+        })
+    weeks = form.cleaned_data['weeks'] or DEFAULT_WEEKS
+    return render(request, 'core/shift_calendar.html', {
+        'form': form,
+        'start': start,
+        'end': end,
+        'weeks': weeks,
+        'days': days,
+        'previous_start': start - timedelta(weeks=weeks),
+        'next_start': end + timedelta(days=1),
+    })
 
 # Agency Shift Views
 @login_required
 @user_passes_test(is_agency)
+@replica_reads
 def available_shifts(request):
     approved_trusts = TrustAgencyAccess.objects.filter(
         agency=request.user.agency,
         approved=True
     ).values_list('trust', flat=True)
-    
-    shifts = Shift.objects.filter(
-        hospital__trust__in=approved_trusts,
-        status='open'
+
+    form = AvailableShiftFilterForm(
+        request.GET or None,
+        trusts=NHSTrust.objects.filter(id__in=approved_trusts).order_by('name')
     )
-    return render(request, 'core/available_shifts.html', {'shifts': shifts})
+    paginator = available_shifts_paginator(request.user.agency.id, form)
+    page = paginator.get_page(request.GET.get('cursor'))
+    return render(request, 'core/available_shifts.html', available_shifts_context(request, form, page))
 
 @login_required
 @user_passes_test(is_agency)
 def book_shift(request, shift_id):
-    shift = get_object_or_404(Shift, id=shift_id, status='open')
+    agency = request.user.agency
+    nurses = Nurse.objects.filter(agency=agency, is_approved=True, is_active=True)
     if request.method == 'POST':
-        form = BookingForm(request.POST)
+        shift = get_object_or_404(Shift.objects.select_related('hospital'), id=shift_id)
+        # A shift that has gone already is reported as taken, whoever was picked.
+        matches = matching.NursePool.for_agency(agency.id).match(shift) if shift.status == Shift.Status.OPEN else None
+        form = BookingForm(request.POST, matches=matches)
+        form.fields['nurse'].queryset = nurses
         if form.is_valid():
-            booking = form.save(commit=False)
-            booking.shift = shift
-            booking.agency = request.user.agency
-            booking.save()
-            shift.status = 'booked'
-            shift.save()
-            messages.success(request, 'Shift booked successfully.')
-            return redirect('available_shifts')
+            result = bookings.book_shift(shift.id, form.cleaned_data['nurse'].id, agency)
+            if result:
+                messages.success(request, result.message)
+                return redirect('available_shifts')
+            messages.error(request, result.message)
+            if result.status not in (result.INVALID_NURSE, result.OVERLAP):
+                return redirect('available_shifts')
     else:
-        form = BookingForm()
-        form.fields['nurse'].queryset = Nurse.objects.filter(
-            agency=request.user.agency,
-            is_approved=True
-        )
+        shift = get_object_or_404(Shift.objects.select_related('hospital'), id=shift_id, status='open')
+        matches = matching.NursePool.for_agency(agency.id).match(shift)
+        form = BookingForm(initial={'nurse': request.GET.get('nurse')}, matches=matches)
+        form.fields['nurse'].queryset = nurses
     return render(request, 'core/booking_form.html', {'form': form, 'shift': shift})
 
+# Finance Exports
+EXPORT_CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+def _export(request, kind, build):
+    form = ExportFilterForm(request.GET)
+    if not form.is_valid():
+        return HttpResponseBadRequest(form.errors.as_text())
+    filters = {key: form.cleaned_data[key] for key in ('date_from', 'date_to', 'trust', 'agency')}
+    # Hospitals and agencies only ever see their own rows.
+    if request.user.role == 'hospital':
+        filters['hospital'] = request.user.hospital
+    elif request.user.role == 'agency':
+        filters['agency'] = request.user.agency
+    fmt = form.cleaned_data['format'] or 'csv'
+    response = StreamingHttpResponse(
+        exports.encode(build(**filters), fmt),
+        content_type=EXPORT_CONTENT_TYPES[fmt]
+    )
+    filename = f'{kind}-{timezone.now().date().isoformat()}.{fmt}'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+@login_required
+@replica_reads
+def export_shifts(request):
+    return _export(request, 'shifts', exports.shift_export)
+
+@login_required
+@replica_reads
+def export_bookings(request):
+    return _export(request, 'bookings', exports.booking_export)
+
 # Admin Views
 @login_required
 @user_passes_test(is_admin)
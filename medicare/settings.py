@@ -44,6 +44,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.replicas.replica_middleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -70,8 +71,39 @@ TEMPLATES = [
     },
 ]
 
+# Without an explicit 'loaders' option Django wraps the filesystem and app
+# loaders in the cached loader, so each template is compiled once per process.
+# (In development it is reset whenever a template file changes.)
+
 WSGI_APPLICATION = 'medicare.wsgi.application'
 
+# Route the polled read-only pages to core.async_views. medicare.asgi sets
+# MEDICARE_ASYNC_VIEWS=1; under WSGI each async view would need an event loop
+# of its own per request, so the sync views stay in place there.
+ASYNC_VIEWS = os.environ.get('MEDICARE_ASYNC_VIEWS') == '1'
+
+# How shift events reach the agency stream (core.shift_events): 'database'
+# tails an outbox table from every process; 'memory' only reaches streams
+# served by the process that made the change, for local testing.
+SHIFT_EVENTS_BROKER = os.environ.get('MEDICARE_SHIFT_EVENTS_BROKER', 'database')
+
+
+# Rendered shift and nurse table rows and tables (see core.fragments). Their
+# keys carry object versions, so entries are never stale and only need to
+# expire to make room; in production point 'fragments' at a cache shared by
+# all workers (memcached or Redis) so they share rows and hit/miss counts.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'fragments': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'fragments',
+        'TIMEOUT': 24 * 60 * 60,
+        'OPTIONS': {'MAX_ENTRIES': 20000},
+    },
+}
+
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
@@ -83,6 +115,24 @@ DATABASES = {
     }
 }
 
+# Read replicas (see core.replicas). Views marked @replica_reads send their
+# queries to one of DATABASE_REPLICAS; everything else uses 'default'. Set
+# MEDICARE_SQLITE_REPLICAS=N to try it locally with N copies of db.sqlite3
+# kept fresh by `manage.py sync_replicas --interval 2`.
+for i in range(1, int(os.environ.get('MEDICARE_SQLITE_REPLICAS', 0)) + 1):
+    DATABASES[f'replica{i}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / f'db.replica{i}.sqlite3',
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['core.replicas.ReplicaRouter']
+# A replica whose heartbeat is older than this many seconds is not read from.
+REPLICA_MAX_LAG = 30
+REPLICA_HEALTH_CHECK_INTERVAL = 5
+# After writing, a user reads from the primary for this long.
+REPLICA_STICKY_SECONDS = 10
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -126,6 +176,18 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Stream every upload to a temporary file, hashing it as the chunks arrive,
+# so documents can be stored by checksum without being read a second time.
+FILE_UPLOAD_HANDLERS = ['core.uploads.HashingFileUploadHandler']
+
+# Nurse documents are never served straight from MEDIA_URL; the download view
+# checks permissions and then hands the file over. Set DOCUMENT_SENDFILE to
+# 'x-accel-redirect' (nginx, with an internal location at
+# DOCUMENT_ACCEL_REDIRECT_PREFIX aliased to MEDIA_ROOT) or 'x-sendfile'
+# (Apache/lighttpd) to have the web server send it instead of Django.
+DOCUMENT_SENDFILE = None
+DOCUMENT_ACCEL_REDIRECT_PREFIX = '/protected-media/'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -144,3 +206,11 @@ LOGOUT_REDIRECT_URL = 'login'
 
 # Custom user model
 AUTH_USER_MODEL = 'core.User'
+
+# Failed logins are counted in the cache over a sliding window (see
+# core.throttle); a username or client IP past its limit is refused until
+# enough of the window has passed. Needs a cache shared by all workers.
+AUTHENTICATION_BACKENDS = ['core.throttle.ThrottledModelBackend']
+LOGIN_FAILURE_WINDOW = 15 * 60
+LOGIN_FAILURE_LIMIT = 5
+LOGIN_IP_FAILURE_LIMIT = 100